@@ -13,6 +13,10 @@ from typing import Optional, List
 
 from my.api.social_media_api import social_router
 from my.gen.video import process_gen_video_tasks
+from my.services.account_health import account_health_registry
+from my.services.job_manager import job_manager
+from utils import cookie_probe, faststart
+from utils.browser_pool import browser_pool
 
 
 class FastAPIApp:
@@ -54,11 +58,20 @@ class FastAPIApp:
             app.state.aclient = client
             logger.info("AsyncClient initialized")
 
+            # 启动共享浏览器池，所有上传和 cookie 校验复用其中的浏览器
+            await browser_pool.start()
+            app.state.browser_pool = browser_pool
+
             # 启动视频任务处理
             logger.info("Starting up video task processing")
-            task = asyncio.create_task(process_gen_video_tasks(app.state.aclient))
+            # 生成完成的任务通知队列，轮询和回调接口共用
+            app.state.gen_video_finished = asyncio.Queue()
+            task = asyncio.create_task(process_gen_video_tasks(app.state.aclient, app.state.gen_video_finished))
             app.state.video_task = task  # 保存任务引用
 
+            # 启动账号登录态巡检
+            app.state.account_health_task = asyncio.create_task(account_health_registry.run())
+
             yield  # 应用程序运行
 
         except Exception as e:
@@ -78,6 +91,21 @@ class FastAPIApp:
                 except asyncio.CancelledError:
                     logger.info("Video task cancelled")
 
+            if hasattr(app.state, "account_health_task"):
+                app.state.account_health_task.cancel()
+                try:
+                    await app.state.account_health_task
+                except asyncio.CancelledError:
+                    logger.info("Account health task cancelled")
+
+            # 取消未完成的登录、上传任务
+            await job_manager.shutdown()
+
+            # 关闭浏览器池、cookie 探测连接池和 faststart 进程池
+            await browser_pool.stop()
+            await cookie_probe.aclose()
+            faststart.shutdown()
+
     def _create_app(self) -> FastAPI:
         # 先初始化 FastAPI 应用
         app = FastAPI(
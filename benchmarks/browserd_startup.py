@@ -0,0 +1,60 @@
+"""
+browserd 基准：模拟一次 CLI 上传从进程启动到拿到可用页面的耗时，对比自己启动浏览器和连接 browserd
+
+    python cli_main.py browserd          # 另开一个终端先启动守护进程
+    python benchmarks/browserd_startup.py --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from playwright.async_api import async_playwright  # noqa: E402
+
+from utils.browserd import get_cdp_endpoint  # noqa: E402
+
+
+async def page_ready_ms(cdp_endpoint, headless) -> float:
+    # 每次都重新启动 playwright driver，与一次独立的 CLI 调用一致
+    start = time.perf_counter()
+    async with async_playwright() as playwright:
+        if cdp_endpoint:
+            browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+        else:
+            browser = await playwright.chromium.launch(headless=headless)
+        try:
+            context = await browser.new_context()
+            page = await context.new_page()
+            await page.goto('about:blank')
+            elapsed = (time.perf_counter() - start) * 1000
+            await context.close()
+        finally:
+            await browser.close()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare time-to-first-page with a fresh browser and with browserd.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per mode, the median is reported")
+    parser.add_argument("--headless", action="store_true", help="Match a daemon started with --headless")
+    args = parser.parse_args()
+
+    cdp_endpoint = get_cdp_endpoint('chromium', args.headless)
+    modes = {'launch': None}
+    if cdp_endpoint:
+        modes['browserd'] = cdp_endpoint
+    else:
+        print("browserd is not running (or headless does not match), only measuring launch")
+
+    print(f"{'mode':<10}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, endpoint in modes.items():
+        samples = [await page_ready_ms(endpoint, args.headless) for _ in range(args.runs)]
+        print(f"{name:<10}{statistics.median(samples):>12.0f}{min(samples):>10.0f}{max(samples):>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+启动耗时基准：测量 CLI 帮助/登录路径的启动时间和 app 的导入时间，超过预算时返回非 0，便于发现导入变慢的改动
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --budget-ms 200 --top 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent.resolve()
+
+# 名称 -> 命令行参数；帮助在参数解析阶段退出，不会启动浏览器
+SCENARIOS = {
+    'cli --help': ['cli_main.py', '--help'],
+    'cli login --help': ['cli_main.py', 'douyin', 'xiaoA', 'login', '--help'],
+    'cli crosspost --help': ['cli_main.py', 'crosspost', '--help'],
+    'import app': ['-c', 'import app'],
+}
+# 有启动时间预算的场景
+BUDGET_SCENARIOS = ('cli --help', 'cli login --help')
+
+
+def wall_time_ms(args, runs) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=BASE_DIR, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def import_times(module):
+    """
+    解析 -X importtime 的输出，返回 [(累计微秒, 模块名)]，按累计耗时倒序
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=BASE_DIR,
+                            capture_output=True, text=True, check=False)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI startup and module import time.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario, the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=200, help="Startup budget for the CLI help/login paths")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to show")
+    args = parser.parse_args()
+
+    # 先跑一次预热 pyc 和磁盘缓存
+    wall_time_ms(['-c', 'import cli_main'], 1)
+
+    baseline = wall_time_ms(['-c', 'pass'], args.runs)
+    print(f"{'scenario':<24}{'wall ms':>10}{'minus python':>14}")
+    print(f"{'python -c pass':<24}{baseline:>10.1f}{0:>14.1f}")
+    over_budget = []
+    for name, scenario in SCENARIOS.items():
+        elapsed = wall_time_ms(scenario, args.runs)
+        print(f"{name:<24}{elapsed:>10.1f}{elapsed - baseline:>14.1f}")
+        if name in BUDGET_SCENARIOS and elapsed > args.budget_ms:
+            over_budget.append(name)
+
+    for module in ('cli_main', 'app'):
+        print(f"\nslowest imports of {module} (cumulative ms):")
+        for cumulative, name in import_times(module)[:args.top]:
+            print(f"{cumulative / 1000:>10.1f}  {name}")
+
+    if over_budget:
+        print(f"\nover the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
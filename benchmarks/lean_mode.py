@@ -0,0 +1,111 @@
+"""
+精简模式基准：同一个页面分别在普通模式和精简模式下打开，对比传输字节数、页面就绪耗时和浏览器进程峰值内存
+
+    python benchmarks/lean_mode.py
+    python benchmarks/lean_mode.py --platform kuaishou --url https://cp.kuaishou.com/ --cookie cookies/ks_uploader/xiaoA.json
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+import psutil  # noqa: E402
+from playwright.async_api import async_playwright  # noqa: E402
+
+from utils.lean_mode import LEAN_LAUNCH_ARGS, apply_lean_policy  # noqa: E402
+
+DEFAULT_URLS = {
+    'douyin': 'https://creator.douyin.com/',
+    'tencent': 'https://channels.weixin.qq.com/',
+    'kuaishou': 'https://cp.kuaishou.com/',
+    'tiktok': 'https://www.tiktok.com/',
+}
+
+
+def browser_rss() -> int:
+    total = 0
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+async def sample_peak_rss(peak: list, stop: asyncio.Event):
+    while not stop.is_set():
+        peak[0] = max(peak[0], browser_rss())
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def open_page(playwright, platform, url, cookie, lean) -> dict:
+    peak, stop = [0], asyncio.Event()
+    sampler = asyncio.create_task(sample_peak_rss(peak, stop))
+    browser = await playwright.chromium.launch(headless=True, args=list(LEAN_LAUNCH_ARGS) if lean else [])
+    try:
+        context = await browser.new_context(storage_state=cookie) if cookie else await browser.new_context()
+        await apply_lean_policy(context, platform, enabled=lean)
+        page = await context.new_page()
+        # 用单独的 CDP 会话统计实际传输的字节数，包括跨域资源
+        session = await context.new_cdp_session(page)
+        await session.send('Network.enable')
+        stats = {'bytes': 0, 'requests': 0, 'blocked': 0}
+
+        def on_finished(event):
+            stats['bytes'] += event.get('encodedDataLength', 0)
+            stats['requests'] += 1
+
+        def on_failed(event):
+            if event.get('blockedReason'):
+                stats['blocked'] += 1
+
+        session.on('Network.loadingFinished', on_finished)
+        session.on('Network.loadingFailed', on_failed)
+        start = time.perf_counter()
+        await page.goto(url, wait_until='load')
+        stats['ready_ms'] = (time.perf_counter() - start) * 1000
+        # 等待页面加载后的延迟请求
+        await page.wait_for_timeout(2000)
+    finally:
+        await browser.close()
+        stop.set()
+        await sampler
+    stats['peak_rss_mb'] = peak[0] / 1024 / 1024
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare bytes, page-ready latency and peak RSS with lean mode on/off.")
+    parser.add_argument("--platform", default='douyin', choices=list(DEFAULT_URLS), help="Platform policy to apply")
+    parser.add_argument("--url", help="Page to open, defaults to the platform's creator portal")
+    parser.add_argument("--cookie", help="Optional storage_state cookie file")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode, the median is reported")
+    args = parser.parse_args()
+    url = args.url or DEFAULT_URLS[args.platform]
+
+    results = {False: [], True: []}
+    async with async_playwright() as playwright:
+        for _ in range(args.runs):
+            # 交替运行，减少网络波动的影响
+            for lean in (False, True):
+                results[lean].append(await open_page(playwright, args.platform, url, args.cookie, lean))
+
+    print(f"{url}\n{'mode':<6}{'KB':>10}{'requests':>10}{'blocked':>10}{'ready ms':>10}{'peak RSS MB':>13}")
+    for lean, samples in results.items():
+        def median(key):
+            return statistics.median(sample[key] for sample in samples)
+
+        print(f"{'lean' if lean else 'normal':<6}{median('bytes') / 1024:>10.0f}{median('requests'):>10.0f}"
+              f"{median('blocked'):>10.0f}{median('ready_ms'):>10.0f}{median('peak_rss_mb'):>13.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
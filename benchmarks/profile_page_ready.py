@@ -0,0 +1,77 @@
+"""
+持久化 profile 基准：分别用全新 user-data 目录（冷启动）和同一个 user-data 目录（热启动）打开页面，
+对比页面就绪耗时和网络传输字节数
+
+    python benchmarks/profile_page_ready.py
+    python benchmarks/profile_page_ready.py --url https://creator.douyin.com/creator-micro/content/upload \
+        --cookie cookies/douyin_uploader/xiaoA.json --runs 5
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from playwright.async_api import async_playwright  # noqa: E402
+
+from utils.browser_profiles import _load_cookies, page_timing  # noqa: E402
+
+
+async def open_page(playwright, user_data_dir, url, cookie, headless) -> dict:
+    context = await playwright.chromium.launch_persistent_context(user_data_dir, headless=headless)
+    try:
+        await _load_cookies(context, cookie)
+        page = await context.new_page()
+        start = time.perf_counter()
+        await page.goto(url, wait_until='load')
+        timing = await page_timing(page) or {}
+        timing['goto_ms'] = round((time.perf_counter() - start) * 1000)
+        return timing
+    finally:
+        await context.close()
+
+
+def summary(name, samples):
+    def median(key):
+        values = [sample[key] for sample in samples if sample.get(key) is not None]
+        return statistics.median(values) if values else 0
+
+    print(f"{name:<6}{median('goto_ms'):>10.0f}{median('dom_ready_ms'):>14.0f}{median('load_ms'):>10.0f}"
+          f"{median('transferred_bytes') / 1024:>16.0f}{median('cached_resources'):>10.0f}/{median('resources'):.0f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare page-ready time with a cold and a warm browser profile.")
+    parser.add_argument("--url", default="https://creator.douyin.com/", help="Page to open")
+    parser.add_argument("--cookie", help="Optional storage_state cookie file loaded into the context")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode, the median is reported")
+    parser.add_argument("--headed", action="store_true", help="Show the browser")
+    args = parser.parse_args()
+
+    tmp_root = Path(tempfile.mkdtemp(prefix='profile_bench_'))
+    try:
+        async with async_playwright() as playwright:
+            cold = []
+            for i in range(args.runs):
+                cold.append(await open_page(playwright, str(tmp_root / f'cold_{i}'), args.url, args.cookie,
+                                            not args.headed))
+            warm_dir = str(tmp_root / 'warm')
+            # 第一次打开填充缓存，不计入结果
+            await open_page(playwright, warm_dir, args.url, args.cookie, not args.headed)
+            warm = [await open_page(playwright, warm_dir, args.url, args.cookie, not args.headed)
+                    for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    print(f"{'mode':<6}{'goto ms':>10}{'dom ready ms':>14}{'load ms':>10}{'transferred KB':>16}{'cached':>10}")
+    summary('cold', cold)
+    summary('warm', warm)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+小红书签名吞吐基准：本地起一个模拟签名脚本的测试页，对比每次签名都启动浏览器（原 sign_local 的做法）和预热页面池的每秒签名数
+
+    python benchmarks/xhs_sign_throughput.py
+    python benchmarks/xhs_sign_throughput.py --pages 1,2,4 --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from playwright.async_api import async_playwright  # noqa: E402
+
+from uploader.xhs_uploader.sign_server import SIGN_JS, SIGN_READY_JS, SignPagePool  # noqa: E402
+
+# 模拟线上页面：脚本加载一段时间后才挂上签名函数，签名本身做一些同步计算
+STUB_PAGE = b"""<!doctype html><html><body><script>
+setTimeout(() => {
+    window._webmsxyw = (url, data) => {
+        let h = 0;
+        const s = url + JSON.stringify(data || {}) + document.cookie;
+        for (let i = 0; i < 20000; i++) h = (h * 31 + s.charCodeAt(i % s.length)) | 0;
+        return {'X-s': 'XYW_' + h.toString(16), 'X-t': Date.now()};
+    };
+}, 300);
+</script></body></html>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(STUB_PAGE)))
+        self.end_headers()
+        self.wfile.write(STUB_PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_stub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def per_call_launch(url, count) -> float:
+    # 原 sign_local：每次签名启动浏览器、打开页面、写 cookie、刷新
+    start = time.perf_counter()
+    for i in range(count):
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=True)
+            context = await browser.new_context()
+            page = await context.new_page()
+            await page.goto(url)
+            await context.add_cookies([{'name': 'a1', 'value': 'bench', 'url': url}])
+            await page.reload()
+            await page.wait_for_function(SIGN_READY_JS)
+            await page.evaluate(SIGN_JS, [f'/api/sns/web/v1/feed?i={i}', None])
+            await browser.close()
+    return count / (time.perf_counter() - start)
+
+
+async def pooled(url, pages, count, concurrency) -> float:
+    pool = SignPagePool(size=pages, url=url, cookie_domain=None)
+    await pool.start()
+    try:
+        # 预热 a1，不计入结果
+        await asyncio.gather(*(pool.sign('/warmup', None, 'bench') for _ in range(pages)))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                await pool.sign(f'/api/sns/web/v1/feed?i={i}', {'i': i}, 'bench')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        return count / (time.perf_counter() - start)
+    finally:
+        await pool.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure XHS signatures per second against a local stub page.")
+    parser.add_argument("--pages", default='1,2,4', help="Comma separated pool sizes")
+    parser.add_argument("--requests", type=int, default=200, help="Signatures per pool size")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent sign requests")
+    parser.add_argument("--launch-runs", type=int, default=3, help="Signatures for the per-call launch baseline")
+    args = parser.parse_args()
+
+    server = serve_stub()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    try:
+        print(f"{'mode':<16}{'signs/s':>10}")
+        if args.launch_runs:
+            print(f"{'launch per call':<16}{await per_call_launch(url, args.launch_runs):>10.2f}")
+        for pages in (int(size) for size in args.pages.split(',')):
+            print(f"{f'pool x{pages}':<16}{await pooled(url, pages, args.requests, args.concurrency):>10.2f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
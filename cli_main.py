@@ -1,18 +1,21 @@
 import argparse
 import asyncio
+import sys
 from datetime import datetime
 from os.path import exists
 from pathlib import Path
 
-from conf import BASE_DIR
-from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
-from uploader.ks_uploader.main import ks_setup, KSVideo
-from uploader.tencent_uploader.main import weixin_setup, TencentVideo
-from uploader.tk_uploader.main_chrome import tiktok_setup, TiktokVideo
-from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN, \
-    SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU
-from utils.constant import TencentZoneTypes
+from conf import BASE_DIR, WATCH_DB_NAME, CROSSPOST_CONCURRENCY, BROWSERD_PORT
+from uploader.crosspost import CrosspostTarget, crosspost, format_results
+from uploader.platforms import setup_account, create_uploader
+from utils import browserd, faststart
+from utils.browser_pool import browser_pool
+from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN
 from utils.files_times import get_title_and_hashtags
+from utils.folder_watcher import FolderWatcher, WatchedVideo
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import preflight, log_preflight
+from utils.watch_queue import WatchUploadQueue
 
 
 def parse_schedule(schedule_raw):
@@ -23,7 +26,140 @@ def parse_schedule(schedule_raw):
     return schedule
 
 
+async def watch_folder(platform, account_name, account_file, folder, concurrency):
+    """
+    监听目录，新视频写完后放入持久化队列，按 concurrency 并发上传
+    """
+    if not await setup_account(platform, account_file, handle=False):
+        raise RuntimeError(f'{platform} account {account_name} cookie is invalid, please login first')
+
+    upload_queue = WatchUploadQueue(Path(folder) / WATCH_DB_NAME, platform, account_name)
+    recovered = upload_queue.recover()
+    if recovered:
+        print(f"Re-queued {recovered} interrupted uploads")
+    wakeup = asyncio.Event()
+
+    def on_ready(video: WatchedVideo):
+        upload_queue.enqueue(video)
+        print(f"Queued {video.video_file}")
+        wakeup.set()
+
+    async def worker():
+        while True:
+            video = upload_queue.claim()
+            if video is None:
+                wakeup.clear()
+                try:
+                    # 有等待重试的视频时到点自动醒来
+                    await asyncio.wait_for(wakeup.wait(), upload_queue.next_retry_delay())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # 平台一定会拒绝的视频不启动浏览器
+            result = preflight(video.video_file, platform)
+            log_preflight(result)
+            if not result.ok:
+                upload_queue.finish(video.video_file, error='; '.join(result.errors))
+                continue
+            try:
+                title, tags = get_title_and_hashtags(video.video_file)
+                upload_file = await faststart.prepare_upload_file(video.video_file)
+                app = create_uploader(platform, title, upload_file, tags, 0, account_file,
+                                      thumbnail_path=video.thumbnail_file)
+                if await upload_ledger.publish_once(app.main, video.video_file, platform, account_name):
+                    print(f"Uploaded {video.video_file}")
+                else:
+                    print(f"Already published, skipped {video.video_file}")
+                upload_queue.finish(video.video_file)
+            except Exception as e:
+                upload_queue.finish(video.video_file, error=str(e), retry=True)
+                print(f"Failed to upload {video.video_file}: {e}")
+
+    watcher = FolderWatcher(folder, on_ready, is_known=upload_queue.is_known)
+    await watcher.start()
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    print(f"Watching {folder} with concurrency {concurrency}, {upload_queue.pending_count()} uploads pending")
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        watcher.stop()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        upload_queue.close()
+
+
+def get_account_file(platform, account_name) -> Path:
+    account_file = Path(BASE_DIR / "cookies" / f"{platform}_{account_name}.json")
+    account_file.parent.mkdir(exist_ok=True)
+    return account_file
+
+
+async def crosspost_main(argv):
+    """
+    crosspost <video_file> --platforms douyin,kuaishou --accounts xiaoA[,xiaoB]：同一个视频并发发布到多个平台
+    """
+    parser = argparse.ArgumentParser(prog="cli_main.py crosspost", description="Post one video to multiple platforms concurrently.")
+    parser.add_argument("video_file", help="Path to the Video file")
+    parser.add_argument("-p", "--platforms", required=True,
+                        help=f"Comma separated platforms: {','.join(get_supported_social_media())}")
+    parser.add_argument("-a", "--accounts", required=True,
+                        help="Comma separated account names, one for all platforms or one per platform")
+    parser.add_argument("-t", "--schedule", help="Schedule UTC time in %%Y-%%m-%%d %%H:%%M format, default immediately")
+    parser.add_argument("-c", "--concurrency", type=int, default=CROSSPOST_CONCURRENCY,
+                        help="Number of platforms uploaded at the same time")
+    args = parser.parse_args(argv)
+
+    platforms = [platform.strip() for platform in args.platforms.split(',') if platform.strip()]
+    accounts = [account.strip() for account in args.accounts.split(',') if account.strip()]
+    unsupported = [platform for platform in platforms if platform not in get_supported_social_media()]
+    if unsupported:
+        parser.error(f"Unsupported platforms: {','.join(unsupported)}")
+    if len(accounts) == 1:
+        accounts = accounts * len(platforms)
+    if len(accounts) != len(platforms):
+        parser.error("Give one account for all platforms or one account per platform.")
+    if not exists(args.video_file):
+        parser.error(f"Could not find the video file at {args.video_file}")
+    if args.concurrency < 1:
+        parser.error("The concurrency must be at least 1.")
+
+    targets = [CrosspostTarget(platform, account_name, get_account_file(platform, account_name))
+               for platform, account_name in zip(platforms, accounts)]
+    await browser_pool.start()
+    results = await crosspost(args.video_file, targets, publish_date=parse_schedule(args.schedule) or 0,
+                              concurrency=args.concurrency)
+    print(format_results(results))
+
+
+async def browserd_main(argv):
+    """
+    browserd：前台运行常驻浏览器，之后的上传命令通过 CDP 连接它，不再各自启动浏览器
+    """
+    parser = argparse.ArgumentParser(prog="cli_main.py browserd",
+                                     description="Keep a browser alive between CLI invocations, uploads connect to it over CDP.")
+    parser.add_argument("--port", type=int, default=BROWSERD_PORT, help="Remote debugging port on 127.0.0.1")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run headless, only headless leases use it (uploads run headed by default)")
+    parser.add_argument("--status", action="store_true", help="Print the running daemon endpoint and exit")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        info = browserd.read_endpoint()
+        print(f"browserd is running: {info['ws_endpoint']} (pid {info['pid']}, headless={info['headless']})"
+              if info else "browserd is not running")
+        return
+    print(f"Starting browserd on 127.0.0.1:{args.port}, press Ctrl+C to stop")
+    await browserd.serve(port=args.port, headless=args.headless)
+
+
 async def main():
+    if sys.argv[1:2] == ['crosspost']:
+        # crosspost 不属于某一个平台，单独解析参数
+        return await crosspost_main(sys.argv[2:])
+    if sys.argv[1:2] == ['browserd']:
+        return await browserd_main(sys.argv[2:])
+
     # 主解析器
     parser = argparse.ArgumentParser(description="Upload video to multiple social-media.")
     parser.add_argument("platform", metavar='platform', choices=get_supported_social_media(), help="Choose social-media platform: douyin tencent tiktok kuaishou")
@@ -42,6 +178,10 @@ async def main():
             action_parser.add_argument("-pt", "--publish_type", type=int, choices=[0, 1],
                                        help="0 for immediate, 1 for scheduled", default=0)
             action_parser.add_argument('-t', '--schedule', help='Schedule UTC time in %Y-%m-%d %H:%M format')
+        elif action == 'watch':
+            action_parser.add_argument("video_dir", help="Folder to watch, each .mp4 needs a .txt (and optional .png)")
+            action_parser.add_argument("-c", "--concurrency", type=int, default=1,
+                                       help="Number of videos uploaded at the same time")
 
     # 解析命令行参数
     args = parser.parse_args()
@@ -51,24 +191,29 @@ async def main():
             raise FileNotFoundError(f'Could not find the video file at {args["video_file"]}')
         if args.publish_type == 1 and not args.schedule:
             parser.error("The schedule must must be specified for scheduled publishing.")
+        # 平台一定会拒绝的视频在启动浏览器之前就报错
+        result = preflight(args.video_file, args.platform)
+        log_preflight(result)
+        if not result.ok:
+            parser.error(f"{args.video_file} will be rejected by {args.platform}: {'; '.join(result.errors)}")
+    elif args.action == 'watch':
+        if not Path(args.video_dir).is_dir():
+            raise FileNotFoundError(f'Could not find the video folder at {args.video_dir}')
+        if args.concurrency < 1:
+            parser.error("The concurrency must be at least 1.")
 
-    account_file = Path(BASE_DIR / "cookies" / f"{args.platform}_{args.account_name}.json")
-    account_file.parent.mkdir(exist_ok=True)
+    account_file = get_account_file(args.platform, args.account_name)
+    # 参数校验通过后才启动浏览器池，--help 和参数错误时不启动 playwright
+    await browser_pool.start()
 
     # 根据 action 处理不同的逻辑
     if args.action == 'login':
         print(f"Logging in with account {args.account_name} on platform {args.platform}")
-        if args.platform == SOCIAL_MEDIA_DOUYIN:
-            await douyin_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_TIKTOK:
-            await tiktok_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_TENCENT:
-            await weixin_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_KUAISHOU:
-            await ks_setup(str(account_file), handle=True)
+        await setup_account(args.platform, account_file, handle=True)
     elif args.action == 'upload':
         title, tags = get_title_and_hashtags(args.video_file)
         video_file = args.video_file
+        upload_file = await faststart.prepare_upload_file(video_file)
 
         if args.publish_type == 0:
             print("Uploading immediately...")
@@ -77,25 +222,30 @@ async def main():
             print("Scheduling videos...")
             publish_date = parse_schedule(args.schedule)
 
-        if args.platform == SOCIAL_MEDIA_DOUYIN:
-            await douyin_setup(account_file, handle=False)
-            app = DouYinVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TIKTOK:
-            await tiktok_setup(account_file, handle=True)
-            app = TiktokVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TENCENT:
-            await weixin_setup(account_file, handle=True)
-            category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
-            app = TencentVideo(title, video_file, tags, publish_date, account_file, category)
-        elif args.platform == SOCIAL_MEDIA_KUAISHOU:
-            await ks_setup(account_file, handle=True)
-            app = KSVideo(title, video_file, tags, publish_date, account_file)
-        else:
+        if args.platform not in get_supported_social_media():
             print("Wrong platform, please check your input")
             exit()
+        await setup_account(args.platform, account_file, handle=args.platform != SOCIAL_MEDIA_DOUYIN)
+        app = create_uploader(args.platform, title, upload_file, tags, publish_date, account_file)
+
+        if not await upload_ledger.publish_once(app.main, video_file, args.platform, args.account_name):
+            print(f"{video_file} was already published to {args.platform} {args.account_name}, skipped")
+    elif args.action == 'watch':
+        await watch_folder(args.platform, args.account_name, account_file, args.video_dir, args.concurrency)
+
 
-        await app.main()
+async def run():
+    # cookie 校验和上传共用同一个浏览器池（在 main 里参数校验后启动），避免重复启动浏览器
+    try:
+        await main()
+    finally:
+        await browser_pool.stop()
+        # cookie 探测模块随平台上传模块按需导入，没有用到时不必关闭
+        cookie_probe = sys.modules.get('utils.cookie_probe')
+        if cookie_probe is not None:
+            await cookie_probe.aclose()
+        faststart.shutdown()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
@@ -3,3 +3,87 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent.resolve()
 XHS_SERVER = "http://127.0.0.1:11901"
 LOCAL_CHROME_PATH = ""   # change me necessary！ for example C:/Program Files/Google/Chrome/Application/chrome.exe
+
+# 浏览器池：单个浏览器租出多少次 context 后回收重启；所有浏览器进程内存（MB）超过该值时回收，0 表示不限制
+BROWSER_POOL_MAX_USES = 20
+BROWSER_POOL_MAX_RSS_MB = 2048
+
+# 等待视频上传完成的最长时间（秒）
+UPLOAD_COMPLETE_TIMEOUT = 30 * 60
+
+# watch 自动上传：文件静默多少秒视为写完；不支持 inotify 时轮询目录的间隔（秒）；上传队列和文件索引库的文件名（放在监听目录下）
+WATCH_DEBOUNCE = 5
+WATCH_POLL_INTERVAL = 10
+WATCH_DB_NAME = '.upload_watch.db'
+# watch 上传失败后自动重试的次数，以及首次重试的等待时间（秒），之后每次翻倍；重试用完的视频在下次启动 watch 时重新排队
+WATCH_UPLOAD_RETRIES = 3
+WATCH_RETRY_INTERVAL = 60
+# 上传台账（SQLite），记录每个视频在各平台账号下的发布状态，重复执行时跳过已发布的视频
+UPLOAD_LEDGER_DB = BASE_DIR / 'upload_ledger.db'
+# 上传前把 moov 移到文件开头（不重新编码），平台处理更快；进程池大小
+FASTSTART_ENABLED = True
+FASTSTART_WORKERS = 2
+# 任务事件流（SSE）：每个订阅者最多缓存的事件数，写满丢弃最旧的；每个任务保留的历史事件数（新订阅者先回放）；
+# 最多保留多少个任务的历史；没有事件时发送心跳的间隔（秒）
+EVENT_SUBSCRIBER_BUFFER = 100
+EVENT_HISTORY_SIZE = 50
+EVENT_MAX_JOBS = 1000
+SSE_HEARTBEAT_INTERVAL = 15
+# 一个视频同时发布到多个平台时，最多同时上传几个平台
+CROSSPOST_CONCURRENCY = 4
+# 上传时为每个账号使用持久化的浏览器 profile（cookies/profiles/ 下），复用 http 缓存和 service worker，二次打开页面更快；
+# 单个 profile 缓存上限（MB），所有 profile 缓存总上限（MB，超出时清理最久未使用的 profile 缓存）；等待 profile 锁的最长时间（秒）
+BROWSER_PERSISTENT_PROFILES = False
+BROWSER_PROFILE_DIR = BASE_DIR / 'cookies' / 'profiles'
+BROWSER_PROFILE_CACHE_MAX_MB = 300
+BROWSER_PROFILE_TOTAL_MAX_MB = 2048
+BROWSER_PROFILE_LOCK_TIMEOUT = 30 * 60
+# 精简模式：上传和 cookie 校验时屏蔽图片、字体、媒体和统计上报请求（规则见 utils/lean_mode.py），chromium 使用省内存的启动参数
+BROWSER_LEAN_MODE = False
+# browserd 守护进程：常驻浏览器的远程调试端口（只监听 127.0.0.1，本机任何进程都可以控制该浏览器）；
+# 端点信息写入的文件，上传时发现该文件且进程存活就通过 CDP 连接，否则自己启动浏览器
+BROWSERD_PORT = 9222
+BROWSERD_ENDPOINT_FILE = BASE_DIR / '.browserd.json'
+# browserd 的常驻浏览器运行超过该时长（秒）或内存（MB）超过该值后，在空闲（没有 context）时重启，0 表示不限制
+BROWSERD_MAX_UPTIME = 6 * 60 * 60
+BROWSERD_MAX_RSS_MB = 2048
+# 小红书签名服务：预热的页面数量、签名页地址、单个页面签名多少次后回收重建、等待签名函数就绪的超时（秒）
+XHS_SIGN_PAGES = 2
+XHS_SIGN_PAGE_URL = "https://www.xiaohongshu.com"
+XHS_SIGN_PAGE_MAX_USES = 500
+XHS_SIGN_TIMEOUT = 15
+# 小红书异步发布：同时上传的笔记数、连接池大小（同一账号的发布间隔见 PUBLISH_ACCOUNT_RATE_LIMITS）
+XHS_PUBLISH_CONCURRENCY = 3
+XHS_HTTP_MAX_CONNECTIONS = 20
+# 每个账号已上传未发布（含上传中）的笔记上限，避免提前上传太多，发布时上传凭证已过期
+XHS_PUBLISH_PENDING_PER_ACCOUNT = 2
+# 小红书话题缓存：tag -> 官方话题，查到话题缓存 7 天，查不到的 tag 缓存 1 天
+XHS_TOPIC_CACHE_DB = BASE_DIR / 'xhs_topic_cache.db'
+XHS_TOPIC_TTL = 7 * 24 * 3600
+XHS_TOPIC_NEGATIVE_TTL = 24 * 3600
+# 发布限速（令牌桶）：(每小时发布数, 桶容量)，桶容量即可以连续发布的数量，所有上传器点击发布前都要先拿到令牌。
+# 平台桶限制整个平台的发布速率，没有配置的平台不限；账号桶限制单个账号，没有配置的平台用默认值
+PUBLISH_PLATFORM_RATE_LIMITS = {
+    'douyin': (60, 5),
+    'tencent': (60, 5),
+    'kuaishou': (60, 5),
+    'tiktok': (60, 5),
+    'bilibili': (60, 5),
+    'xhs': (30, 3),
+}
+PUBLISH_ACCOUNT_RATE_LIMITS = {}
+# 同一账号每 30 秒最多发布一次，与原来示例里的 sleep(30) 相同
+PUBLISH_DEFAULT_ACCOUNT_RATE_LIMIT = (120, 1)
+# bilibili 上传：同时上传的视频数，每个账号同时处理（登录、上传到投稿）的视频数；分块并发数在上下限之间按实测速度自动调整；
+# 每个网络缓存最快的上传线路，超过间隔（秒）后重新测速，测速失败时使用的线路
+BILIBILI_UPLOAD_CONCURRENCY = 2
+BILIBILI_PENDING_PER_ACCOUNT = 2
+BILIBILI_UPLOAD_TASKS_MIN = 1
+BILIBILI_UPLOAD_TASKS_MAX = 8
+BILIBILI_UPLOAD_TASKS_DEFAULT = 3
+BILIBILI_LINE_REPROBE_INTERVAL = 6 * 3600
+BILIBILI_FALLBACK_LINE = 'bda2'
+BILIBILI_UPLOAD_TUNING_DB = BASE_DIR / 'bilibili_upload_tuning.db'
+# 吞吐量测量区间：加入了这么多个上传或开始超过这么久（秒）后不再接收新上传，之后的上传按新的测量结果选择分块并发数
+BILIBILI_MEASURE_PERIOD_UPLOADS = 4
+BILIBILI_MEASURE_PERIOD_SECONDS = 30 * 60
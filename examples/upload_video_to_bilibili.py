@@ -1,18 +1,47 @@
-import time
+import asyncio
 from pathlib import Path
 
 from uploader.bilibili_uploader.main import read_cookie_json_file, extract_keys_from_json, random_emoji, BilibiliUploader
 from conf import BASE_DIR
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI
 from utils.constant import VideoZoneTypes
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import filter_valid_videos
 
-if __name__ == '__main__':
+
+async def publish(cookie_data, account_name, file, tid, timestamp):
+    # 已经发布过的视频跳过
+    entry = await upload_ledger.abegin(file, SOCIAL_MEDIA_BILIBILI, account_name)
+    if entry is None:
+        print(f"已发布过，跳过：{file}")
+        return
+    title, tags = get_title_and_hashtags(str(file))
+    # just avoid error, bilibili don't allow same title of video.
+    title += random_emoji()
+    # 打印视频文件名、标题和 hashtag
+    print(f"视频文件名：{file}")
+    print(f"标题：{title}")
+    print(f"Hashtag：{tags}")
+    # I set desc same as title, do what u like.
+    desc = title
+    # 投稿间隔由 conf.PUBLISH_*_RATE_LIMITS 控制，同时上传的数量见 conf.BILIBILI_UPLOAD_CONCURRENCY
+    bili_uploader = BilibiliUploader(cookie_data, file, title, desc, tid, tags, timestamp, account_name=account_name)
+    try:
+        success = await bili_uploader.upload_async()
+    except Exception as e:
+        upload_ledger.finish(entry, error=str(e))
+        raise
+    upload_ledger.finish(entry, post_url=bili_uploader.post_url, error=None if success else '投稿失败')
+
+
+async def main():
     filepath = Path(BASE_DIR) / "videos"
     # how to get cookie, see the file of get_bilibili_cookie.py.
     account_file = Path(BASE_DIR / "cookies" / "bilibili_uploader" / "account.json")
     if not account_file.exists():
         print(f"{account_file.name} 配置文件不存在")
-        exit()
+        return
     cookie_data = read_cookie_json_file(account_file)
     cookie_data = extract_keys_from_json(cookie_data)
 
@@ -21,22 +50,17 @@ if __name__ == '__main__':
     folder_path = Path(filepath)
     # 获取文件夹中的所有文件
     files = list(folder_path.glob("*.mp4"))
+    # 过滤掉平台会拒绝的视频
+    files = filter_valid_videos(files, SOCIAL_MEDIA_BILIBILI)
     file_num = len(files)
     timestamps = generate_schedule_time_next_day(file_num, 1, daily_times=[16], timestamps=True)
 
-    for index, file in enumerate(files):
-        title, tags = get_title_and_hashtags(str(file))
-        # just avoid error, bilibili don't allow same title of video.
-        title += random_emoji()
-        tags_str = ','.join([tag for tag in tags])
-        # 打印视频文件名、标题和 hashtag
-        print(f"视频文件名：{file}")
-        print(f"标题：{title}")
-        print(f"Hashtag：{tags}")
-        # I set desc same as title, do what u like.
-        desc = title
-        bili_uploader = BilibiliUploader(cookie_data, file, title, desc, tid, tags, timestamps[index])
-        bili_uploader.upload()
-
-        # life is beautiful don't so rush. be kind be patience
-        time.sleep(30)
+    results = await asyncio.gather(*(publish(cookie_data, account_file.stem, file, tid, timestamps[index])
+                                     for index, file in enumerate(files)), return_exceptions=True)
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            print(f"投稿失败：{file}，{result}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
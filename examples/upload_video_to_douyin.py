@@ -3,7 +3,10 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import filter_valid_videos
 
 
 if __name__ == '__main__':
@@ -13,6 +16,8 @@ if __name__ == '__main__':
     folder_path = Path(filepath)
     # 获取文件夹中的所有文件
     files = list(folder_path.glob("*.mp4"))
+    # 过滤掉平台会拒绝的视频
+    files = filter_valid_videos(files, SOCIAL_MEDIA_DOUYIN)
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
     cookie_setup = asyncio.run(douyin_setup(account_file, handle=False))
@@ -28,4 +33,6 @@ if __name__ == '__main__':
             # app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file, thumbnail_path=thumbnail_path)
         # else:
         app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file)
-        asyncio.run(app.main(), debug=False)
+        # 已经发布过的视频跳过
+        if not asyncio.run(upload_ledger.publish_once(app.main, file, SOCIAL_MEDIA_DOUYIN, account_file.stem)):
+            print(f"已发布过，跳过：{file}")
@@ -3,8 +3,11 @@ from pathlib import Path
 
 from conf import BASE_DIR
 from uploader.tencent_uploader.main import weixin_setup, TencentVideo
+from utils.base_social_media import SOCIAL_MEDIA_TENCENT
 from utils.constant import TencentZoneTypes
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import filter_valid_videos
 
 
 if __name__ == '__main__':
@@ -14,6 +17,8 @@ if __name__ == '__main__':
     folder_path = Path(filepath)
     # 获取文件夹中的所有文件
     files = list(folder_path.glob("*.mp4"))
+    # 过滤掉平台会拒绝的视频
+    files = filter_valid_videos(files, SOCIAL_MEDIA_TENCENT)
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
     cookie_setup = asyncio.run(weixin_setup(account_file, handle=True))
@@ -25,4 +30,6 @@ if __name__ == '__main__':
         print(f"标题：{title}")
         print(f"Hashtag：{tags}")
         app = TencentVideo(title, file, tags, publish_datetimes[index], account_file, category)
-        asyncio.run(app.main(), debug=False)
+        # 已经发布过的视频跳过
+        if not asyncio.run(upload_ledger.publish_once(app.main, file, SOCIAL_MEDIA_TENCENT, account_file.stem)):
+            print(f"已发布过，跳过：{file}")
@@ -4,7 +4,10 @@ from pathlib import Path
 from conf import BASE_DIR
 # from tk_uploader.main import tiktok_setup, TiktokVideo
 from uploader.tk_uploader.main_chrome import tiktok_setup, TiktokVideo
+from utils.base_social_media import SOCIAL_MEDIA_TIKTOK
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import filter_valid_videos
 
 
 if __name__ == '__main__':
@@ -13,6 +16,8 @@ if __name__ == '__main__':
     folder_path = Path(filepath)
     # get video files from folder
     files = list(folder_path.glob("*.mp4"))
+    # skip videos that tiktok would reject
+    files = filter_valid_videos(files, SOCIAL_MEDIA_TIKTOK)
     file_num = len(files)
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
     cookie_setup = asyncio.run(tiktok_setup(account_file, handle=True))
@@ -27,4 +32,6 @@ if __name__ == '__main__':
             app = TiktokVideo(title, file, tags, publish_datetimes[index], account_file, thumbnail_path)
         else:
             app = TiktokVideo(title, file, tags, publish_datetimes[index], account_file)
-        asyncio.run(app.main(), debug=False)
+        # skip videos already published to this account
+        if not asyncio.run(upload_ledger.publish_once(app.main, file, SOCIAL_MEDIA_TIKTOK, account_file.stem)):
+            print(f"already published, skipped: {file}")
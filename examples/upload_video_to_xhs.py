@@ -1,68 +1,80 @@
+import asyncio
 import configparser
 from pathlib import Path
-from time import sleep
-
-from xhs import XhsClient
 
 from conf import BASE_DIR
+from utils.base_social_media import SOCIAL_MEDIA_XHS
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
-from uploader.xhs_uploader.main import sign_local, beauty_print
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import filter_valid_videos
+from uploader.xhs_uploader.async_client import AsyncXhsPublisher, XhsAccount, XhsVideoNote
+from uploader.xhs_uploader.main import beauty_print
+from uploader.xhs_uploader.topic_cache import collect_tags
 
 config = configparser.RawConfigParser()
 config.read(Path(BASE_DIR / "uploader" / "xhs_uploader" / "accounts.ini"))
 
 
-if __name__ == '__main__':
+async def publish(publisher, account, file, publish_datetime):
+    # 已经发布过的视频跳过
+    entry = await upload_ledger.abegin(file, SOCIAL_MEDIA_XHS, account.name)
+    if entry is None:
+        print(f"已发布过，跳过：{file}")
+        return
+    title, tags = get_title_and_hashtags(str(file))
+    # 加入到标题 补充标题（xhs 可以填1000字不写白不写）
+    tags_str = ' '.join(['#' + tag for tag in tags])
+
+    # 打印视频文件名、标题和 hashtag
+    print(f"视频文件名：{file}")
+    print(f"标题：{title}")
+    print(f"Hashtag：{tags}")
+
+    note = XhsVideoNote(video_file=str(file), title=title[:20], desc=title + tags_str, tags=tags,
+                        post_time=publish_datetime)
+    try:
+        result = await publisher.publish_video_note(account, note)
+    except Exception as e:
+        upload_ledger.finish(entry, error=str(e))
+        raise
+    note_id = result.get('id') if isinstance(result, dict) else None
+    upload_ledger.finish(entry, post_url=f'https://www.xiaohongshu.com/explore/{note_id}' if note_id else None)
+    beauty_print(result)
+
+
+async def main():
     filepath = Path(BASE_DIR) / "videos"
     # 获取视频目录
     folder_path = Path(filepath)
     # 获取文件夹中的所有文件
     files = list(folder_path.glob("*.mp4"))
+    # 过滤掉平台会拒绝的视频
+    files = filter_valid_videos(files, SOCIAL_MEDIA_XHS)
     file_num = len(files)
 
-    cookies = config['account1']['cookies']
-    xhs_client = XhsClient(cookies, sign=sign_local, timeout=60)
-    # auth cookie
-    # 注意：该校验cookie方式可能并没那么准确
-    try:
-        xhs_client.get_video_first_frame_image_id("3214")
-    except:
-        print("cookie 失效")
-        exit()
-
-    publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
+    # 签名服务需先启动：python -m uploader.xhs_uploader.sign_server
+    account = XhsAccount('account1', config['account1']['cookies'])
+    async with AsyncXhsPublisher() as publisher:
+        # auth cookie
+        # 注意：该校验cookie方式可能并没那么准确
+        if not await publisher.check_cookie(account):
+            print("cookie 失效")
+            return
 
-    for index, file in enumerate(files):
-        title, tags = get_title_and_hashtags(str(file))
-        # 加入到标题 补充标题（xhs 可以填1000字不写白不写）
-        tags_str = ' '.join(['#' + tag for tag in tags])
-        hash_tags_str = ''
-        hash_tags = []
+        # 发布前一次性查好所有视频的话题，已缓存的 tag 不再请求
+        await publisher.prefetch_topics(account, collect_tags(files))
 
-        # 打印视频文件名、标题和 hashtag
-        print(f"视频文件名：{file}")
-        print(f"标题：{title}")
-        print(f"Hashtag：{tags}")
+        publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
+        # 发布间隔由 conf.PUBLISH_*_RATE_LIMITS 控制，等待限速时其它视频可以先上传
+        results = await asyncio.gather(*(publish(publisher, account, file, publish_datetimes[index])
+                                         for index, file in enumerate(files)), return_exceptions=True)
+        for file, result in zip(files, results):
+            if isinstance(result, Exception):
+                print(f"发布失败：{file}，{result}")
+        topic_stats = publisher.topic_cache.stats()
+        print(f"话题缓存命中率：{topic_stats['hit_rate']:.0%}（{topic_stats['lookups']}次查询，"
+              f"{topic_stats['misses']}次未命中）")
 
-        topics = []
-        # 获取hashtag
-        for i in tags[:3]:
-            topic_official = xhs_client.get_suggest_topic(i)
-            if topic_official:
-                topic_official[0]['type'] = 'topic'
-                topic_one = topic_official[0]
-                hash_tag_name = topic_one['name']
-                hash_tags.append(hash_tag_name)
-                topics.append(topic_one)
 
-        hash_tags_str = ' ' + ' '.join(['#' + tag + '[话题]#' for tag in hash_tags])
-
-        note = xhs_client.create_video_note(title=title[:20], video_path=str(file),
-                                            desc=title + tags_str + hash_tags_str,
-                                            topics=topics,
-                                            is_private=False,
-                                            post_time=publish_datetimes[index].strftime("%Y-%m-%d %H:%M:%S"))
-
-        beauty_print(note)
-        # 强制休眠30s，避免风控（必要）
-        sleep(30)
+if __name__ == '__main__':
+    asyncio.run(main())
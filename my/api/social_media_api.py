@@ -1,24 +1,78 @@
-from fastapi import APIRouter,Request
+from typing import List, Optional
 
-from my.schemas.social_media_schema import UploadTaskRequest, LoginRequest, GenVideosTaskRequest
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from my.schemas.social_media_schema import UploadTaskRequest, LoginRequest, GenVideosTaskRequest, \
+    GenVideosCallbackRequest, CrosspostRequest
+from my.services.account_health import account_health_registry
+from my.services.job_manager import job_manager
 from my.services.social_media_ser import social_media_service
+from utils.browser_pool import browser_pool
 
 social_router = APIRouter(prefix="/social")
 
 
-@social_router.post("/login")
+@social_router.post("/login", status_code=202)
 async def user_login(login: LoginRequest):
+    """
+    后台执行登录，立即返回 job_id，通过 /jobs/{job_id} 查询结果
+    """
     print(f'接收到login:{login}')
-    # 将任务添加到队列中
-    result = await social_media_service.login(login.platform, login.account_name)
-    return {"message": result}
+    job = social_media_service.submit_login(login.platform, login.account_name)
+    return {"message": '任务提交成功', **job_manager.to_dict(job)}
 
 
-@social_router.post("/upload")
+@social_router.post("/upload", status_code=202)
 async def video_upload(upload: UploadTaskRequest):
-    # 将任务添加到队列中
-    result = await social_media_service.upload(upload.platform,upload.account_name)
-    return {"message": result}
+    """
+    后台执行上传，立即返回 job_id，通过 /jobs/{job_id} 查询结果
+    """
+    job = social_media_service.submit_upload(upload.platform, upload.account_name, upload.video_path)
+    return {"message": '任务提交成功', **job_manager.to_dict(job)}
+
+
+@social_router.post("/crosspost", status_code=202)
+async def video_crosspost(request: CrosspostRequest):
+    """
+    同一个视频并发发布到多个平台，任务结果里是每个平台的发布结果
+    """
+    job = social_media_service.submit_crosspost(request)
+    return {"message": '任务提交成功', **job_manager.to_dict(job)}
+
+
+@social_router.get("/jobs")
+async def list_jobs(job_ids: Optional[List[str]] = Query(None),
+                    platform: Optional[str] = None,
+                    state: Optional[str] = None):
+    """
+    批量查询登录、上传任务状态，不传 job_ids 时返回全部
+    """
+    return [job_manager.to_dict(job) for job in job_manager.list(job_ids, platform, state)]
+
+
+@social_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询任务状态，也可以查询视频生成任务
+    """
+    snapshot = social_media_service.get_job(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在：{job_id}")
+    return snapshot
+
+
+@social_router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: int = Header(0)):
+    """
+    SSE 推送任务的阶段变化、上传字节进度、生成进度和作品地址，任务结束后关闭连接
+    """
+    snapshot = social_media_service.get_job(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在：{job_id}")
+    return StreamingResponse(social_media_service.stream_job_events(job_id, snapshot, last_event_id),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @social_router.post("/gen/videos")
 async def gen_videos(request:Request,
@@ -36,3 +90,33 @@ async def gen_videos(request:Request,
 
     return {"message": '任务提交成功',
             'submitted_task':submitted_task}
+
+
+@social_router.post("/gen/callback")
+async def gen_videos_callback(callback: GenVideosCallbackRequest,
+                              x_callback_token: Optional[str] = Header(None),
+                              token: Optional[str] = Query(None)):
+    """
+    视频生成服务完成后回调，校验密钥后立即查询任务，生成完成的任务开始下载和发布
+    """
+    social_media_service.verify_gen_videos_callback(x_callback_token or token)
+    task = social_media_service.gen_videos_callback(callback)
+    return {"message": '回调处理成功',
+            'job_id': task.job_id,
+            'state': task.state}
+
+
+@social_router.get("/browser/pool")
+async def browser_pool_stats():
+    """
+    浏览器池状态
+    """
+    return browser_pool.stats()
+
+
+@social_router.get("/accounts/health")
+async def accounts_health(platform: Optional[str] = None):
+    """
+    各账号登录态缓存，调度方据此跳过失效账号，不会触发任何校验
+    """
+    return account_health_registry.snapshot(platform)
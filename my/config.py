@@ -1,3 +1,51 @@
+from pathlib import Path
+
 VIDEO_GEN_URL = 'http://127.0.0.1:8080/api/v1/videos'
 #后面加上taskid
-VIDEO_GEN_SEARCH_TASK_URL = 'http://127.0.0.1:8080/api/v1/tasks'
\ No newline at end of file
+VIDEO_GEN_SEARCH_TASK_URL = 'http://127.0.0.1:8080/api/v1/tasks'
+# 视频生成完成后回调的地址，例如 'http://127.0.0.1:8000/api/v1/social/gen/callback'；None 表示不使用回调，只靠轮询
+VIDEO_GEN_CALLBACK_URL = None
+# 回调密钥：回调请求需在 X-Callback-Token 头或回调地址的 token 参数中带上该值，None 时拒绝所有回调
+VIDEO_GEN_CALLBACK_SECRET = None
+# 使用回调时，轮询只作为漏掉回调的兜底，提交后首次查询的等待时间（秒）
+VIDEO_GEN_CALLBACK_POLL_INTERVAL = 60
+# 视频生成超时时间（秒），超时的任务不再查询
+GEN_VIDEO_TIMEOUT = 5 * 60
+
+# 账号登录态缓存有效期（秒），以及提前多久后台重新校验并刷新 storage_state
+ACCOUNT_HEALTH_TTL = 30 * 60
+ACCOUNT_HEALTH_REFRESH_AHEAD = 5 * 60
+# 后台巡检间隔（秒）和刷新登录态时同时打开的浏览器数
+ACCOUNT_HEALTH_INTERVAL = 60
+ACCOUNT_HEALTH_CONCURRENCY = 4
+
+# 视频生成任务库（SQLite），进程重启后继续处理未完成的任务
+GEN_VIDEO_DB_PATH = Path(__file__).parent / 'gen' / 'gen_video_tasks.db'
+# 任务租约时长（秒），持有租约的进程崩溃后，过期的任务可被重新领取
+GEN_VIDEO_TASK_LEASE = 10 * 60
+# 同时查询生成进度的任务数，以及按进度退避的查询间隔范围（秒）
+GEN_VIDEO_POLL_CONCURRENCY = 20
+GEN_VIDEO_POLL_MIN_INTERVAL = 2
+GEN_VIDEO_POLL_MAX_INTERVAL = 30
+# 下载/发布工作者个数
+GEN_VIDEO_WORKER_NUM = 2
+# 同时下载的视频数，以及单个视频断点续传的重试次数
+GEN_VIDEO_DOWNLOAD_CONCURRENCY = 3
+GEN_VIDEO_DOWNLOAD_RETRIES = 3
+# 边下载边发布时，已下载未发布的视频最多几个，限制磁盘占用
+GEN_VIDEO_PIPELINE_DEPTH = 2
+# 发布成功后删除本地视频
+GEN_VIDEO_DELETE_AFTER_PUBLISH = False
+# 下载/发布失败后的重试次数（超过后任务失败），以及首次重试的等待时间（秒），之后每次翻倍
+GEN_VIDEO_PUBLISH_RETRIES = 3
+GEN_VIDEO_PUBLISH_RETRY_INTERVAL = 60
+# 登录、上传等后台任务：各平台同时执行的任务数，未配置的平台使用默认值；内存中最多保留的已结束任务数
+JOB_PLATFORM_CONCURRENCY = {
+    'douyin': 2,
+    'tencent': 2,
+    'kuaishou': 2,
+    'tiktok': 2,
+    'crosspost': 1,  # 单个任务内部已经并发上传多个平台
+}
+JOB_DEFAULT_CONCURRENCY = 1
+JOB_MAX_FINISHED = 1000
@@ -0,0 +1,222 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from my.config import GEN_VIDEO_DB_PATH, GEN_VIDEO_TASK_LEASE
+from my.schemas.task import GenVideosTask, GenVideosTaskState
+
+# 当前进程的租约持有者标识
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gen_video_tasks (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    submit_time REAL NOT NULL,
+    title TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    state TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    videos TEXT NOT NULL DEFAULT '[]',
+    published TEXT NOT NULL DEFAULT '[]',
+    video_dir TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    next_poll_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_gen_video_tasks_state ON gen_video_tasks (state, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_gen_video_tasks_user ON gen_video_tasks (user_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_gen_video_tasks_task_id ON gen_video_tasks (task_id);
+"""
+
+_COLUMNS = ('job_id', 'user_id', 'task_id', 'submit_time', 'title', 'tags', 'state', 'progress', 'videos',
+            'published', 'video_dir', 'error', 'attempts', 'updated_at', 'next_poll_at')
+# 旧版本数据库缺少的列
+_MIGRATIONS = {
+    'next_poll_at': "ALTER TABLE gen_video_tasks ADD COLUMN next_poll_at REAL NOT NULL DEFAULT 0",
+    'published': "ALTER TABLE gen_video_tasks ADD COLUMN published TEXT NOT NULL DEFAULT '[]'",
+}
+_JSON_COLUMNS = ('tags', 'videos', 'published')
+
+
+class GenVideosTaskStore(object):
+    """
+    持久化的视频生成任务库（SQLite WAL），支持原子领取任务（租约）和同一用户多个任务
+    """
+
+    def __init__(self, db_path: Path = GEN_VIDEO_DB_PATH, lease_seconds: int = GEN_VIDEO_TASK_LEASE):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(gen_video_tasks)')}
+            for column, sql in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(sql)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _to_task(row: sqlite3.Row) -> GenVideosTask:
+        values = {column: row[column] for column in _COLUMNS}
+        for column in _JSON_COLUMNS:
+            values[column] = json.loads(values[column])
+        return GenVideosTask(**values)
+
+    def add(self, task: GenVideosTask) -> GenVideosTask:
+        task.job_id = task.job_id or uuid.uuid4().hex
+        task.updated_at = time.time()
+        values = [json.dumps(getattr(task, column), ensure_ascii=False) if column in _JSON_COLUMNS
+                  else getattr(task, column) for column in _COLUMNS]
+        with self._lock:
+            self.conn.execute(f"INSERT INTO gen_video_tasks ({', '.join(_COLUMNS)}) "
+                              f"VALUES ({', '.join('?' * len(_COLUMNS))})", values)
+        return task
+
+    def get(self, job_id) -> Optional[GenVideosTask]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM gen_video_tasks WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_task(row) if row else None
+
+    def get_by_task_id(self, task_id) -> Optional[GenVideosTask]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM gen_video_tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_task(row) if row else None
+
+    def list(self, states: Iterable[str] = None, user_id: str = None) -> List[GenVideosTask]:
+        sql, params = "SELECT * FROM gen_video_tasks WHERE 1 = 1", []
+        if states:
+            states = list(states)
+            sql += f" AND state IN ({', '.join('?' * len(states))})"
+            params += states
+        if user_id:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        with self._lock:
+            rows = self.conn.execute(sql + " ORDER BY submit_time", params).fetchall()
+        return [self._to_task(row) for row in rows]
+
+    def update(self, job_id, **fields) -> None:
+        fields['updated_at'] = time.time()
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], ensure_ascii=False)
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE gen_video_tasks SET {assignments} WHERE job_id = ?",
+                              list(fields.values()) + [job_id])
+
+    def transition(self, job_id, from_states: Iterable[str], **fields) -> bool:
+        """
+        只有任务仍处于 from_states 时才更新，返回是否更新成功；用于回调和轮询同时修改同一个任务
+        """
+        from_states = list(from_states)
+        fields['updated_at'] = time.time()
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], ensure_ascii=False)
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        with self._lock:
+            cursor = self.conn.execute(
+                f"UPDATE gen_video_tasks SET {assignments} "
+                f"WHERE job_id = ? AND state IN ({', '.join('?' * len(from_states))})",
+                list(fields.values()) + [job_id] + from_states)
+        return cursor.rowcount > 0
+
+    def claim(self, states: Iterable[str], limit: int = 1, owner: str = WORKER_ID,
+              due: bool = False) -> List[GenVideosTask]:
+        """
+        原子领取处于指定状态、且没有被其他进程持有租约的任务；due=True 时只领取到了查询时间的任务
+        """
+        states = list(states)
+        now = time.time()
+        sql = (f"SELECT * FROM gen_video_tasks WHERE state IN ({', '.join('?' * len(states))}) "
+               f"AND (lease_expires IS NULL OR lease_expires < ?)")
+        params = states + [now]
+        if due:
+            sql += " AND next_poll_at <= ? ORDER BY next_poll_at LIMIT ?"
+            params += [now, limit]
+        else:
+            sql += " ORDER BY updated_at LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(sql, params).fetchall()
+                conn.executemany(
+                    "UPDATE gen_video_tasks SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE job_id = ?",
+                    [(owner, now + self.lease_seconds, row['job_id']) for row in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        tasks = [self._to_task(row) for row in rows]
+        for task in tasks:
+            task.attempts += 1
+        return tasks
+
+    def release(self, job_id, owner: str = WORKER_ID, delay: float = 0) -> None:
+        # delay > 0 时任务在这段时间内不会被再次领取，用于失败后退避重试
+        with self._lock:
+            self.conn.execute("UPDATE gen_video_tasks SET lease_owner = NULL, lease_expires = ? "
+                              "WHERE job_id = ? AND lease_owner = ?",
+                              (time.time() + delay if delay > 0 else None, job_id, owner))
+
+    def renew(self, job_id, owner: str = WORKER_ID) -> None:
+        # 长时间的下载/发布需要续租，避免租约过期后被重复领取
+        with self._lock:
+            self.conn.execute("UPDATE gen_video_tasks SET lease_expires = ? WHERE job_id = ? AND lease_owner = ?",
+                              (time.time() + self.lease_seconds, job_id, owner))
+
+    def recover(self) -> int:
+        """
+        进程启动时调用：清理已过期的租约，发布中断的任务退回到已下载重新发布；
+        未过期的租约可能属于同一台机器上仍在运行的其他进程，不能回收
+        """
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute("UPDATE gen_video_tasks SET state = ? "
+                             "WHERE state = ? AND lease_owner IS NOT NULL AND lease_expires < ?",
+                             (GenVideosTaskState.DOWNLOADED, GenVideosTaskState.UPLOADING, now))
+                cursor = conn.execute("UPDATE gen_video_tasks SET lease_owner = NULL, lease_expires = NULL "
+                                      "WHERE lease_owner IS NOT NULL AND lease_expires < ?", (now,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return cursor.rowcount
+
+
+# 创建服务实例
+gen_video_task_store = GenVideosTaskStore()
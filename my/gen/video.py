@@ -1,47 +1,59 @@
 import asyncio
+import contextlib
+import hashlib
 import os
+import re
 import time
 import traceback
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import List, Optional, Tuple
 
 import aiofiles
 import httpx
 from fastapi import HTTPException
 from loguru import logger
 
-from my.config import VIDEO_GEN_URL, VIDEO_GEN_SEARCH_TASK_URL
-from my.schemas.task import GenVideosTask
+from my.config import VIDEO_GEN_URL, VIDEO_GEN_SEARCH_TASK_URL, GEN_VIDEO_POLL_CONCURRENCY, \
+    GEN_VIDEO_POLL_MIN_INTERVAL, GEN_VIDEO_POLL_MAX_INTERVAL, GEN_VIDEO_WORKER_NUM, VIDEO_GEN_CALLBACK_URL, \
+    VIDEO_GEN_CALLBACK_POLL_INTERVAL, GEN_VIDEO_DOWNLOAD_CONCURRENCY, GEN_VIDEO_DOWNLOAD_RETRIES, \
+    GEN_VIDEO_PIPELINE_DEPTH, GEN_VIDEO_DELETE_AFTER_PUBLISH, GEN_VIDEO_PUBLISH_RETRIES, \
+    GEN_VIDEO_PUBLISH_RETRY_INTERVAL, GEN_VIDEO_TIMEOUT
+from my.gen.task_store import gen_video_task_store
+from my.schemas.task import GenVideosTask, GenVideosTaskState, POLL_GEN_VIDEOS_TASK_STATES, \
+    PUBLISH_GEN_VIDEOS_TASK_STATES
+from my.services.account_health import account_health_registry
 from my.utils.data_util import get_douyin_cookie_path
-from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
+from uploader.douyin_uploader.main import DouYinVideo
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN
+from utils.events import event_bus, bind_job, EVENT_STAGE, EVENT_GEN_PROGRESS, EVENT_PUBLISHED
+from utils.faststart import prepare_upload_file, faststart_cache_path
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
-
-# uid->Task
-gen_video_tasks: Dict[str, GenVideosTask] = {}
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import preflight, log_preflight, filter_valid_videos
 
 # E:\projects\upload-test\my\utils
 current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
 
+# 视频生成服务返回的任务状态
+GEN_SERVICE_STATE_FAILED = -1
+GEN_SERVICE_STATE_COMPLETE = 1
+
 
-def check_task(uid):
-    if uid in gen_video_tasks:
-        logger.error(f'用户：{uid}任务还未结束，无法提交请求')
-        raise HTTPException(status_code=500, detail=f"用户：{uid}任务还未结束，无法提交请求")
+class GenVideoFailedError(Exception):
+    """
+    视频生成确定失败（超时或生成服务返回失败），不再重试
+    """
 
 
-def add_task(uid, task_id):
+def add_task(uid, task: GenVideosTask):
     if uid is None:
         raise HTTPException(status_code=500, detail=f"用户名为空")
-    if task_id is None:
+    if task.task_id is None:
         raise HTTPException(status_code=500, detail=f"用户：{uid}的task_id为空")
 
-    gen_video_tasks[uid] = task_id
-    print(f'加入用户任务id:{task_id}')
-
-
-def remove_task(uid):
-    gen_video_tasks.pop(uid, None)
+    gen_video_task_store.add(task)
+    print(f'加入用户任务id:{task.task_id}')
 
 
 def get_or_create_user_video_dir(uid):
@@ -58,8 +70,6 @@ def get_or_create_user_video_dir(uid):
 
 async def submit_create_videos_task(aclient: httpx.AsyncClient, subject,
                                     uid, title, tags):
-    check_task(uid)
-
     payload = {
         "video_subject": subject,
         "video_script": "",
@@ -90,6 +100,9 @@ async def submit_create_videos_task(aclient: httpx.AsyncClient, subject,
         "n_threads": 2,
         "paragraph_number": 1  # 生成视频脚本的段落个数
     }
+    if VIDEO_GEN_CALLBACK_URL:
+        # 生成完成后由视频生成服务回调通知
+        payload["callback_url"] = VIDEO_GEN_CALLBACK_URL
 
     start_time = time.time()
 
@@ -116,37 +129,63 @@ async def submit_create_videos_task(aclient: httpx.AsyncClient, subject,
 
     task_id = response_data['data']['task_id']
     task = GenVideosTask(uid, task_id, start_time, title, tags)
+    if VIDEO_GEN_CALLBACK_URL:
+        # 有回调时先不轮询，等回调或兜底查询
+        task.next_poll_at = start_time + VIDEO_GEN_CALLBACK_POLL_INTERVAL
     add_task(uid, task)
+    event_bus.publish(task.job_id, EVENT_STAGE, state=task.state, task_id=task_id)
 
     return task
 
 
-async def upload_douyin(account_name, video_folder_path):
+async def get_douyin_account_file(account_name):
     account_file = get_douyin_cookie_path(account_name)
+    # 登录态优先读缓存，失效账号直接跳过，不再打开浏览器上传
+    cookie_setup = await account_health_registry.validate(SOCIAL_MEDIA_DOUYIN, account_name)
+    if not cookie_setup:
+        raise Exception(f"用户：{account_name}的抖音cookie已失效，请重新登录")
+    return account_file
+
+
+async def publish_douyin_video(account_name, account_file, file, publish_datetime):
+    file = Path(file)
+    title, tags = get_title_and_hashtags(str(file))
+    thumbnail_path = file.with_suffix('.png')
+    # 打印视频文件名、标题和 hashtag
+    # 暂时没有时间修复封面上传，故先隐藏掉该功能
+    # if thumbnail_path.exists():
+    # app = DouYinVideo(title, file, tags, publish_datetime, account_file, thumbnail_path=thumbnail_path)
+    # else:
+    logger.info(f'视频文件名：{file},标题：{title},Hashtag：{tags}')
+    # 生成服务的视频 moov 一般在末尾，先转成 faststart 让平台更快处理完
+    upload_file = await prepare_upload_file(file)
+    app = DouYinVideo(title, upload_file, tags, publish_datetime, account_file)
+    # 同一个视频已经发布到该账号时跳过
+    if not await upload_ledger.publish_once(app.main, file, SOCIAL_MEDIA_DOUYIN, account_name):
+        logger.info(f'视频已发布过，跳过：{file}')
+        event_bus.emit(EVENT_PUBLISHED, file=file.name, title=title, skipped=True)
+        return False
+    logger.info(f'【{title}】发布完成')
+    event_bus.emit(EVENT_PUBLISHED, file=file.name, title=title, post_url=getattr(app, 'post_url', None))
+    return True
+
+
+async def upload_douyin(account_name, video_folder_path, files: List[str] = None):
     # 获取视频目录
     folder_path = Path(video_folder_path)
-    # 获取文件夹中的所有文件
-    files = list(folder_path.glob("*.mp4"))
+    # 只上传指定的文件，否则取文件夹中的所有视频（未校验完的下载是 .part 文件，不会被选中）
+    files = [Path(file) for file in files] if files is not None else list(folder_path.glob("*.mp4"))
+    # 过滤掉平台会拒绝的视频
+    files = filter_valid_videos(files, SOCIAL_MEDIA_DOUYIN)
     file_num = len(files)
     if file_num <= 0:
         raise Exception(f"用户：{account_name}上传的视频个数为0，路径：{video_folder_path}")
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
-    cookie_setup = await douyin_setup(account_file, handle=False)
-    # 抖音设置完毕,account_file:E:\projects\upload-test\cookies\douyin_uploader\tsy1.json,cookie_setup=True,publish_datetimes=[datetime.datetime(2025, 2, 21, 16, 0)]
-    logger.info(
-        f'抖音设置完毕,account_file:{account_file},cookie_setup={cookie_setup},publish_datetimes={publish_datetimes}')
+    account_file = await get_douyin_account_file(account_name)
+    # 抖音设置完毕,account_file:E:\projects\upload-test\cookies\douyin_uploader\tsy1.json,publish_datetimes=[datetime.datetime(2025, 2, 21, 16, 0)]
+    logger.info(f'抖音设置完毕,account_file:{account_file},publish_datetimes={publish_datetimes}')
     for index, file in enumerate(files):
-        title, tags = get_title_and_hashtags(str(file))
-        thumbnail_path = file.with_suffix('.png')
-        # 打印视频文件名、标题和 hashtag
-        # 暂时没有时间修复封面上传，故先隐藏掉该功能
-        # if thumbnail_path.exists():
-        # app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file, thumbnail_path=thumbnail_path)
-        # else:
-        logger.info(f'视频文件名：{file},标题：{title},Hashtag：{tags}')
-        app = DouYinVideo(title, file, tags, publish_datetimes[index], account_file)
-        result = await app.main()
-        logger.info(f'【{title}】发布完成,{result}')
+        await publish_douyin_video(account_name, account_file, file, publish_datetimes[index])
 
     logger.info(f'【{account_file}】发布完成')
 
@@ -158,11 +197,9 @@ async def gen_videos_url(aclient: httpx.AsyncClient, task: GenVideosTask):
     elapsed_time = int(start_time - task.submit_time)
 
     # 判断是否超时
-    if elapsed_time > 300:  # 300 seconds = 5 minutes
+    if elapsed_time > GEN_VIDEO_TIMEOUT:
         logger.error(f'超时！视频生成任务：{task_id} 超时，取消该任务！')
-        # 使用 pop 方法移除指定键的元素，并提供一个默认值以防键不存在
-        remove_task(task.user_id)
-        return
+        raise GenVideoFailedError(f'视频生成任务：{task_id} 超时')
 
     response = await aclient.get(f"{VIDEO_GEN_SEARCH_TASK_URL}/{task_id}")
 
@@ -185,13 +222,18 @@ async def gen_videos_url(aclient: httpx.AsyncClient, task: GenVideosTask):
         raise HTTPException(status_code=response.status_code, detail=msg)
 
     data = response_data['data']
-    if data['state'] == 1:
+    if data['state'] == GEN_SERVICE_STATE_FAILED:
+        raise GenVideoFailedError(f'视频生成任务：{task_id} 生成失败')
+    if data['state'] == GEN_SERVICE_STATE_COMPLETE:
         # ["http://127.0.0.1:8080/tasks/d9090137-c057-4295-8520-cde96dceccc7/final-1.mp4"]
         videos_url_list = data['videos']
         logger.info(f'视频生成完成,共计{len(videos_url_list)}个')
         return videos_url_list
     else:
         progress = data['progress']
+        task.state = GenVideosTaskState.GENERATING
+        task.progress = progress
+        event_bus.publish(task.job_id, EVENT_GEN_PROGRESS, progress=progress, elapsed=elapsed_time)
         logger.info(f'视频生成中，用户:{task}，进度{progress}%，耗时：{elapsed_time}')
 
 
@@ -207,64 +249,382 @@ async def write_video_text_des(save_dir_path, txt_name, title, tags):
     logger.info(f'视频描述文件写入成功，title：{title}，tags：{formatted_tags}，路径：{txt_filepath}')
 
 
-async def download_videos(aclient: httpx.AsyncClient,
-                          uid: str,
-                          urls: List[str], title, tags):
+def get_video_save_dir(uid):
     # 获取当前时间并格式化为年月日时分秒
     current_time = datetime.now().strftime("%Y%m%d%H%M%S")
-    user_videos_dir = get_or_create_user_video_dir(uid)
-    save_dir_path = os.path.join(user_videos_dir, current_time)
+    return os.path.join(get_or_create_user_video_dir(uid), current_time)
 
-    # 目录存在就报错
-    os.makedirs(save_dir_path, exist_ok=False)
 
-    for url in urls:
-        # 获取文件名
-        filename = url.split('/')[-1]
-        filepath = os.path.join(save_dir_path, filename)
+def _sha256_file(filepath, sha=None):
+    sha = sha or hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha
 
-        # 提取并创建视频描述的文件
-        filename_without_extension = os.path.splitext(filename)[0]
-        txt_name = f'{filename_without_extension}.txt'
-        await write_video_text_des(save_dir_path, txt_name, title, tags)
 
-        async with aclient.stream('GET', url) as response:
-            response.raise_for_status()  # 检查请求是否成功
+def _content_range_total(response: httpx.Response) -> Optional[int]:
+    # Content-Range: bytes 100-199/200，416 时为 bytes */200
+    match = re.match(r'bytes (?:\d+-\d+|\*)/(\d+)', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
 
-            # 使用 aiofiles 异步写入文件
-            async with aiofiles.open(filepath, 'wb') as f:
-                async for chunk in response.aiter_bytes():
-                    if chunk:  # 如果块不为空
-                        await f.write(chunk)
 
-        logger.info(f'{filename} 下载完毕')
+async def download_file(aclient: httpx.AsyncClient, url, filepath) -> str:
+    """
+    下载到 .part 文件，断线后用 Range 续传；长度校验通过后才改成正式文件名，返回文件的 SHA-256
+    """
+    if os.path.exists(filepath):
+        # 上次已经下载并校验过
+        return (await asyncio.to_thread(_sha256_file, filepath)).hexdigest()
 
-    return save_dir_path
+    part_path = f'{filepath}.part'
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            async with aclient.stream('GET', url, headers=headers) as response:
+                if offset and response.status_code == 416:
+                    if _content_range_total(response) == offset:
+                        # .part 已经下载完整，只是没来得及改名
+                        os.replace(part_path, filepath)
+                        return (await asyncio.to_thread(_sha256_file, filepath)).hexdigest()
+                    # Range 超出文件长度，.part 已不可信，从头下载，不计入重试次数
+                    os.remove(part_path)
+                    continue
+                if offset and response.status_code == 206:
+                    # 续传时先把已下载的部分计入摘要
+                    sha = await asyncio.to_thread(_sha256_file, part_path)
+                    total = _content_range_total(response)
+                    mode = 'ab'
+                else:
+                    # 服务端不支持 Range 或 .part 已失效，从头下载
+                    response.raise_for_status()
+                    sha = hashlib.sha256()
+                    offset = 0
+                    total = None
+                    mode = 'wb'
+                expected = response.headers.get('Content-Length')
+                received = 0
+
+                async with aiofiles.open(part_path, mode) as f:
+                    async for chunk in response.aiter_bytes():
+                        if chunk:  # 如果块不为空
+                            sha.update(chunk)
+                            received += len(chunk)
+                            await f.write(chunk)
+
+            if expected is not None and received != int(expected):
+                raise IOError(f'下载不完整：{received}/{expected} bytes')
+            if total is None:
+                total = int(expected) if expected is not None else None
+            if total is not None and offset + received != total:
+                raise IOError(f'文件长度不一致：{offset + received}/{total} bytes')
+
+            os.replace(part_path, filepath)
+            return sha.hexdigest()
+        except (httpx.TransportError, httpx.HTTPStatusError, IOError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                raise
+            attempt += 1
+            if attempt >= GEN_VIDEO_DOWNLOAD_RETRIES:
+                raise
+            logger.warning(f'下载{url}失败，第{attempt}次重试：{e}')
+            await asyncio.sleep(2 ** attempt)
+
+
+async def download_video(aclient: httpx.AsyncClient, url, save_dir_path) -> Tuple[str, str]:
+    # 获取文件名
+    filename = url.split('/')[-1]
+    filepath = os.path.join(save_dir_path, filename)
+    checksum = await download_file(aclient, url, filepath)
+    logger.info(f'{filename} 下载完毕，sha256：{checksum}')
+    return filepath, checksum
+
+
+async def keep_verified_video(filepath, checksum, checksums: set, title, tags) -> bool:
+    """
+    内容相同或抖音会拒绝的视频不保留，保留的视频写入描述文件
+    """
+    if checksum in checksums:
+        logger.info(f'{filepath} 与已下载的视频内容相同，跳过')
+        os.remove(filepath)
+        return False
+    checksums.add(checksum)
+    result = preflight(filepath, SOCIAL_MEDIA_DOUYIN)
+    log_preflight(result)
+    if not result.ok:
+        return False
+
+    # 提取并创建视频描述的文件
+    filename_without_extension = os.path.splitext(os.path.basename(filepath))[0]
+    txt_name = f'{filename_without_extension}.txt'
+    await write_video_text_des(os.path.dirname(filepath), txt_name, title, tags)
+    return True
 
 
-async def process_gen_video_tasks(aclient: httpx.AsyncClient):
-    while True:
+async def download_videos(aclient: httpx.AsyncClient,
+                          uid: str,
+                          urls: List[str], title, tags,
+                          save_dir_path=None) -> Tuple[str, List[str]]:
+    """
+    并行下载并校验视频，返回保存目录和校验通过的视频路径；内容相同的视频只保留一个
+    """
+    save_dir_path = save_dir_path or get_video_save_dir(uid)
+    # 传入同一个目录时继续上次未完成的下载
+    os.makedirs(save_dir_path, exist_ok=True)
+    semaphore = asyncio.Semaphore(GEN_VIDEO_DOWNLOAD_CONCURRENCY)
+
+    async def download(url):
+        async with semaphore:
+            return await download_video(aclient, url, save_dir_path)
+
+    files = []
+    checksums = set()
+    for filepath, checksum in await asyncio.gather(*(download(url) for url in urls)):
+        if await keep_verified_video(filepath, checksum, checksums, title, tags):
+            files.append(filepath)
+
+    return save_dir_path, files
+
+
+async def download_and_publish(aclient: httpx.AsyncClient, task: GenVideosTask):
+    """
+    边下载边发布：每个视频校验通过后立即放入有界队列，发布协程马上取走发布，
+    首个视频的发布时间与视频个数无关；已下载未发布的视频不超过 GEN_VIDEO_PIPELINE_DEPTH 个
+    """
+    account_file = await get_douyin_account_file(task.user_id)
+    os.makedirs(task.video_dir, exist_ok=True)
+    # 进程重启后跳过已经发布过的视频
+    urls = [url for url in task.videos if url.split('/')[-1] not in task.published]
+    publish_datetimes = generate_schedule_time_next_day(len(task.videos), 1, daily_times=[16])
+    logger.info(f'抖音设置完毕,account_file:{account_file},publish_datetimes={publish_datetimes}')
+
+    # 多留一个位置给结束标记
+    queue = asyncio.Queue(maxsize=GEN_VIDEO_PIPELINE_DEPTH + 1)
+    # 下载前占位，发布后释放，下载中的视频也计入磁盘占用
+    slots = asyncio.Semaphore(GEN_VIDEO_PIPELINE_DEPTH)
+    download_semaphore = asyncio.Semaphore(GEN_VIDEO_DOWNLOAD_CONCURRENCY)
+    checksums = set()
+
+    async def produce(url):
+        await slots.acquire()
         try:
-            logger.info('搜索视频任务...')
-            for uid, task in gen_video_tasks.items():
-                videos_url_list = await gen_videos_url(aclient, task)
+            async with download_semaphore:
+                filepath, checksum = await download_video(aclient, url, task.video_dir)
+            kept = await keep_verified_video(filepath, checksum, checksums, task.title, task.tags)
+        except BaseException:
+            slots.release()
+            raise
+        if kept:
+            event_bus.publish(task.job_id, EVENT_STAGE, state=GenVideosTaskState.DOWNLOADED,
+                              file=os.path.basename(filepath))
+            queue.put_nowait(filepath)
+        else:
+            slots.release()
 
-                if videos_url_list:
-                    try:
-                        logger.info(f'搜索到完成的视频链接：{videos_url_list}')
-                        videos_dir = await download_videos(aclient, uid,
-                                                           videos_url_list,
-                                                           task.title, task.tags)
+    async def producer():
+        downloads = [asyncio.create_task(produce(url)) for url in urls]
+        try:
+            await asyncio.gather(*downloads)
+        finally:
+            for download in downloads:
+                download.cancel()
+            queue.put_nowait(None)
+
+    producer_task = asyncio.create_task(producer())
+    try:
+        while True:
+            filepath = await queue.get()
+            if filepath is None:
+                break
+            await publish_douyin_video(task.user_id, account_file, filepath, publish_datetimes[len(task.published)])
+            task.published.append(os.path.basename(filepath))
+            gen_video_task_store.update(task.job_id, published=task.published)
+            if GEN_VIDEO_DELETE_AFTER_PUBLISH:
+                os.remove(filepath)
+                os.remove(os.path.splitext(filepath)[0] + '.txt')
+                faststart_cache_path(filepath).unlink(missing_ok=True)
+            slots.release()
+    except BaseException:
+        # 发布失败时停止下载，等下载协程退出后再抛出发布的异常
+        producer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await producer_task
+        raise
+    # 下载失败时抛出异常
+    await producer_task
+    logger.info(f'【{account_file}】发布完成')
 
-                        await upload_douyin(uid, videos_dir)
-                    except Exception as e:
-                        logger.error(f"发布视频时异常: {e}\n{traceback.format_exc()}")
-                    finally:
-                        remove_task(task.user_id)
 
-            await asyncio.sleep(5)
+def next_poll_delay(task: GenVideosTask) -> float:
+    """
+    按已用时间和进度估算剩余时间，每次等待剩余时间的一半，进度越慢查询越稀疏；
+    间隔不超过 GEN_VIDEO_POLL_MAX_INTERVAL，且超时前至少还会再查一次
+    """
+    elapsed = max(time.time() - task.submit_time, 0)
+    remaining = elapsed * (100 - task.progress) / task.progress if task.progress > 0 else elapsed
+    # 有回调时轮询只是兜底，按整个剩余时间等待
+    delay = remaining if VIDEO_GEN_CALLBACK_URL else remaining / 2
+    delay = min(max(delay, GEN_VIDEO_POLL_MIN_INTERVAL), GEN_VIDEO_POLL_MAX_INTERVAL)
+    return max(min(delay, GEN_VIDEO_TIMEOUT - elapsed - GEN_VIDEO_POLL_MIN_INTERVAL), GEN_VIDEO_POLL_MIN_INTERVAL)
+
+
+async def poll_gen_video_task(aclient: httpx.AsyncClient, task: GenVideosTask, finished: asyncio.Queue):
+    """
+    查询一次生成进度：完成的任务交给下载/发布工作者，未完成的按进度安排下次查询
+    """
+    generated = False
+    try:
+        videos_url_list = await gen_videos_url(aclient, task)
+        # 查询期间回调可能已经改了状态，只在仍处于查询状态时更新
+        if videos_url_list:
+            logger.info(f'搜索到完成的视频链接：{videos_url_list}')
+            generated = gen_video_task_store.transition(task.job_id, POLL_GEN_VIDEOS_TASK_STATES,
+                                                        state=GenVideosTaskState.GENERATED, progress=100,
+                                                        videos=videos_url_list, attempts=0)
+            if generated:
+                event_bus.publish(task.job_id, EVENT_STAGE, state=GenVideosTaskState.GENERATED,
+                                  videos=len(videos_url_list))
+        else:
+            gen_video_task_store.transition(task.job_id, POLL_GEN_VIDEOS_TASK_STATES,
+                                            state=task.state, progress=task.progress,
+                                            next_poll_at=time.time() + next_poll_delay(task))
+    except GenVideoFailedError as e:
+        logger.error(f"视频任务{task.job_id}生成失败: {e}")
+        if gen_video_task_store.transition(task.job_id, POLL_GEN_VIDEOS_TASK_STATES,
+                                           state=GenVideosTaskState.FAILED, error=str(e)):
+            end_gen_video_task(task.job_id, GenVideosTaskState.FAILED, error=str(e))
+    except Exception as e:
+        # 网络错误、查询接口 5xx 等，稍后再查，超时前仍未成功才会失败
+        logger.warning(f"查询视频任务{task.job_id}进度时异常，稍后重试: {e}\n{traceback.format_exc()}")
+        gen_video_task_store.transition(task.job_id, POLL_GEN_VIDEOS_TASK_STATES, error=str(e),
+                                        next_poll_at=time.time() + GEN_VIDEO_POLL_MAX_INTERVAL)
+    finally:
+        gen_video_task_store.release(task.job_id)
+    if generated:
+        finished.put_nowait(task.job_id)
+
+
+def on_gen_video_callback(task_id) -> GenVideosTask:
+    """
+    视频生成服务的回调只作为唤醒信号：立即安排一次查询，状态和视频链接以查询接口的返回为准，不信任回调内容
+    """
+    task = gen_video_task_store.get_by_task_id(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"视频生成任务不存在：{task_id}")
+
+    # 重复的回调、已经处理完的任务不会再安排查询
+    if gen_video_task_store.transition(task.job_id, POLL_GEN_VIDEOS_TASK_STATES, next_poll_at=0):
+        logger.info(f'收到视频生成回调，立即查询任务：{task_id}')
+
+    return gen_video_task_store.get(task.job_id)
+
+
+def end_gen_video_task(job_id, state, error=None):
+    event_bus.publish(job_id, EVENT_STAGE, state=state, error=error)
+    event_bus.end(job_id, state=state, error=error)
+
+
+async def handle_gen_video_task(aclient: httpx.AsyncClient, task: GenVideosTask) -> float:
+    """
+    生成完成的任务边下载边发布，进程重启后跳过已发布的视频继续处理；
+    失败时返回重试前需要等待的秒数，重试 GEN_VIDEO_PUBLISH_RETRIES 次仍失败才标记为失败
+    """
+    uid = task.user_id
+    # 发布过程中上传器发出的进度事件都归属到该任务
+    with bind_job(task.job_id):
+        try:
+            if not task.video_dir:
+                # 先记录下载目录，进程重启后在同一目录续传
+                task.video_dir = get_video_save_dir(uid)
+                gen_video_task_store.update(task.job_id, video_dir=task.video_dir)
+            gen_video_task_store.update(task.job_id, state=GenVideosTaskState.UPLOADING)
+            event_bus.publish(task.job_id, EVENT_STAGE, state=GenVideosTaskState.UPLOADING,
+                              published=len(task.published), total=len(task.videos))
+            await download_and_publish(aclient, task)
+            gen_video_task_store.update(task.job_id, state=GenVideosTaskState.PUBLISHED, error=None)
+            end_gen_video_task(task.job_id, GenVideosTaskState.PUBLISHED)
+        except Exception as e:
+            logger.error(f"处理视频任务{task.job_id}时异常（第{task.attempts}次）: {e}\n{traceback.format_exc()}")
+            if task.attempts >= GEN_VIDEO_PUBLISH_RETRIES:
+                gen_video_task_store.update(task.job_id, state=GenVideosTaskState.FAILED, error=str(e))
+                end_gen_video_task(task.job_id, GenVideosTaskState.FAILED, error=str(e))
+                return 0
+            # 网络抖动、单次发布失败等可以重试，已发布的视频不会重复发布
+            delay = GEN_VIDEO_PUBLISH_RETRY_INTERVAL * 2 ** (task.attempts - 1)
+            gen_video_task_store.update(task.job_id, error=str(e))
+            event_bus.publish(task.job_id, EVENT_STAGE, state=GenVideosTaskState.UPLOADING, error=str(e),
+                              retry_in=delay)
+            return delay
+    return 0
+
+
+async def keep_lease(job_id):
+    while True:
+        await asyncio.sleep(gen_video_task_store.lease_seconds / 3)
+        gen_video_task_store.renew(job_id)
+
 
+async def publish_gen_video_worker(aclient: httpx.AsyncClient, finished: asyncio.Queue):
+    """
+    下载/发布工作者：从任务库领取生成完成的任务，没有任务时等待查询协程的通知
+    """
+    while True:
+        try:
+            tasks = gen_video_task_store.claim(PUBLISH_GEN_VIDEOS_TASK_STATES, limit=1)
+            if not tasks:
+                try:
+                    # 超时后也重新查一次库，兜底其他进程释放的任务
+                    await asyncio.wait_for(finished.get(), GEN_VIDEO_POLL_MAX_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = tasks[0]
+            heartbeat = asyncio.create_task(keep_lease(task.job_id))
+            retry_delay = 0
+            try:
+                retry_delay = await handle_gen_video_task(aclient, task)
+            finally:
+                heartbeat.cancel()
+                # 失败的任务退避一段时间后才能被再次领取
+                gen_video_task_store.release(task.job_id, delay=retry_delay)
         except Exception as e:
-            logger.error(f"处理生成视频任务后台异常: {e}\n{traceback.format_exc()}")
-            # 异常发生后等待一段时间再重试，避免快速循环消耗资源
-            await asyncio.sleep(10)  # 等待10秒后重试
+            logger.error(f"下载发布视频任务异常: {e}\n{traceback.format_exc()}")
+            await asyncio.sleep(10)
+
+
+async def process_gen_video_tasks(aclient: httpx.AsyncClient, finished: asyncio.Queue = None):
+    """
+    finished：生成完成的任务通知队列，唤醒下载/发布工作者
+    """
+    # 恢复上次进程中断时未完成的任务
+    recovered = gen_video_task_store.recover()
+    if recovered:
+        logger.info(f'恢复未完成的视频任务：{recovered}个')
+
+    finished = finished or asyncio.Queue()
+    workers = [asyncio.create_task(publish_gen_video_worker(aclient, finished))
+               for _ in range(GEN_VIDEO_WORKER_NUM)]
+    # 正在查询进度的协程，个数不超过 GEN_VIDEO_POLL_CONCURRENCY
+    polling = set()
+    try:
+        while True:
+            try:
+                capacity = GEN_VIDEO_POLL_CONCURRENCY - len(polling)
+                if capacity > 0:
+                    for task in gen_video_task_store.claim(POLL_GEN_VIDEOS_TASK_STATES, limit=capacity, due=True):
+                        poll = asyncio.create_task(poll_gen_video_task(aclient, task, finished))
+                        polling.add(poll)
+                        poll.add_done_callback(polling.discard)
+                await asyncio.sleep(1)
+
+            except Exception as e:
+                logger.error(f"处理生成视频任务后台异常: {e}\n{traceback.format_exc()}")
+                # 异常发生后等待一段时间再重试，避免快速循环消耗资源
+                await asyncio.sleep(10)  # 等待10秒后重试
+    finally:
+        for task in list(polling) + workers:
+            task.cancel()
+        await asyncio.gather(*polling, *workers, return_exceptions=True)
@@ -10,12 +10,31 @@ class LoginRequest(BaseModel):
 class UploadTaskRequest(BaseModel):
     platform: Literal['douyin', 'tencent', 'tiktok', 'bilibili', 'kuaishou'] = Field(..., description="上传平台")
     account_name: str = Field(..., description="平台的账号名")
-    # video_path: Optional[str] = Field(None, description="action=upload时需要，视频路径")
+    video_path: Optional[str] = Field(None, description="视频文件或目录，需位于项目下的 videos 目录或用户视频目录内，默认项目下的 videos 目录")
     # options: Optional[List[str]] = Field(None, description="如果默认['-pt', 0]立即发布")
 
 
+class CrosspostTargetRequest(BaseModel):
+    platform: Literal['douyin', 'tencent', 'tiktok', 'kuaishou'] = Field(..., description="上传平台")
+    account_name: str = Field(..., description="平台的账号名")
+
+
+class CrosspostRequest(BaseModel):
+    video_path: str = Field(..., description="视频文件路径，需位于项目下的 videos 目录或用户视频目录内，同目录下需要同名的 .txt 描述文件")
+    targets: List[CrosspostTargetRequest] = Field(..., min_length=1, description="要发布到的平台和账号")
+
+
 class GenVideosTaskRequest(BaseModel):
     subject: str = Field(..., description="视频主题")
     account_name: str = Field(..., description="平台的账号名")
     title: str = Field(..., description="视频名")
     tags: List[str] = Field(..., description="视频标签")
+
+
+class GenVideosCallbackRequest(BaseModel):
+    # 只用 task_id 唤醒查询，其余字段仅为兼容生成服务的回调格式，不作为依据
+    task_id: str = Field(..., description="视频生成服务的任务id")
+    state: int = Field(..., description="任务状态，1完成，-1失败，其他为生成中")
+    progress: Optional[int] = Field(None, description="生成进度")
+    videos: Optional[List[str]] = Field(None, description="state=1时，生成完成的视频链接")
+    error: Optional[str] = Field(None, description="state=-1时，失败原因")
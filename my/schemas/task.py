@@ -1,4 +1,26 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+class GenVideosTaskState:
+    SUBMITTED = 'submitted'  # 已提交到视频生成服务
+    GENERATING = 'generating'  # 生成中
+    GENERATED = 'generated'  # 生成完成，等待下载
+    DOWNLOADED = 'downloaded'  # 已下载到本地
+    UPLOADING = 'uploading'  # 发布中
+    PUBLISHED = 'published'  # 已发布
+    FAILED = 'failed'  # 失败
+
+
+# 还需要继续处理的状态
+ACTIVE_GEN_VIDEOS_TASK_STATES = (GenVideosTaskState.SUBMITTED, GenVideosTaskState.GENERATING,
+                                 GenVideosTaskState.GENERATED, GenVideosTaskState.DOWNLOADED,
+                                 GenVideosTaskState.UPLOADING)
+# 需要查询生成进度的状态
+POLL_GEN_VIDEOS_TASK_STATES = (GenVideosTaskState.SUBMITTED, GenVideosTaskState.GENERATING)
+# 交给下载/发布工作者处理的状态
+PUBLISH_GEN_VIDEOS_TASK_STATES = (GenVideosTaskState.GENERATED, GenVideosTaskState.DOWNLOADED,
+                                  GenVideosTaskState.UPLOADING)
 
 
 @dataclass
@@ -8,3 +30,13 @@ class GenVideosTask:
     submit_time: float
     title: str
     tags: [str]
+    job_id: Optional[str] = None
+    state: str = GenVideosTaskState.SUBMITTED
+    progress: int = 0
+    videos: List[str] = field(default_factory=list)  # 生成完成的视频链接
+    published: List[str] = field(default_factory=list)  # 已发布的视频文件名
+    video_dir: Optional[str] = None  # 下载后的目录
+    error: Optional[str] = None
+    attempts: int = 0
+    updated_at: float = 0
+    next_poll_at: float = 0  # 下次查询生成进度的时间
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from my.config import ACCOUNT_HEALTH_TTL, ACCOUNT_HEALTH_REFRESH_AHEAD, ACCOUNT_HEALTH_INTERVAL, \
+    ACCOUNT_HEALTH_CONCURRENCY
+from my.utils.data_util import platform_cookies_dirs, get_cookie_path
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, \
+    SOCIAL_MEDIA_KUAISHOU, set_init_script
+from utils.browser_pool import browser_pool
+from utils.cookie_probe import check_cookies
+
+# 刷新登录态时访问的创作者首页
+SESSION_WARM_URLS = {
+    SOCIAL_MEDIA_DOUYIN: "https://creator.douyin.com/creator-micro/content/upload",
+    SOCIAL_MEDIA_TENCENT: "https://channels.weixin.qq.com/platform",
+    SOCIAL_MEDIA_KUAISHOU: "https://cp.kuaishou.com/article/publish/video",
+    SOCIAL_MEDIA_TIKTOK: "https://www.tiktok.com/tiktokstudio/upload",
+}
+
+
+@dataclass
+class AccountHealth:
+    platform: str
+    account_name: str
+    account_file: str
+    valid: Optional[bool] = None  # None 表示还未校验
+    checked_at: float = 0
+    expires_at: float = 0
+    refreshed_at: float = 0
+    error: Optional[str] = None
+
+
+class AccountHealthRegistry:
+    """
+    (platform, account) -> 最近一次登录态校验结果，带 TTL 缓存，后台提前刷新
+    """
+
+    def __init__(self, ttl: int = ACCOUNT_HEALTH_TTL, refresh_ahead: int = ACCOUNT_HEALTH_REFRESH_AHEAD,
+                 concurrency: int = ACCOUNT_HEALTH_CONCURRENCY):
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.concurrency = concurrency
+        self._accounts: Dict[Tuple[str, str], AccountHealth] = {}
+
+    def register(self, platform, account_name) -> AccountHealth:
+        key = (platform, account_name)
+        if key not in self._accounts:
+            self._accounts[key] = AccountHealth(platform, account_name, str(get_cookie_path(platform, account_name)))
+        return self._accounts[key]
+
+    def discover(self):
+        # 扫描 cookies 目录下已有的账号
+        for platform, cookies_dir in platform_cookies_dirs.items():
+            if cookies_dir.exists():
+                for account_file in cookies_dir.glob("*.json"):
+                    self.register(platform, account_file.stem)
+
+    def get(self, platform, account_name) -> Optional[AccountHealth]:
+        return self._accounts.get((platform, account_name))
+
+    def is_alive(self, platform, account_name) -> Optional[bool]:
+        """
+        只读缓存，不发起任何请求；缓存过期或未校验返回 None
+        """
+        health = self.get(platform, account_name)
+        if health is None or health.valid is None or health.expires_at < time.time():
+            return None
+        return health.valid
+
+    def _record(self, health: AccountHealth, valid: bool, error: str = None):
+        now = time.time()
+        health.valid = valid
+        health.error = error
+        health.checked_at = now
+        health.expires_at = now + self.ttl
+
+    async def _check(self, accounts: List[AccountHealth]):
+        if not accounts:
+            return
+        try:
+            verdicts = await check_cookies([(health.platform, health.account_file) for health in accounts])
+        except Exception as e:
+            for health in accounts:
+                self._record(health, False, str(e))
+            raise
+        for health, valid in zip(accounts, verdicts):
+            self._record(health, valid, None if valid else 'cookie 文件不存在或已失效')
+
+    async def validate(self, platform, account_name, force=False) -> bool:
+        """
+        缓存未过期直接返回，否则重新校验
+        """
+        cached = None if force else self.is_alive(platform, account_name)
+        if cached is not None:
+            return cached
+        health = self.register(platform, account_name)
+        await self._check([health])
+        return health.valid
+
+    async def warm_session(self, health: AccountHealth):
+        """
+        打开创作者首页让平台续期 cookie，并回写 storage_state
+        """
+        async with browser_pool.lease(storage_state=health.account_file) as context:
+            context = await set_init_script(context, health.platform)
+            page = await context.new_page()
+            await page.goto(SESSION_WARM_URLS[health.platform], wait_until="domcontentloaded")
+            await context.storage_state(path=health.account_file)
+        health.refreshed_at = time.time()
+
+    async def refresh_due(self):
+        self.discover()
+        deadline = time.time() + self.refresh_ahead
+        due = [health for health in self._accounts.values() if health.expires_at < deadline]
+        if not due:
+            return
+        logger.info(f'账号登录态巡检：{len(due)}个账号即将过期')
+        await self._check(due)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(health: AccountHealth):
+            async with semaphore:
+                try:
+                    await self.warm_session(health)
+                except Exception as e:
+                    logger.warning(f'刷新登录态失败：{health.platform} {health.account_name}，{e}')
+
+        await asyncio.gather(*(warm(health) for health in due if health.valid))
+
+    async def run(self, interval: int = ACCOUNT_HEALTH_INTERVAL):
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"账号登录态巡检异常: {e}\n{traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+    def snapshot(self, platform: str = None) -> List[dict]:
+        return [asdict(health) for health in self._accounts.values()
+                if platform is None or health.platform == platform]
+
+
+# 创建服务实例
+account_health_registry = AccountHealthRegistry()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from my.config import JOB_PLATFORM_CONCURRENCY, JOB_DEFAULT_CONCURRENCY, JOB_MAX_FINISHED
+from utils.events import event_bus, bind_job, EVENT_STAGE
+
+
+class JobState:
+    QUEUED = 'queued'  # 等待平台空闲
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+FINISHED_JOB_STATES = (JobState.SUCCEEDED, JobState.FAILED)
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str  # login / upload
+    platform: str
+    account_name: str
+    state: str = JobState.QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobManager(object):
+    """
+    后台执行登录、上传等耗时操作，接口立即返回 job_id；同一平台同时执行的任务数受限
+    """
+
+    def __init__(self, platform_concurrency: Dict[str, int] = None, default_concurrency: int = JOB_DEFAULT_CONCURRENCY,
+                 max_finished: int = JOB_MAX_FINISHED):
+        self.platform_concurrency = platform_concurrency or JOB_PLATFORM_CONCURRENCY
+        self.default_concurrency = default_concurrency
+        self.max_finished = max_finished
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, platform) -> asyncio.Semaphore:
+        if platform not in self._semaphores:
+            self._semaphores[platform] = asyncio.Semaphore(
+                self.platform_concurrency.get(platform, self.default_concurrency))
+        return self._semaphores[platform]
+
+    def submit(self, kind, platform, account_name, func: Callable[[], Awaitable]) -> Job:
+        job = Job(uuid.uuid4().hex, kind, platform, account_name, created_at=time.time())
+        self._jobs[job.job_id] = job
+        event_bus.publish(job.job_id, EVENT_STAGE, state=job.state, kind=kind, platform=platform)
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job, func))
+        self._prune()
+        return job
+
+    async def _run(self, job: Job, func: Callable[[], Awaitable]):
+        # 任务协程里发出的上传进度等事件都归属到该任务
+        with bind_job(job.job_id):
+            try:
+                async with self._semaphore(job.platform):
+                    job.state = JobState.RUNNING
+                    job.started_at = time.time()
+                    event_bus.publish(job.job_id, EVENT_STAGE, state=job.state)
+                    job.result = await func()
+                job.state = JobState.SUCCEEDED
+            except asyncio.CancelledError:
+                job.state = JobState.FAILED
+                job.error = '任务已取消'
+                raise
+            except Exception as e:
+                logger.error(f"执行任务{job.kind} {job.job_id}异常: {e}\n{traceback.format_exc()}")
+                job.state = JobState.FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._tasks.pop(job.job_id, None)
+                event_bus.publish(job.job_id, EVENT_STAGE, state=job.state, error=job.error)
+                event_bus.end(job.job_id, state=job.state, result=job.result, error=job.error)
+
+    def _prune(self):
+        # 只保留最近 max_finished 个已结束的任务
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_JOB_STATES]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, job_ids: Iterable[str] = None, platform: str = None, state: str = None) -> List[Job]:
+        jobs = [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs] if job_ids \
+            else list(self._jobs.values())
+        return [job for job in jobs
+                if (platform is None or job.platform == platform) and (state is None or job.state == state)]
+
+    @staticmethod
+    def to_dict(job: Job) -> dict:
+        return asdict(job)
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 创建服务实例
+job_manager = JobManager()
@@ -1,13 +1,26 @@
+import hmac
+import json
 import os
+from dataclasses import asdict
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
 import httpx
-
-from my.gen.video import submit_create_videos_task, get_or_create_user_video_dir
-from my.schemas.social_media_schema import UploadTaskRequest
-from my.utils.data_util import get_douyin_cookie_path
+from fastapi import HTTPException
+
+from conf import BASE_DIR, SSE_HEARTBEAT_INTERVAL
+from my.config import VIDEO_GEN_CALLBACK_SECRET
+from my.gen.task_store import gen_video_task_store
+from my.gen.video import submit_create_videos_task, get_or_create_user_video_dir, on_gen_video_callback, upload_douyin
+from my.schemas.social_media_schema import UploadTaskRequest, GenVideosCallbackRequest, CrosspostRequest
+from my.schemas.task import GenVideosTaskState
+from my.services.account_health import account_health_registry
+from my.services.job_manager import job_manager, Job, FINISHED_JOB_STATES
+from my.utils.data_util import get_douyin_cookie_path, get_cookie_path
+from uploader.crosspost import CrosspostTarget, crosspost
 from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
 from utils.base_social_media import SOCIAL_MEDIA_DOUYIN
+from utils.events import event_bus, EVENT_END
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
 
 # 获取当前脚本所在目录的绝对路径，并转换为Path对象
@@ -16,6 +29,8 @@ current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
 my_dir = current_dir.parent
 # 获取上两级目录的路径
 root_dir = my_dir.parent
+# 接口允许上传的视频目录：项目下的 videos 目录和各用户的视频目录（my/gen/videos/<uid>）
+VIDEO_ROOTS = (BASE_DIR / "videos", my_dir / "gen" / "videos")
 
 
 class SocialMediaService:
@@ -39,23 +54,108 @@ class SocialMediaService:
             account_file = get_douyin_cookie_path(account_name)
             cookie_setup = await douyin_setup(str(account_file), handle=True)
             print(f'登录成功，account_name：{account_name}，cookie_setup：{cookie_setup}')
+            # 重新登录后刷新登录态缓存
+            await account_health_registry.validate(platform, account_name, force=True)
         else:
             raise Exception(f"不支持的平台：{platform}")
         return cookie_setup
 
     # 处理任务的协程
-    async def upload(self, platform, account_name):
-        account_file = self.get_account_cookie_path(account_name)
-
-        video_folder_path = r'E:\projects\upload-test\\videos'
+    async def upload(self, platform, account_name, video_path=None):
+        video_path = Path(video_path) if video_path else BASE_DIR / "videos"
         if platform == SOCIAL_MEDIA_DOUYIN:
-            # 将任务放入队列
-            result = await self.upload_douyin(account_file, video_folder_path)
+            if video_path.is_file():
+                result = await upload_douyin(account_name, video_path.parent, [str(video_path)])
+            else:
+                result = await upload_douyin(account_name, video_path)
         else:
             raise Exception(f"不支持的平台：{platform}")
 
         return result
 
+    @staticmethod
+    def check_platform(platform):
+        # 提交任务前就拒绝不支持的平台，不必等后台任务失败
+        if platform != SOCIAL_MEDIA_DOUYIN:
+            raise HTTPException(status_code=400, detail=f"不支持的平台：{platform}")
+
+    @staticmethod
+    def resolve_video_path(video_path) -> Path:
+        """
+        解析接口传入的视频路径，只允许 VIDEO_ROOTS 下的文件或目录，避免通过接口读取服务器上的任意文件
+        """
+        path = Path(video_path).resolve()
+        if not any(path.is_relative_to(root.resolve()) for root in VIDEO_ROOTS):
+            raise HTTPException(status_code=400, detail=f"视频路径不在允许的目录内：{video_path}")
+        if not path.exists():
+            raise HTTPException(status_code=400, detail=f"视频路径不存在：{video_path}")
+        return path
+
+    def submit_login(self, platform, account_name) -> Job:
+        self.check_platform(platform)
+        return job_manager.submit('login', platform, account_name,
+                                  lambda: self.login(platform, account_name))
+
+    def submit_upload(self, platform, account_name, video_path=None) -> Job:
+        self.check_platform(platform)
+        if video_path:
+            video_path = self.resolve_video_path(video_path)
+        return job_manager.submit('upload', platform, account_name,
+                                  lambda: self.upload(platform, account_name, video_path))
+
+    def submit_crosspost(self, request: CrosspostRequest) -> Job:
+        """
+        同一个视频并发发布到多个平台，任务结果是每个平台的发布结果
+        """
+        video_path = self.resolve_video_path(request.video_path)
+        if not video_path.is_file():
+            raise HTTPException(status_code=400, detail=f"视频文件不存在：{video_path}")
+        if not video_path.with_suffix('.txt').is_file():
+            raise HTTPException(status_code=400, detail=f"缺少描述文件：{video_path.with_suffix('.txt')}")
+        targets = [CrosspostTarget(target.platform, target.account_name,
+                                   get_cookie_path(target.platform, target.account_name))
+                   for target in request.targets]
+        account_names = ','.join(f'{target.platform}:{target.account_name}' for target in targets)
+        return job_manager.submit('crosspost', 'crosspost', account_names,
+                                  lambda: crosspost(str(video_path), targets))
+
+    @staticmethod
+    def get_job(job_id) -> Optional[dict]:
+        """
+        登录、上传任务或视频生成任务的当前状态，不存在返回 None
+        """
+        job = job_manager.get(job_id)
+        if job is not None:
+            snapshot = job_manager.to_dict(job)
+            snapshot['finished'] = job.state in FINISHED_JOB_STATES
+            return snapshot
+        task = gen_video_task_store.get(job_id)
+        if task is not None:
+            return {'kind': 'gen_videos', **asdict(task),
+                    'finished': task.state in (GenVideosTaskState.PUBLISHED, GenVideosTaskState.FAILED)}
+        return None
+
+    async def stream_job_events(self, job_id, snapshot: dict, last_event_id: int = 0) -> AsyncIterator[str]:
+        """
+        任务事件的 SSE 文本流：先回放历史，任务结束后关闭；长时间没有事件时发送注释行保活
+        """
+        subscription = event_bus.subscribe(job_id, last_event_id)
+        try:
+            if snapshot['finished'] and not event_bus.is_ended(job_id):
+                # 历史事件已淘汰（或进程重启过），用当前状态补一个结束事件
+                yield f"event: {EVENT_END}\ndata: {json.dumps(snapshot, ensure_ascii=False, default=str)}\n\n"
+                return
+            while True:
+                event = await subscription.get(SSE_HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield event.to_sse()
+                if event.type == EVENT_END:
+                    return
+        finally:
+            event_bus.unsubscribe(subscription)
+
     async def create_videos(self,
                             aclient: httpx.AsyncClient,
                             subject,
@@ -66,6 +166,16 @@ class SocialMediaService:
         return await submit_create_videos_task(aclient, subject,
                                                account_name,title,tags)
 
+    @staticmethod
+    def verify_gen_videos_callback(token: Optional[str]):
+        if not VIDEO_GEN_CALLBACK_SECRET:
+            raise HTTPException(status_code=403, detail="未配置回调密钥，不接受回调")
+        if not token or not hmac.compare_digest(token.encode(), VIDEO_GEN_CALLBACK_SECRET.encode()):
+            raise HTTPException(status_code=401, detail="回调密钥错误")
+
+    def gen_videos_callback(self, callback: GenVideosCallbackRequest):
+        return on_gen_video_callback(callback.task_id)
+
 
 # 创建服务实例
 social_media_service = SocialMediaService()
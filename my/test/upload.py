@@ -14,11 +14,11 @@ async def a(aclient: httpx.AsyncClient):
     tags=['美食','餐饮']
     if videos_url_list:
         try:
-            videos_dir = await download_videos(aclient, uid,
-                                               videos_url_list,
-                                               title, tags)
+            videos_dir, files = await download_videos(aclient, uid,
+                                                      videos_url_list,
+                                                      title, tags)
 
-            # await upload_douyin(uid, videos_dir)
+            # await upload_douyin(uid, videos_dir, files)
         except Exception as e:
             logger.error(f"发布视频时异常: {e}\n{traceback.format_exc()}")
 
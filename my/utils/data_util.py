@@ -1,8 +1,25 @@
 import os
 from pathlib import Path
 
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, \
+    SOCIAL_MEDIA_KUAISHOU
+
 current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
 cookies_dir = current_dir.parent.parent / 'cookies'
 douyin_cookies_dir = cookies_dir / 'douyin_uploader'
+
+# 平台 -> cookie 目录
+platform_cookies_dirs = {
+    SOCIAL_MEDIA_DOUYIN: douyin_cookies_dir,
+    SOCIAL_MEDIA_TENCENT: cookies_dir / 'tencent_uploader',
+    SOCIAL_MEDIA_KUAISHOU: cookies_dir / 'ks_uploader',
+    SOCIAL_MEDIA_TIKTOK: cookies_dir / 'tk_uploader',
+}
+
+
 def get_douyin_cookie_path(account_name):
-    return douyin_cookies_dir / f"{account_name}.json"
\ No newline at end of file
+    return douyin_cookies_dir / f"{account_name}.json"
+
+
+def get_cookie_path(platform, account_name):
+    return platform_cookies_dirs[platform] / f"{account_name}.json"
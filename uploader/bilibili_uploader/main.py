@@ -1,9 +1,17 @@
+import asyncio
 import json
+import os
 import pathlib
 import random
+from concurrent.futures import ThreadPoolExecutor
+
 from biliup.plugins.bili_webup import BiliBili, Data
 
+from conf import BILIBILI_UPLOAD_CONCURRENCY, BILIBILI_PENDING_PER_ACCOUNT, BILIBILI_FALLBACK_LINE
+from uploader.bilibili_uploader.upload_tuning import network_id, upload_tuner
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI
 from utils.log import bilibili_logger
+from utils.rate_limiter import publish_limiter
 
 
 def extract_keys_from_json(data):
@@ -40,10 +48,10 @@ def random_emoji():
 
 
 class BilibiliUploader(object):
-    def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime):
-        self.upload_thread_num = 3
+    def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime, account_name='default'):
+        self.upload_thread_num = None  # 分块并发数，None 时按实测速度自动选择
         self.copyright = 1
-        self.lines = 'AUTO'
+        self.lines = 'AUTO'  # AUTO 时使用当前网络缓存的最快线路
         self.cookie_data = cookie_data
         self.file = file
         self.title = title
@@ -51,6 +59,8 @@ class BilibiliUploader(object):
         self.tid = tid
         self.tags = tags
         self.dtime = dtime
+        self.account_name = account_name  # 发布限速按账号区分
+        self.post_url = None  # 投稿成功后的视频地址
         self._init_data()
 
     def _init_data(self):
@@ -62,18 +72,75 @@ class BilibiliUploader(object):
         self.data.set_tag(self.tags)
         self.data.dtime = self.dtime
 
+    def _login(self, bili: BiliBili):
+        bili.login_by_cookies(self.cookie_data)
+        bili.access_token = self.cookie_data.get('access_token')
+
+    def _upload_video(self, bili: BiliBili):
+        network = network_id()
+        lines = self.lines
+        if lines == 'AUTO':
+            # 直接指定缓存的线路，跳过 biliup 每次上传前的测速
+            bili._auto_os = upload_tuner.select_line(bili, network)
+            if bili._auto_os is None:
+                lines = BILIBILI_FALLBACK_LINE
+        # 同时进行的上传合并测量总吞吐量，见 UploadTuner.measure
+        with upload_tuner.measure(network, os.path.getsize(self.file), self.upload_thread_num) as tasks:
+            try:
+                video_part = bili.upload_file(str(self.file), lines=lines, tasks=tasks)
+            except Exception:
+                # 线路可能已经不可用，下次上传重新测速
+                upload_tuner.invalidate_line(network)
+                raise
+        video_part['title'] = self.title
+        self.data.append(video_part)
+
+    def _handle_submit(self, ret) -> bool:
+        if ret.get('code') == 0:
+            bvid = (ret.get('data') or {}).get('bvid')
+            if bvid:
+                self.post_url = f'https://www.bilibili.com/video/{bvid}'
+            bilibili_logger.success(f'[+] {self.file.name}上传 成功')
+            return True
+        else:
+            bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {ret.get("message")}')
+            return False
+
     def upload(self):
         with BiliBili(self.data) as bili:
-            bili.login_by_cookies(self.cookie_data)
-            bili.access_token = self.cookie_data.get('access_token')
-            video_part = bili.upload_file(str(self.file), lines=self.lines,
-                                          tasks=self.upload_thread_num)  # 上传视频，默认线路AUTO自动选择，线程数量3。
-            video_part['title'] = self.title
-            self.data.append(video_part)
+            self._login(bili)
+            self._upload_video(bili)
+            # 按平台和账号限速，拿到令牌后才投稿
+            publish_limiter.acquire_sync(SOCIAL_MEDIA_BILIBILI, self.account_name)
             ret = bili.submit()  # 提交视频
-            if ret.get('code') == 0:
-                bilibili_logger.success(f'[+] {self.file.name}上传 成功')
-                return True
-            else:
-                bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {ret.get("message")}')
-                return False
+            return self._handle_submit(ret)
+
+    async def upload_async(self):
+        """
+        biliup 的上传和投稿是阻塞调用（上传内部自己 asyncio.run），放到线程里执行，不阻塞事件循环；
+        只有上传占用 upload_executor，登录和投稿用默认线程池，投稿不必排在其它视频的上传后面；
+        等待限速时不占用线程，每个账号同时处理的视频数见 conf.BILIBILI_PENDING_PER_ACCOUNT
+        """
+        loop = asyncio.get_running_loop()
+        async with _account_slot(self.account_name):
+            bili = BiliBili(self.data)
+            try:
+                await asyncio.to_thread(self._login, bili)
+                await loop.run_in_executor(upload_executor, self._upload_video, bili)
+                await publish_limiter.acquire(SOCIAL_MEDIA_BILIBILI, self.account_name)
+                ret = await asyncio.to_thread(bili.submit)
+            finally:
+                bili.close()
+        return self._handle_submit(ret)
+
+
+def _account_slot(account_name) -> asyncio.Semaphore:
+    if account_name not in _account_slots:
+        _account_slots[account_name] = asyncio.Semaphore(BILIBILI_PENDING_PER_ACCOUNT)
+    return _account_slots[account_name]
+
+
+# bilibili 上传线程池，同时上传的视频数见 conf.BILIBILI_UPLOAD_CONCURRENCY
+upload_executor = ThreadPoolExecutor(max_workers=BILIBILI_UPLOAD_CONCURRENCY, thread_name_prefix='bilibili-upload')
+# 每个账号同时处理的视频数，从登录占用到投稿完成，避免一个账号的整个目录都上传完了才开始投稿
+_account_slots = {}
@@ -0,0 +1,212 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from conf import BILIBILI_UPLOAD_TUNING_DB, BILIBILI_UPLOAD_TASKS_MIN, BILIBILI_UPLOAD_TASKS_MAX, \
+    BILIBILI_UPLOAD_TASKS_DEFAULT, BILIBILI_LINE_REPROBE_INTERVAL, BILIBILI_MEASURE_PERIOD_UPLOADS, \
+    BILIBILI_MEASURE_PERIOD_SECONDS
+from utils.log import bilibili_logger
+
+# 吞吐量的指数移动平均系数，越大越看重最近一次
+THROUGHPUT_EMA_ALPHA = 0.3
+# 小于该大小的视频上传耗时主要是建连和合并分片，不计入吞吐量
+MIN_SAMPLE_BYTES = 20 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lines (
+    network TEXT PRIMARY KEY,
+    line TEXT NOT NULL,
+    probed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS throughput (
+    network TEXT NOT NULL,
+    tasks INTEGER NOT NULL,
+    bytes_per_sec REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (network, tasks)
+);
+"""
+
+
+@dataclass
+class _MeasurePeriod:
+    network: str
+    tasks: int
+    started: float = field(default_factory=time.perf_counter)
+    joined: int = 0
+    active: int = 0
+    size: int = 0
+    valid: bool = True
+
+
+def network_id() -> str:
+    """
+    当前网络的标识：出口网卡的本机地址。UDP connect 不发送数据，离线时返回 unknown
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('223.5.5.5', 53))
+            return sock.getsockname()[0]
+    except OSError:
+        return 'unknown'
+
+
+class UploadTuner(object):
+    """
+    bilibili 上传调优：按网络缓存测速最快的线路（定期重新测速），按实测吞吐量选择分块并发数
+    """
+
+    def __init__(self, db_path=BILIBILI_UPLOAD_TUNING_DB, reprobe_interval: float = BILIBILI_LINE_REPROBE_INTERVAL,
+                 min_tasks: int = BILIBILI_UPLOAD_TASKS_MIN, max_tasks: int = BILIBILI_UPLOAD_TASKS_MAX,
+                 default_tasks: int = BILIBILI_UPLOAD_TASKS_DEFAULT,
+                 period_uploads: int = BILIBILI_MEASURE_PERIOD_UPLOADS,
+                 period_seconds: float = BILIBILI_MEASURE_PERIOD_SECONDS):
+        self.db_path = Path(db_path)
+        self.reprobe_interval = reprobe_interval
+        self.min_tasks = min_tasks
+        self.max_tasks = max_tasks
+        self.default_tasks = default_tasks
+        self.period_uploads = period_uploads
+        self.period_seconds = period_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        # 同一网络同时只测速一次，其它上传等待测速结果
+        self._probe_lock = threading.Lock()
+        # 接收新上传的测量区间，同时进行的上传共享；已满或过期的区间等其中的上传结束后记录
+        self._period: Optional[_MeasurePeriod] = None
+        self._period_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def cached_line(self, network: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT line, probed_at FROM lines WHERE network = ?", (network,)).fetchone()
+        if row is None or time.time() - row[1] > self.reprobe_interval:
+            return None
+        return json.loads(row[0])
+
+    def save_line(self, network: str, line: dict):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO lines (network, line, probed_at) VALUES (?, ?, ?)",
+                              (network, json.dumps(line), time.time()))
+
+    def invalidate_line(self, network: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM lines WHERE network = ?", (network,))
+
+    def select_line(self, bili, network: str) -> Optional[dict]:
+        """
+        返回该网络最快的线路，缓存过期时调用 bili.probe() 重新测速；测速失败返回 None
+        """
+        line = self.cached_line(network)
+        if line is not None:
+            return line
+        with self._probe_lock:
+            line = self.cached_line(network)
+            if line is not None:
+                return line
+            try:
+                line = bili.probe()
+            except Exception as e:
+                bilibili_logger.warning(f'上传线路测速失败：{e}')
+                line = None
+            if line:
+                self.save_line(network, line)
+                bilibili_logger.info(f'上传线路测速完成：{line.get("query")}，耗时{line.get("cost", 0):.2f}秒')
+            return line
+
+    def throughput(self, network: str) -> Dict[int, float]:
+        with self._lock:
+            # 过期的测量值不再参考，网络变化后重新试探
+            rows = self.conn.execute(
+                "SELECT tasks, bytes_per_sec FROM throughput WHERE network = ? AND updated_at > ?",
+                (network, time.time() - self.reprobe_interval)).fetchall()
+        return {tasks: bytes_per_sec for tasks, bytes_per_sec in rows}
+
+    def choose_tasks(self, network: str) -> int:
+        """
+        爬山法：先用默认并发数，之后总是向已测过的最快并发数的相邻值试探，直到两侧都更慢
+        """
+        stats = {tasks: speed for tasks, speed in self.throughput(network).items()
+                 if self.min_tasks <= tasks <= self.max_tasks}
+        if not stats:
+            return self.default_tasks
+        best = max(stats, key=stats.get)
+        if best + 1 <= self.max_tasks and best + 1 not in stats:
+            return best + 1
+        if best - 1 >= self.min_tasks and best - 1 not in stats:
+            return best - 1
+        return best
+
+    @contextmanager
+    def measure(self, network: str, size: int, tasks: Optional[int] = None):
+        """
+        测量一次上传，返回要使用的分块并发数。多个上传同时进行时共享同一条线路，单个上传的速度不可比：
+        有重叠的上传属于同一个测量区间，共用区间开始时选出的并发数，全部结束后按总字节数和区间时长记录一次；
+        区间加入 period_uploads 个上传或开始超过 period_seconds 后，新的上传开始下一个区间，连续上传时并发数也能调整；
+        区间内有上传失败或手动指定了并发数时不记录
+        """
+        with self._period_lock:
+            period = self._period
+            if period is None or period.network != network or period.joined >= self.period_uploads \
+                    or time.perf_counter() - period.started >= self.period_seconds:
+                period = self._period = _MeasurePeriod(network, self.choose_tasks(network))
+            period.joined += 1
+            period.active += 1
+            if tasks is not None:
+                period.valid = False
+        success = False
+        try:
+            yield tasks or period.tasks
+            success = True
+        finally:
+            with self._period_lock:
+                period.active -= 1
+                period.size += size if success else 0
+                period.valid = period.valid and success
+                finished = period.active == 0
+                # 已经开始了下一个区间时不能清掉它
+                if finished and self._period is period:
+                    self._period = None
+            if finished and period.valid:
+                self.record(period.network, period.tasks, period.size, time.perf_counter() - period.started)
+
+    def record(self, network: str, tasks: int, size: int, elapsed: float):
+        if size < MIN_SAMPLE_BYTES or elapsed <= 0:
+            return
+        speed = size / elapsed
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT bytes_per_sec, samples FROM throughput WHERE network = ? AND tasks = ?",
+                                    (network, tasks)).fetchone()
+            if row is not None:
+                speed = THROUGHPUT_EMA_ALPHA * speed + (1 - THROUGHPUT_EMA_ALPHA) * row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO throughput (network, tasks, bytes_per_sec, samples, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", (network, tasks, speed, (row[1] if row else 0) + 1, now))
+        bilibili_logger.info(f'上传速度 {size / elapsed / 1024 / 1024:.2f}MB/s（并发{tasks}）')
+
+
+# 创建服务实例
+upload_tuner = UploadTuner()
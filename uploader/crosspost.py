@@ -0,0 +1,117 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from conf import CROSSPOST_CONCURRENCY
+from uploader.platforms import setup_account, create_uploader
+from utils.events import event_bus, EVENT_STAGE, EVENT_PUBLISHED
+from utils.faststart import prepare_upload_file
+from utils.files_times import get_title_and_hashtags
+from utils.mp4_probe import Mp4ProbeError, probe_mp4
+from utils.upload_ledger import upload_ledger
+from utils.video_preflight import preflight, log_preflight
+
+CROSSPOST_STATUS_PUBLISHED = 'published'
+CROSSPOST_STATUS_SKIPPED = 'skipped'  # 已发布过
+CROSSPOST_STATUS_REJECTED = 'rejected'  # 预检不通过，平台一定会拒绝
+CROSSPOST_STATUS_COOKIE_INVALID = 'cookie_invalid'
+CROSSPOST_STATUS_FAILED = 'failed'
+
+
+@dataclass
+class CrosspostTarget:
+    platform: str
+    account_name: str
+    account_file: Path
+
+
+@dataclass
+class CrosspostResult:
+    platform: str
+    account_name: str
+    status: str
+    post_url: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0  # 秒
+
+
+async def _publish_to(target: CrosspostTarget, video_file, upload_file, title, tags, publish_date,
+                      thumbnail_path, semaphore: asyncio.Semaphore) -> CrosspostResult:
+    async with semaphore:
+        start_time = time.time()
+        result = CrosspostResult(target.platform, target.account_name, CROSSPOST_STATUS_FAILED)
+        event_bus.emit(EVENT_STAGE, state='uploading', platform=target.platform, account_name=target.account_name)
+        try:
+            if not await setup_account(target.platform, target.account_file, handle=False):
+                result.status = CROSSPOST_STATUS_COOKIE_INVALID
+                result.error = 'cookie 已失效，请先登录'
+            else:
+                app = create_uploader(target.platform, title, upload_file, tags, publish_date, target.account_file,
+                                      thumbnail_path=thumbnail_path)
+                if await upload_ledger.publish_once(app.main, video_file, target.platform, target.account_name):
+                    result.status = CROSSPOST_STATUS_PUBLISHED
+                    result.post_url = getattr(app, 'post_url', None)
+                else:
+                    result.status = CROSSPOST_STATUS_SKIPPED
+        except Exception as e:
+            logger.error(f'发布到{target.platform} {target.account_name}失败：{e}')
+            result.error = str(e)
+        result.elapsed = round(time.time() - start_time, 1)
+        event_bus.emit(EVENT_PUBLISHED if result.status == CROSSPOST_STATUS_PUBLISHED else EVENT_STAGE,
+                       state=result.status, platform=target.platform, account_name=target.account_name,
+                       post_url=result.post_url, error=result.error)
+        return result
+
+
+async def crosspost(video_file, targets: List[CrosspostTarget], publish_date=0, thumbnail_path=None,
+                    concurrency: int = CROSSPOST_CONCURRENCY) -> List[CrosspostResult]:
+    """
+    同一个视频发布到多个平台：描述文件、预检、摘要和 faststart 只做一次，各平台并发上传，
+    总耗时接近最慢的平台；返回每个平台的结果，单个平台失败不影响其他平台
+    """
+    title, tags = get_title_and_hashtags(str(video_file))
+    try:
+        info = probe_mp4(video_file)
+    except (Mp4ProbeError, OSError, ValueError) as e:
+        return [CrosspostResult(target.platform, target.account_name, CROSSPOST_STATUS_REJECTED,
+                                error=f'无法解析视频：{e}') for target in targets]
+
+    results = {}
+    accepted = []
+    for target in targets:
+        check = preflight(video_file, target.platform, info)
+        log_preflight(check)
+        if check.ok:
+            accepted.append(target)
+        else:
+            results[id(target)] = CrosspostResult(target.platform, target.account_name, CROSSPOST_STATUS_REJECTED,
+                                                  error='; '.join(check.errors))
+
+    if accepted:
+        # 先算好摘要写入缓存，各平台登记台账时不再重复读取整个文件
+        await asyncio.to_thread(upload_ledger.file_sha256, video_file)
+        upload_file = await prepare_upload_file(video_file)
+        semaphore = asyncio.Semaphore(concurrency)
+        published = await asyncio.gather(*(
+            _publish_to(target, video_file, upload_file, title, tags, publish_date, thumbnail_path, semaphore)
+            for target in accepted))
+        for target, result in zip(accepted, published):
+            results[id(target)] = result
+    return [results[id(target)] for target in targets]
+
+
+def format_results(results: List[CrosspostResult]) -> str:
+    """
+    命令行输出的结果表
+    """
+    rows = [('PLATFORM', 'ACCOUNT', 'STATUS', 'TIME', 'DETAIL')]
+    for result in results:
+        rows.append((result.platform, result.account_name, result.status, f'{result.elapsed:.1f}s',
+                     result.post_url or result.error or ''))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) + '  ' + row[-1]
+                     for row in rows)
@@ -1,20 +1,31 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import BrowserContext, async_playwright, Page
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_DOUYIN
+from utils.browser_pool import browser_pool
+from utils.browser_profiles import page_timing
+from utils.cookie_probe import probe_cookie
 from utils.log import douyin_logger
+from utils.rate_limiter import publish_limiter
+from utils.upload_detector import UploadCompletionDetector, DOUYIN_UPLOAD_STATE_JS
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用 http 探测，无法判断时再启动浏览器校验
+    verdict = await probe_cookie(SOCIAL_MEDIA_DOUYIN, account_file)
+    if verdict is not None:
+        return verdict
+    return await browser_cookie_auth(account_file)
+
+
+async def browser_cookie_auth(account_file):
+    async with browser_pool.lease(storage_state=account_file) as context:
+        context = await set_init_script(context, SOCIAL_MEDIA_DOUYIN)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -23,8 +34,6 @@ async def cookie_auth(account_file):
             await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
         except:
             print("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count():
@@ -94,15 +103,9 @@ class DouYinVideo(object):
         douyin_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        else:
-            browser = await playwright.chromium.launch(headless=False)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
+        # context 由浏览器池租出，已加载指定的 cookie 文件
+        context = await set_init_script(context, SOCIAL_MEDIA_DOUYIN)
 
         # 创建一个新的页面
         page = await context.new_page()
@@ -112,6 +115,10 @@ class DouYinVideo(object):
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         douyin_logger.info(f'[-] 正在打开主页...')
         await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload")
+        douyin_logger.info(f'[-] 上传页面就绪：{await page_timing(page)}')
+        # 选择文件前开始监听上传进度和完成状态
+        upload_detector = UploadCompletionDetector(page, self.file_path, DOUYIN_UPLOAD_STATE_JS, douyin_logger)
+        await upload_detector.start()
         # 点击 "上传视频" 按钮
         await page.locator("div[class^='container'] input").set_input_files(self.file_path)
 
@@ -157,24 +164,8 @@ class DouYinVideo(object):
             await page.press(css_selector, "Space")
         douyin_logger.info(f'总共添加{len(self.tags)}个话题')
 
-        while True:
-            # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
-            try:
-                #  新版：定位重新上传
-                number = await page.locator('[class^="long-card"] div:has-text("重新上传")').count()
-                if number > 0:
-                    douyin_logger.success("  [-]视频上传完毕")
-                    break
-                else:
-                    douyin_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-
-                    if await page.locator('div.progress-div > div:has-text("上传失败")').count():
-                        douyin_logger.error("  [-] 发现上传出错了... 准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                douyin_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+        # 等待出现"重新上传"按钮，代表视频上传完毕；上传失败时自动重新上传
+        await upload_detector.wait(on_failed=lambda: self.handle_upload_error(page))
         
         #上传视频封面
         await self.set_thumbnail(page, self.thumbnail_path)
@@ -193,6 +184,8 @@ class DouYinVideo(object):
         if self.publish_date != 0:
             await self.set_schedule_time_douyin(page, self.publish_date)
 
+        # 按平台和账号限速，拿到令牌后才点击发布
+        await publish_limiter.acquire(SOCIAL_MEDIA_DOUYIN, self.account_file)
         # 判断视频是否发布成功
         while True:
             # 判断视频是否发布成功
@@ -212,9 +205,6 @@ class DouYinVideo(object):
         await context.storage_state(path=self.account_file)  # 保存cookie
         douyin_logger.success('  [-]cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
     
     async def set_thumbnail(self, page: Page, thumbnail_path: str):
         if thumbnail_path:
@@ -243,7 +233,10 @@ class DouYinVideo(object):
         await page.locator('div[role="listbox"] [role="option"]').first.click()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        # 使用 Chromium 浏览器，context 关闭后浏览器归还浏览器池
+        async with browser_pool.lease(storage_state=self.account_file, headless=False,
+                                      executable_path=self.local_executable_path,
+                                      persistent_profile=True) as context:
+            await self.upload(context)
 
 
@@ -1,21 +1,31 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import BrowserContext, async_playwright
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_KUAISHOU
+from utils.browser_pool import browser_pool
+from utils.cookie_probe import probe_cookie
 from utils.files_times import get_absolute_path
 from utils.log import kuaishou_logger
+from utils.rate_limiter import publish_limiter
+from utils.upload_detector import UploadCompletionDetector, KUAISHOU_UPLOAD_STATE_JS
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用 http 探测，无法判断时再启动浏览器校验
+    verdict = await probe_cookie(SOCIAL_MEDIA_KUAISHOU, account_file)
+    if verdict is not None:
+        return verdict
+    return await browser_cookie_auth(account_file)
+
+
+async def browser_cookie_auth(account_file):
+    async with browser_pool.lease(storage_state=account_file) as context:
+        context = await set_init_script(context, SOCIAL_MEDIA_KUAISHOU)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -75,20 +85,9 @@ class KSVideo(object):
         kuaishou_logger.error("视频出错了，重新上传中")
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        print(self.local_executable_path)
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(
-                headless=False,
-                executable_path=self.local_executable_path,
-            )
-        else:
-            browser = await playwright.chromium.launch(
-                headless=False
-            )  # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
+        # context 由浏览器池租出，已加载指定的 cookie 文件
+        context = await set_init_script(context, SOCIAL_MEDIA_KUAISHOU)
         context.on("close", lambda: context.storage_state(path=self.account_file))
 
         # 创建一个新的页面
@@ -103,6 +102,9 @@ class KSVideo(object):
         upload_button = page.locator("button[class^='_upload-btn']")
         await upload_button.wait_for(state='visible')  # 确保按钮可见
 
+        # 选择文件前开始监听上传进度和完成状态
+        upload_detector = UploadCompletionDetector(page, self.file_path, KUAISHOU_UPLOAD_STATE_JS, kuaishou_logger)
+        await upload_detector.start()
         async with page.expect_file_chooser() as fc_info:
             await upload_button.click()
         file_chooser = await fc_info.value
@@ -136,33 +138,15 @@ class KSVideo(object):
             await page.keyboard.type(f"#{tag} ")
             await asyncio.sleep(2)
 
-        max_retries = 60  # 设置最大重试次数,最大等待时间为 2 分钟
-        retry_count = 0
-
-        while retry_count < max_retries:
-            try:
-                # 获取包含 '上传中' 文本的元素数量
-                number = await page.locator("text=上传中").count()
-
-                if number == 0:
-                    kuaishou_logger.success("视频上传完毕")
-                    break
-                else:
-                    if retry_count % 5 == 0:
-                        kuaishou_logger.info("正在上传视频中...")
-                    await asyncio.sleep(2)
-            except Exception as e:
-                kuaishou_logger.error(f"检查上传状态时发生错误: {e}")
-                await asyncio.sleep(2)  # 等待 2 秒后重试
-            retry_count += 1
-
-        if retry_count == max_retries:
-            kuaishou_logger.warning("超过最大重试次数，视频上传可能未完成。")
+        # 页面上不再有 '上传中' 代表视频上传完毕，超时会抛出异常而不是继续发布
+        await upload_detector.wait(on_failed=lambda: self.handle_upload_error(page))
 
         # 定时任务
         if self.publish_date != 0:
             await self.set_schedule_time(page, self.publish_date)
 
+        # 按平台和账号限速，拿到令牌后才点击发布
+        await publish_limiter.acquire(SOCIAL_MEDIA_KUAISHOU, self.account_file)
         # 判断视频是否发布成功
         while True:
             try:
@@ -190,13 +174,13 @@ class KSVideo(object):
         await context.storage_state(path=self.account_file)  # 保存cookie
         kuaishou_logger.info('cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        # 使用 Chromium 浏览器，context 关闭后浏览器归还浏览器池
+        async with browser_pool.lease(storage_state=self.account_file, headless=False,
+                                      executable_path=self.local_executable_path,
+                                      persistent_profile=True) as context:
+            await self.upload(context)
 
     async def set_schedule_time(self, page, publish_date):
         kuaishou_logger.info("click schedule")
@@ -0,0 +1,17 @@
+from utils.base_social_media import SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_KUAISHOU, get_platform
+from utils.constant import TencentZoneTypes
+
+
+async def setup_account(platform, account_file, handle):
+    setup = get_platform(platform).load_setup()
+    return await setup(str(account_file), handle=handle)
+
+
+def create_uploader(platform, title, video_file, tags, publish_date, account_file, thumbnail_path=None):
+    uploader_class = get_platform(platform).load_uploader()
+    if platform == SOCIAL_MEDIA_TENCENT:
+        category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
+        return uploader_class(title, video_file, tags, publish_date, account_file, category)
+    elif platform == SOCIAL_MEDIA_KUAISHOU:
+        return uploader_class(title, video_file, tags, publish_date, account_file)
+    return uploader_class(title, video_file, tags, publish_date, account_file, thumbnail_path=thumbnail_path)
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import BrowserContext, async_playwright
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_TENCENT
+from utils.browser_pool import browser_pool
+from utils.cookie_probe import probe_cookie
 from utils.files_times import get_absolute_path
 from utils.log import tencent_logger
+from utils.rate_limiter import publish_limiter
+from utils.upload_detector import UploadCompletionDetector, TENCENT_UPLOAD_STATE_JS
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -32,10 +36,16 @@ def format_str_for_short_title(origin_title: str) -> str:
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用 http 探测，无法判断时再启动浏览器校验
+    verdict = await probe_cookie(SOCIAL_MEDIA_TENCENT, account_file)
+    if verdict is not None:
+        return verdict
+    return await browser_cookie_auth(account_file)
+
+
+async def browser_cookie_auth(account_file):
+    async with browser_pool.lease(storage_state=account_file) as context:
+        context = await set_init_script(context, SOCIAL_MEDIA_TENCENT)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -133,12 +143,9 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
-        browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
+        # context 由浏览器池租出，已加载指定的 cookie 文件
+        context = await set_init_script(context, SOCIAL_MEDIA_TENCENT)
 
         # 创建一个新的页面
         page = await context.new_page()
@@ -148,6 +155,9 @@ class TencentVideo(object):
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
         # await page.wait_for_selector('input[type="file"]', timeout=10000)
+        # 选择文件前开始监听上传进度和完成状态
+        upload_detector = UploadCompletionDetector(page, self.file_path, TENCENT_UPLOAD_STATE_JS, tencent_logger)
+        await upload_detector.start()
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
         # 填充标题和话题
@@ -159,20 +169,19 @@ class TencentVideo(object):
         # 原创选择
         await self.add_original(page)
         # 检测上传状态
-        await self.detect_upload_status(page)
+        await self.detect_upload_status(page, upload_detector)
         if self.publish_date != 0:
             await self.set_schedule_time_tencent(page, self.publish_date)
         # 添加短标题
         await self.add_short_title(page)
 
+        # 按平台和账号限速，拿到令牌后才点击发布
+        await publish_limiter.acquire(SOCIAL_MEDIA_TENCENT, self.account_file)
         await self.click_publish(page)
 
         await context.storage_state(path=f"{self.account_file}")  # 保存cookie
         tencent_logger.success('  [-]cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
 
     async def add_short_title(self, page):
         short_title_element = page.get_by_text("短标题", exact=True).locator("..").locator(
@@ -201,26 +210,9 @@ class TencentVideo(object):
                     tencent_logger.info("  [-] 视频正在发布中...")
                     await asyncio.sleep(0.5)
 
-    async def detect_upload_status(self, page):
-        while True:
-            # 匹配删除按钮，代表视频上传完毕，如果不存在，代表视频正在上传，则等待
-            try:
-                # 匹配删除按钮，代表视频上传完毕
-                if "weui-desktop-btn_disabled" not in await page.get_by_role("button", name="发表").get_attribute(
-                        'class'):
-                    tencent_logger.info("  [-]视频上传完毕")
-                    break
-                else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-                    # 出错了视频出错
-                    if await page.locator('div.status-msg.error').count() and await page.locator(
-                            'div.media-status-content div.tag-inner:has-text("删除")').count():
-                        tencent_logger.error("  [-] 发现上传出错了...准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                tencent_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+    async def detect_upload_status(self, page, upload_detector: UploadCompletionDetector):
+        # "发表"按钮可点击代表视频上传完毕；出现错误提示时自动重新上传
+        await upload_detector.wait(on_failed=lambda: self.handle_upload_error(page))
 
     async def add_title_tags(self, page):
         await page.locator("div.input-editor").click()
@@ -263,5 +255,8 @@ class TencentVideo(object):
                 await page.locator('button:has-text("声明原创"):visible').click()
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
+        async with browser_pool.lease(storage_state=self.account_file, headless=False,
+                                      executable_path=self.local_executable_path,
+                                      persistent_profile=True) as context:
+            await self.upload(context)
@@ -2,20 +2,29 @@
 import re
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import BrowserContext, async_playwright
 import os
 import asyncio
 from uploader.tk_uploader.tk_config import Tk_Locator
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_TIKTOK
+from utils.browser_pool import browser_pool
+from utils.cookie_probe import probe_cookie
 from utils.files_times import get_absolute_path
 from utils.log import tiktok_logger
+from utils.rate_limiter import publish_limiter
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.firefox.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用 http 探测，无法判断时再启动浏览器校验
+    verdict = await probe_cookie(SOCIAL_MEDIA_TIKTOK, account_file)
+    if verdict is not None:
+        return verdict
+    return await browser_cookie_auth(account_file)
+
+
+async def browser_cookie_auth(account_file):
+    async with browser_pool.lease(storage_state=account_file, browser_type='firefox') as context:
+        context = await set_init_script(context, SOCIAL_MEDIA_TIKTOK)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -139,10 +148,9 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.firefox.launch(headless=False)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
+        # context 由浏览器池租出，已加载指定的 cookie 文件
+        context = await set_init_script(context, SOCIAL_MEDIA_TIKTOK)
         page = await context.new_page()
 
         await page.goto("https://www.tiktok.com/creator-center/upload")
@@ -173,14 +181,13 @@ class TiktokVideo(object):
         if self.publish_date != 0:
             await self.set_schedule_time(page, self.publish_date)
 
+        # rate limit per platform and account before clicking publish
+        await publish_limiter.acquire(SOCIAL_MEDIA_TIKTOK, self.account_file)
         await self.click_publish(page)
 
         await context.storage_state(path=f"{self.account_file}")  # save cookie
         tiktok_logger.info('  [-] update cookie！')
         await asyncio.sleep(2)  # close delay for look the video status
-        # close all
-        await context.close()
-        await browser.close()
 
     async def add_title_tags(self, page):
 
@@ -260,6 +267,7 @@ class TiktokVideo(object):
             self.locator_base = page.locator(Tk_Locator.default) 
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with browser_pool.lease(storage_state=self.account_file, browser_type='firefox',
+                                      headless=False, persistent_profile=True) as context:
+            await self.upload(context)
 
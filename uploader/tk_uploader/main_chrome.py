@@ -2,22 +2,32 @@
 import re
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import BrowserContext, async_playwright
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH
 from uploader.tk_uploader.tk_config import Tk_Locator
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_TIKTOK
+from utils.browser_pool import browser_pool
+from utils.cookie_probe import probe_cookie
 from utils.files_times import get_absolute_path
 from utils.log import tiktok_logger
+from utils.rate_limiter import publish_limiter
+from utils.upload_detector import UploadCompletionDetector, TIKTOK_UPLOAD_STATE_JS
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用 http 探测，无法判断时再启动浏览器校验
+    verdict = await probe_cookie(SOCIAL_MEDIA_TIKTOK, account_file)
+    if verdict is not None:
+        return verdict
+    return await browser_cookie_auth(account_file)
+
+
+async def browser_cookie_auth(account_file):
+    async with browser_pool.lease(storage_state=account_file) as context:
+        context = await set_init_script(context, SOCIAL_MEDIA_TIKTOK)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -149,10 +159,9 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.chromium.launch(headless=False, executable_path=self.local_executable_path)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
+    async def upload(self, context: BrowserContext) -> None:
+        # context 由浏览器池租出，已加载指定的 cookie 文件
+        context = await set_init_script(context, SOCIAL_MEDIA_TIKTOK)
         page = await context.new_page()
 
         # change language to eng first
@@ -174,6 +183,10 @@ class TiktokVideo(object):
             'button:has-text("Select video"):visible')
         await upload_button.wait_for(state='visible')  # 确保按钮可见
 
+        # start listening for upload progress before choosing the file
+        upload_detector = UploadCompletionDetector(page, self.file_path, TIKTOK_UPLOAD_STATE_JS, tiktok_logger,
+                                                   frame_selector=Tk_Locator.tk_iframe)
+        await upload_detector.start()
         async with page.expect_file_chooser() as fc_info:
             await upload_button.click()
         file_chooser = await fc_info.value
@@ -181,7 +194,7 @@ class TiktokVideo(object):
 
         await self.add_title_tags(page)
         # detect upload status
-        await self.detect_upload_status(page)
+        await self.detect_upload_status(page, upload_detector)
         if self.thumbnail_path:
             tiktok_logger.info(f'[+] Uploading thumbnail file {self.title}.png')
             await self.upload_thumbnails(page)
@@ -189,14 +202,13 @@ class TiktokVideo(object):
         if self.publish_date != 0:
             await self.set_schedule_time(page, self.publish_date)
 
+        # rate limit per platform and account before clicking publish
+        await publish_limiter.acquire(SOCIAL_MEDIA_TIKTOK, self.account_file)
         await self.click_publish(page)
 
         await context.storage_state(path=f"{self.account_file}")  # save cookie
         tiktok_logger.info('  [-] update cookie！')
         await asyncio.sleep(2)  # close delay for look the video status
-        # close all
-        await context.close()
-        await browser.close()
 
     async def add_title_tags(self, page):
 
@@ -273,24 +285,9 @@ class TiktokVideo(object):
                     await page.screenshot(full_page=True)
                     await asyncio.sleep(0.5)
 
-    async def detect_upload_status(self, page):
-        while True:
-            try:
-                # if await self.locator_base.locator('div.btn-post > button').get_attribute("disabled") is None:
-                if await self.locator_base.locator(
-                        'div.button-group > button >> text=Post').get_attribute("disabled") is None:
-                    tiktok_logger.info("  [-]video uploaded.")
-                    break
-                else:
-                    tiktok_logger.info("  [-] video uploading...")
-                    await asyncio.sleep(2)
-                    if await self.locator_base.locator(
-                            'button[aria-label="Select file"]').count():
-                        tiktok_logger.info("  [-] found some error while uploading now retry...")
-                        await self.handle_upload_error(page)
-            except:
-                tiktok_logger.info("  [-] video uploading...")
-                await asyncio.sleep(2)
+    async def detect_upload_status(self, page, upload_detector: UploadCompletionDetector):
+        # the Post button becomes enabled once uploaded; "Select file" means the upload failed, retry it
+        await upload_detector.wait(on_failed=lambda: self.handle_upload_error(page))
 
     async def choose_base_locator(self, page):
         # await page.wait_for_selector('div.upload-container')
@@ -300,5 +297,7 @@ class TiktokVideo(object):
             self.locator_base = page.locator(Tk_Locator.default) 
 
     async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
+        async with browser_pool.lease(storage_state=self.account_file, headless=False,
+                                      executable_path=self.local_executable_path,
+                                      persistent_profile=True) as context:
+            await self.upload(context)
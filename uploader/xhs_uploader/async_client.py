@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from conf import XHS_SERVER, XHS_PUBLISH_CONCURRENCY, XHS_HTTP_MAX_CONNECTIONS, XHS_PUBLISH_PENDING_PER_ACCOUNT
+from uploader.xhs_uploader.topic_cache import TopicCache, MAX_TOPICS_PER_NOTE
+from utils.base_social_media import SOCIAL_MEDIA_XHS
+from utils.rate_limiter import PublishRateLimiter, publish_limiter
+
+XHS_HOST = "https://edith.xiaohongshu.com"
+XHS_UPLOAD_HOST = "https://ros-upload.xiaohongshu.com"
+XHS_FIRST_FRAME_URL = "https://www.xiaohongshu.com/fe_api/burdock/v2/note/query_transcode"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) " \
+             "Chrome/111.0.0.0 Safari/537.36"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 等待视频转码出第一帧作为封面：间隔（秒）和次数，与 xhs 库一致
+FIRST_FRAME_WAIT = 3
+FIRST_FRAME_RETRIES = 10
+
+
+class XhsApiError(Exception):
+    def __init__(self, message, data=None):
+        super().__init__(message)
+        self.data = data
+
+
+class XhsVerifyError(XhsApiError):
+    pass
+
+
+@dataclass
+class XhsAccount:
+    name: str
+    cookie: str
+    cookies: Dict[str, str] = field(init=False)
+
+    def __post_init__(self):
+        self.cookies = dict(item.strip().split('=', 1) for item in self.cookie.split(';') if '=' in item)
+
+    @property
+    def a1(self) -> str:
+        return self.cookies.get('a1', '')
+
+    @property
+    def web_session(self) -> str:
+        return self.cookies.get('web_session', '')
+
+
+@dataclass
+class XhsVideoNote:
+    video_file: str
+    title: str
+    desc: str
+    tags: List[str] = field(default_factory=list)
+    post_time: Optional[datetime] = None
+    is_private: bool = False
+
+
+async def _iter_file(path, chunk_size=UPLOAD_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class AsyncXhsPublisher(object):
+    """
+    小红书异步发布：接口请求和签名服务各用一个带连接池的 httpx.AsyncClient，多个账号共用；
+    话题查询与视频上传并发进行，发布前按平台和账号限速
+    """
+
+    def __init__(self, sign_server: str = XHS_SERVER, concurrency: int = XHS_PUBLISH_CONCURRENCY,
+                 limiter: PublishRateLimiter = None, topic_cache: TopicCache = None, timeout: float = 60,
+                 pending_per_account: int = XHS_PUBLISH_PENDING_PER_ACCOUNT):
+        limits = httpx.Limits(max_connections=XHS_HTTP_MAX_CONNECTIONS,
+                              max_keepalive_connections=XHS_HTTP_MAX_CONNECTIONS)
+        # 多个账号共用连接池，cookie 每次请求单独带上，不保存响应里的 cookie，避免串号
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        self._client = httpx.AsyncClient(headers={'user-agent': USER_AGENT}, cookies=no_cookies, timeout=timeout,
+                                         limits=limits)
+        self._sign_client = httpx.AsyncClient(base_url=sign_server, timeout=timeout, limits=limits)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.pending_per_account = pending_per_account
+        self._account_slots: Dict[str, asyncio.Semaphore] = {}
+        self.limiter = limiter or publish_limiter
+        self.topic_cache = topic_cache or TopicCache()
+
+    async def aclose(self):
+        await self._client.aclose()
+        await self._sign_client.aclose()
+        self.topic_cache.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _sign(self, account: XhsAccount, uri, data=None) -> dict:
+        res = await self._sign_client.post('/sign', json={"uri": uri, "data": data, "a1": account.a1,
+                                                           "web_session": account.web_session})
+        res.raise_for_status()
+        signs = res.json()
+        return {"x-s": signs["x-s"], "x-t": signs["x-t"]}
+
+    @staticmethod
+    def _parse(res: httpx.Response):
+        # 与 xhs 库的 XhsClient.request 保持一致
+        try:
+            data = res.json()
+        except ValueError:
+            return res
+        if res.status_code in (461, 471):
+            raise XhsVerifyError(f"出现验证码，请求失败，Verifytype: {res.headers.get('Verifytype')}，"
+                                 f"Verifyuuid: {res.headers.get('Verifyuuid')}", data)
+        if data.get("success"):
+            return data.get("data", data.get("success"))
+        raise XhsApiError(f'小红书接口返回失败：{data}', data)
+
+    async def _get(self, account: XhsAccount, uri, params: dict = None):
+        # 签名针对未编码的完整 uri，拼接方式必须与签名时一致
+        if params:
+            uri = f"{uri}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
+        headers = {**await self._sign(account, uri), 'Cookie': account.cookie}
+        res = await self._client.get(f'{XHS_HOST}{uri}', headers=headers)
+        return self._parse(res)
+
+    async def _post(self, account: XhsAccount, uri, data: dict, headers: dict = None):
+        headers = {**(headers or {}), **await self._sign(account, uri, data), 'Content-Type': 'application/json',
+                   'Cookie': account.cookie}
+        body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+        res = await self._client.post(f'{XHS_HOST}{uri}', content=body, headers=headers)
+        return self._parse(res)
+
+    async def get_upload_permit(self, account: XhsAccount, scene: str) -> tuple:
+        res = await self._get(account, "/api/media/v1/upload/web/permit",
+                              {"biz_name": "spectrum", "scene": scene, "file_count": 1, "version": "1",
+                               "source": "web"})
+        temp_permit = res["uploadTempPermits"][0]
+        return temp_permit["fileIds"][0], temp_permit["token"]
+
+    async def upload_video(self, file_id, token, video_file) -> str:
+        """
+        流式上传视频，返回转码用的 video id
+        """
+        headers = {"X-Cos-Security-Token": token, "Content-Type": "video/mp4",
+                   "Content-Length": str(os.path.getsize(video_file))}
+        res = await self._client.put(f'{XHS_UPLOAD_HOST}/{file_id}', content=_iter_file(video_file), headers=headers)
+        res.raise_for_status()
+        return res.headers["X-Ros-Video-Id"]
+
+    async def get_first_frame(self, account: XhsAccount, video_id) -> Optional[str]:
+        headers = {"content-type": "application/json;charset=UTF-8", "referer": "https://creator.xiaohongshu.com/",
+                   "x-sign": "X2d2ea70d804b4f98d20cc70f5643bc26", 'Cookie': account.cookie}
+        res = await self._client.post(XHS_FIRST_FRAME_URL, json={"videoId": video_id}, headers=headers)
+        data = res.json()["data"]
+        return data["firstFrameFileId"] if data["hasFirstFrame"] else None
+
+    async def check_cookie(self, account: XhsAccount) -> bool:
+        # 与原示例一致：用不存在的视频 id 查询首帧，cookie 失效时接口报错
+        try:
+            await self.get_first_frame(account, "3214")
+        except Exception:
+            return False
+        return True
+
+    async def wait_first_frame(self, account: XhsAccount, video_id) -> Optional[str]:
+        for _ in range(FIRST_FRAME_RETRIES):
+            await asyncio.sleep(FIRST_FRAME_WAIT)
+            image_id = await self.get_first_frame(account, video_id)
+            if image_id:
+                return image_id
+        return None
+
+    async def get_suggest_topic(self, account: XhsAccount, keyword) -> list:
+        data = {"keyword": keyword, "suggest_topic_request": {"title": "", "desc": ""},
+                "page": {"page_size": 20, "page": 1}}
+        return (await self._post(account, "/web_api/sns/v1/search/topic", data))["topic_info_dtos"]
+
+    async def resolve_topics(self, account: XhsAccount, tags: List[str]) -> List[dict]:
+        """
+        每个 tag 取第一个官方话题，优先读缓存，缓存没有的 tag 并发查询；查询失败的 tag 跳过
+        """
+        return await self.topic_cache.resolve(tags, lambda tag: self.get_suggest_topic(account, tag))
+
+    async def prefetch_topics(self, account: XhsAccount, tags: List[str]) -> int:
+        return await self.topic_cache.prefetch(tags, lambda tag: self.get_suggest_topic(account, tag))
+
+    async def create_note(self, account: XhsAccount, note: XhsVideoNote, file_id, image_id, topics):
+        post_time = round(note.post_time.timestamp()) * 1000 if note.post_time else None
+        business_binds = {"version": 1, "noteId": 0, "noteOrderBind": {}, "notePostTiming": {"postTime": post_time},
+                          "noteCollectionBind": {"id": ""}}
+        hash_tags = ' '.join(f"#{topic['name']}[话题]#" for topic in topics)
+        video_info = {
+            "file_id": file_id,
+            "timelines": [],
+            "cover": {"file_id": image_id, "frame": {"ts": 0, "is_user_select": False, "is_upload": False}},
+            "chapters": [],
+            "chapter_sync_text": False,
+            "entrance": "web",
+        }
+        data = {
+            "common": {
+                "type": "video",
+                "title": note.title,
+                "note_id": "",
+                "desc": f'{note.desc} {hash_tags}' if hash_tags else note.desc,
+                "source": '{"type":"web","ids":"","extraInfo":"{\\"subType\\":\\"official\\"}"}',
+                "business_binds": json.dumps(business_binds, separators=(",", ":")),
+                "ats": [],
+                "hash_tag": topics,
+                "post_loc": {},
+                "privacy_info": {"op_type": 1, "type": int(note.is_private)},
+            },
+            "image_info": None,
+            "video_info": video_info,
+        }
+        return await self._post(account, "/web_api/sns/v2/note", data,
+                                headers={"Referer": "https://creator.xiaohongshu.com/"})
+
+    def _account_slot(self, account: XhsAccount) -> asyncio.Semaphore:
+        if account.name not in self._account_slots:
+            self._account_slots[account.name] = asyncio.Semaphore(self.pending_per_account)
+        return self._account_slots[account.name]
+
+    async def publish_video_note(self, account: XhsAccount, note: XhsVideoNote) -> dict:
+        """
+        发布一条视频笔记：话题查询与视频上传同时进行，发布前按平台和账号限速；
+        账号名额从上传开始占用到发布完成，每个账号已上传未发布的笔记不超过 pending_per_account 个
+        """
+        async with self._account_slot(account):
+            async with self._semaphore:
+                topics_task = asyncio.create_task(self.resolve_topics(account, note.tags[:MAX_TOPICS_PER_NOTE]))
+                try:
+                    file_id, token = await self.get_upload_permit(account, "video")
+                    started = time.perf_counter()
+                    video_id = await self.upload_video(file_id, token, note.video_file)
+                    logger.info(f'[{account.name}] 视频上传完成，耗时{time.perf_counter() - started:.1f}秒：'
+                                f'{note.video_file}')
+                    image_id = await self.wait_first_frame(account, video_id)
+                    topics = await topics_task
+                finally:
+                    topics_task.cancel()
+            # 等待限速时不占用上传名额，其它账号的笔记继续上传
+            await self.limiter.acquire(SOCIAL_MEDIA_XHS, account.name)
+            return await self.create_note(account, note, file_id, image_id, topics)
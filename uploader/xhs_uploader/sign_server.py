@@ -0,0 +1,266 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from fastapi import FastAPI, HTTPException
+from loguru import logger
+from pydantic import BaseModel
+
+from conf import XHS_SERVER, XHS_SIGN_PAGES, XHS_SIGN_PAGE_URL, XHS_SIGN_PAGE_MAX_USES, XHS_SIGN_TIMEOUT
+from utils.base_social_media import set_init_script
+
+# 页面脚本加载完成后才有签名函数，用它判断页面是否预热完成，代替固定 sleep
+SIGN_READY_JS = "() => typeof window._webmsxyw === 'function'"
+SIGN_JS = "([url, data]) => window._webmsxyw(url, data)"
+# 一次签名最多换几个页面重试
+SIGN_RETRIES = 3
+
+
+class SignError(Exception):
+    pass
+
+
+class _SignPage(object):
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.a1 = None  # 当前页面写入的 a1 cookie，签名结果与 a1 绑定
+        self.uses = 0
+
+
+class SignPagePool(object):
+    """
+    小红书签名页面池：启动一个浏览器，预热 size 个页面，并发的签名请求各占一个页面，出错或用满次数的页面回收重建
+    """
+
+    def __init__(self, size: int = XHS_SIGN_PAGES, url: str = XHS_SIGN_PAGE_URL,
+                 cookie_domain: Optional[str] = '.xiaohongshu.com', headless: bool = True,
+                 max_uses: int = XHS_SIGN_PAGE_MAX_USES, timeout: float = XHS_SIGN_TIMEOUT):
+        self.size = size
+        self.url = url
+        # 为 None 时 a1 只写到签名页所在的域名下（本地测试页）
+        self.cookie_domain = cookie_domain
+        self.headless = headless
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self._playwright = None
+        self._browser = None
+        self._idle: List[_SignPage] = []
+        self._available = asyncio.Semaphore(0)
+        self._replacing = set()
+        self._signs = 0
+        self._failures = 0
+        self._recycles = 0
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        if self.started:
+            return
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        pages = await asyncio.gather(*(self._new_page() for _ in range(self.size)), return_exceptions=True)
+        for sign_page in pages:
+            if isinstance(sign_page, Exception):
+                logger.warning(f'签名页面预热失败，稍后重试：{sign_page}')
+                self._replace()
+            else:
+                self._checkin(sign_page)
+        logger.info(f'签名服务已启动，{len(self._idle)}/{self.size}个页面就绪：{self.url}')
+
+    async def stop(self):
+        if not self.started:
+            return
+        for task in list(self._replacing):
+            task.cancel()
+        await self._browser.close()
+        await self._playwright.stop()
+        self._browser = None
+        self._playwright = None
+        self._idle.clear()
+        logger.info('签名服务已关闭')
+
+    def _cookie(self, a1) -> dict:
+        cookie = {'name': 'a1', 'value': a1}
+        if self.cookie_domain:
+            cookie.update(domain=self.cookie_domain, path='/')
+        else:
+            cookie['url'] = self.url
+        return cookie
+
+    async def _wait_ready(self, page):
+        await page.wait_for_function(SIGN_READY_JS, timeout=self.timeout * 1000)
+
+    async def _new_page(self) -> _SignPage:
+        context = await self._browser.new_context()
+        try:
+            await set_init_script(context)
+            page = await context.new_page()
+            await page.goto(self.url, timeout=self.timeout * 1000)
+            await self._wait_ready(page)
+        except Exception:
+            await context.close()
+            raise
+        return _SignPage(context, page)
+
+    async def _set_a1(self, sign_page: _SignPage, a1: str):
+        # 签名脚本在页面加载时读取 a1，写入 cookie 后需要刷新页面
+        await sign_page.context.add_cookies([self._cookie(a1)])
+        await sign_page.page.reload(timeout=self.timeout * 1000)
+        await self._wait_ready(sign_page.page)
+        sign_page.a1 = a1
+
+    async def _checkout(self, a1) -> _SignPage:
+        try:
+            # 所有页面都在重建且一直失败（如网站无法访问）时不无限等待
+            await asyncio.wait_for(self._available.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise SignError(f'{self.timeout}秒内没有可用的签名页面')
+        # 优先用已经写入同一个 a1 的页面，省去刷新
+        for sign_page in self._idle:
+            if sign_page.a1 == a1:
+                self._idle.remove(sign_page)
+                return sign_page
+        return self._idle.pop()
+
+    def _checkin(self, sign_page: _SignPage):
+        self._idle.append(sign_page)
+        self._available.release()
+
+    def _replace(self, old: _SignPage = None):
+        # 后台重建页面，重建完成前该页面的名额不可用，其它请求继续用剩下的页面
+        task = asyncio.create_task(self._rebuild(old))
+        self._replacing.add(task)
+        task.add_done_callback(self._replacing.discard)
+
+    async def _rebuild(self, old: Optional[_SignPage]):
+        self._recycles += 1
+        if old is not None:
+            try:
+                await old.context.close()
+            except Exception:
+                pass
+        delay = 1
+        while self.started:
+            try:
+                self._checkin(await self._new_page())
+                return
+            except Exception as e:
+                logger.warning(f'签名页面重建失败，{delay}秒后重试：{e}')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def sign(self, uri, data=None, a1="", web_session="") -> dict:
+        if not self.started:
+            raise SignError('签名服务未启动')
+        last_error = None
+        for _ in range(SIGN_RETRIES):
+            sign_page = await self._checkout(a1)
+            try:
+                if a1 and sign_page.a1 != a1:
+                    await self._set_a1(sign_page, a1)
+                encrypt_params = await sign_page.page.evaluate(SIGN_JS, [uri, data])
+            except Exception as e:
+                # window._webmsxyw is not a function、页面跳转等错误，换一个页面重试
+                last_error = e
+                self._failures += 1
+                logger.warning(f'签名失败，回收页面后重试：{e}')
+                self._replace(sign_page)
+                continue
+            sign_page.uses += 1
+            self._signs += 1
+            if sign_page.uses >= self.max_uses:
+                self._replace(sign_page)
+            else:
+                self._checkin(sign_page)
+            return {
+                "x-s": encrypt_params["X-s"],
+                "x-t": str(encrypt_params["X-t"])
+            }
+        raise SignError(f'重试{SIGN_RETRIES}次仍无法签名：{last_error}')
+
+    def stats(self) -> dict:
+        return {
+            'started': self.started,
+            'size': self.size,
+            'idle': len(self._idle),
+            'rebuilding': len(self._replacing),
+            'signs': self._signs,
+            'failures': self._failures,
+            'recycles': self._recycles,
+        }
+
+
+class SignRequest(BaseModel):
+    uri: str
+    data: Optional[dict] = None
+    a1: str = ""
+    web_session: str = ""
+
+
+# 创建服务实例
+sign_pool = SignPagePool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await sign_pool.start()
+    try:
+        yield
+    finally:
+        await sign_pool.stop()
+
+
+app = FastAPI(title="xhs sign server", lifespan=lifespan)
+
+
+@app.post("/sign")
+async def sign(request: SignRequest):
+    try:
+        return await sign_pool.sign(request.uri, request.data, request.a1, request.web_session)
+    except SignError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/stats")
+async def stats():
+    return sign_pool.stats()
+
+
+class _LocalSigner(object):
+    """
+    同步代码（XhsClient 的 sign 回调）在当前进程内复用签名页面：后台线程跑事件循环，只在第一次签名时启动浏览器
+    """
+
+    def __init__(self, size: int = 1):
+        self._pool = SignPagePool(size=size)
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='xhs-sign', daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._pool.start(), loop).result()
+            self._loop = loop
+
+    def sign(self, uri, data=None, a1="", web_session="") -> dict:
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._pool.sign(uri, data, a1, web_session), self._loop).result()
+
+
+local_signer = _LocalSigner()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    server = urlparse(XHS_SERVER)
+    uvicorn.run(app, host=server.hostname, port=server.port)
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from conf import XHS_TOPIC_CACHE_DB, XHS_TOPIC_TTL, XHS_TOPIC_NEGATIVE_TTL
+from utils.files_times import get_title_and_hashtags
+
+# 每个视频最多使用的话题数，与发布时一致
+MAX_TOPICS_PER_NOTE = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    tag TEXT PRIMARY KEY,
+    topic TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+TopicFetcher = Callable[[str], Awaitable[list]]
+
+
+def normalize_tag(tag: str) -> str:
+    """
+    全角半角、大小写、首尾的 # 和多余空白不同的 tag 视为同一个
+    """
+    tag = unicodedata.normalize('NFKC', tag).strip().strip('#').strip()
+    return ' '.join(tag.split()).lower()
+
+
+def collect_tags(files: Iterable) -> List[str]:
+    """
+    文件夹里所有视频用到的 tag，去重后按首次出现的顺序返回
+    """
+    tags = {}
+    for file in files:
+        try:
+            _, file_tags = get_title_and_hashtags(str(file))
+        except (OSError, IndexError):
+            continue
+        for tag in file_tags[:MAX_TOPICS_PER_NOTE]:
+            if normalize_tag(tag):
+                tags.setdefault(normalize_tag(tag), tag)
+    return list(tags.values())
+
+
+class TopicCache(object):
+    """
+    小红书话题缓存：规范化后的 tag -> 第一个官方话题，查不到的 tag 也缓存（较短的 TTL），查询失败不缓存
+    """
+
+    def __init__(self, db_path=XHS_TOPIC_CACHE_DB, ttl: float = XHS_TOPIC_TTL,
+                 negative_ttl: float = XHS_TOPIC_NEGATIVE_TTL):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        # 同一个 tag 同时只查询一次，其它请求等待同一个结果
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, tag) -> Tuple[bool, Optional[dict]]:
+        """
+        返回 (是否命中, 话题)；命中但话题为 None 表示该 tag 没有官方话题
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT topic, fetched_at FROM topics WHERE tag = ?",
+                                    (normalize_tag(tag),)).fetchone()
+        if row is None:
+            return False, None
+        topic, fetched_at = row
+        if time.time() - fetched_at > (self.ttl if topic else self.negative_ttl):
+            return False, None
+        return True, json.loads(topic) if topic else None
+
+    def put(self, tag, topic: Optional[dict]):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO topics (tag, topic, fetched_at) VALUES (?, ?, ?)",
+                              (normalize_tag(tag), json.dumps(topic, ensure_ascii=False) if topic else None,
+                               time.time()))
+
+    async def _fetch(self, tag, fetch: TopicFetcher) -> Optional[dict]:
+        key = normalize_tag(tag)
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch(tag)
+            topic = {**result[0], 'type': 'topic'} if result else None
+            self.put(tag, topic)
+            future.set_result(topic)
+            return topic
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其它等待者时避免 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _lookup(self, tag) -> Tuple[bool, Optional[dict]]:
+        # 读缓存并计入命中率统计，发布和预取都经过这里
+        hit, topic = self.get(tag)
+        if not hit:
+            self.misses += 1
+        elif topic:
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return hit, topic
+
+    async def get_topic(self, tag, fetch: TopicFetcher) -> Optional[dict]:
+        hit, topic = self._lookup(tag)
+        if hit:
+            return topic
+        return await self._fetch(tag, fetch)
+
+    async def resolve(self, tags: List[str], fetch: TopicFetcher) -> List[dict]:
+        """
+        每个 tag 对应的话题，按 tags 顺序返回；重复、没有话题或查询失败的 tag 跳过
+        """
+        unique = {}
+        for tag in tags:
+            if normalize_tag(tag):
+                unique.setdefault(normalize_tag(tag), tag)
+        tags = list(unique.values())
+        results = await asyncio.gather(*(self.get_topic(tag, fetch) for tag in tags), return_exceptions=True)
+        topics = []
+        for tag, result in zip(tags, results):
+            if isinstance(result, Exception):
+                logger.warning(f'话题查询失败：{tag}，{result}')
+            elif result:
+                topics.append(result)
+        return topics
+
+    async def prefetch(self, tags: Iterable[str], fetch: TopicFetcher, concurrency: int = 3) -> int:
+        """
+        发布前批量查询缓存里没有的 tag，返回实际查询的数量
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        # 与 resolve 一样按规范化后的 tag 去重，写法不同的同一个 tag 只查一次、只计一次
+        unique = {}
+        for tag in tags:
+            if normalize_tag(tag):
+                unique.setdefault(normalize_tag(tag), tag)
+        missing = [tag for tag in unique.values() if not self._lookup(tag)[0]]
+
+        async def one(tag):
+            async with semaphore:
+                await self._fetch(tag, fetch)
+
+        results = await asyncio.gather(*(one(tag) for tag in missing), return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.info(f'话题预取完成：查询{len(missing)}个，失败{failed}个')
+        return len(missing)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'lookups': lookups,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0,
+        }
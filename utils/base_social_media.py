@@ -1,5 +1,7 @@
+import importlib
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 from conf import BASE_DIR
 
@@ -8,17 +10,69 @@ SOCIAL_MEDIA_TENCENT = "tencent"
 SOCIAL_MEDIA_TIKTOK = "tiktok"
 SOCIAL_MEDIA_BILIBILI = "bilibili"
 SOCIAL_MEDIA_KUAISHOU = "kuaishou"
+SOCIAL_MEDIA_XHS = "xhs"
+
+
+def load_entry_point(path: str):
+    """
+    按 'module:attr' 导入对象
+    """
+    module_name, attr = path.split(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+@dataclass(frozen=True)
+class PlatformEntry:
+    setup: str  # 'module:attr'，校验 cookie / 扫码登录的协程函数 (account_file, handle) -> bool
+    uploader: str  # 'module:attr'，上传类
+
+    def load_setup(self):
+        return load_entry_point(self.setup)
+
+    def load_uploader(self):
+        return load_entry_point(self.uploader)
+
+
+# 平台 -> 入口，上传模块会加载 playwright，首次用到该平台时才导入
+PLATFORM_REGISTRY: Dict[str, PlatformEntry] = {
+    SOCIAL_MEDIA_DOUYIN: PlatformEntry('uploader.douyin_uploader.main:douyin_setup',
+                                       'uploader.douyin_uploader.main:DouYinVideo'),
+    SOCIAL_MEDIA_TENCENT: PlatformEntry('uploader.tencent_uploader.main:weixin_setup',
+                                        'uploader.tencent_uploader.main:TencentVideo'),
+    SOCIAL_MEDIA_TIKTOK: PlatformEntry('uploader.tk_uploader.main_chrome:tiktok_setup',
+                                       'uploader.tk_uploader.main_chrome:TiktokVideo'),
+    SOCIAL_MEDIA_KUAISHOU: PlatformEntry('uploader.ks_uploader.main:ks_setup',
+                                         'uploader.ks_uploader.main:KSVideo'),
+}
+
+
+def register_platform(platform, setup: str, uploader: str):
+    PLATFORM_REGISTRY[platform] = PlatformEntry(setup, uploader)
+
+
+def get_platform(platform) -> PlatformEntry:
+    entry = PLATFORM_REGISTRY.get(platform)
+    if entry is None:
+        raise ValueError(f"不支持的平台：{platform}")
+    return entry
 
 
 def get_supported_social_media() -> List[str]:
-    return [SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU]
+    return list(PLATFORM_REGISTRY)
 
 
 def get_cli_action() -> List[str]:
     return ["upload", "login", "watch"]
 
 
-async def set_init_script(context):
+async def set_init_script(context, platform=None):
+    """
+    注入反检测脚本；传入 platform 且开启精简模式时，同时屏蔽该平台上传流程不需要的资源
+    """
     stealth_js_path = Path(BASE_DIR / "utils/stealth.min.js")
     await context.add_init_script(path=stealth_js_path)
+    if platform is not None:
+        # lean_mode 依赖本模块的平台常量，在这里导入
+        from utils.lean_mode import apply_lean_policy
+        await apply_lean_policy(context, platform)
     return context
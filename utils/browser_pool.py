@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from loguru import logger
+
+from conf import BROWSER_POOL_MAX_USES, BROWSER_POOL_MAX_RSS_MB, BROWSER_PERSISTENT_PROFILES
+from utils.browser_profiles import lease_profile
+from utils.browserd import get_cdp_endpoint
+from utils.lean_mode import lean_launch_args
+
+try:
+    import psutil
+except ImportError:  # 内存上限检测为可选功能
+    psutil = None
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser
+
+
+class _PooledBrowser(object):
+    def __init__(self, key, browser: 'Browser', daemon: bool = False):
+        self.key = key
+        self.browser = browser
+        self.daemon = daemon  # 连接的是 browserd 的常驻浏览器，关闭只是断开连接
+        self.uses = 0  # 已租出的 context 次数
+        self.active = 0  # 正在使用中的 context 数量
+        self.retired = False  # 退役后不再租出，等待 active 归零后关闭
+        self.launched_at = time.time()
+
+
+class BrowserPool(object):
+    """
+    进程级浏览器池：启动一次，按账号租出相互隔离的 context，浏览器达到使用次数或内存上限后回收重启；
+    连接 browserd 的浏览器只统计本进程启动的浏览器内存，常驻浏览器的内存上限由 browserd 回收
+    """
+
+    def __init__(self, max_uses: int = BROWSER_POOL_MAX_USES, max_rss_mb: int = BROWSER_POOL_MAX_RSS_MB):
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self._playwright = None
+        self._browsers: Dict[Tuple, _PooledBrowser] = {}
+        self._lock = asyncio.Lock()
+        self._total_leases = 0
+        self._launches = 0
+        self._recycles = 0
+        self._daemon_connects = 0
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self):
+        if self.started:
+            return
+        # playwright 导入较慢，用到浏览器时才导入
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        logger.info(f'浏览器池已启动，max_uses={self.max_uses}，max_rss_mb={self.max_rss_mb}')
+
+    async def stop(self):
+        if not self.started:
+            return
+        for pooled in list(self._browsers.values()):
+            await self._close_browser(pooled)
+        self._browsers.clear()
+        await self._playwright.stop()
+        self._playwright = None
+        logger.info('浏览器池已关闭')
+
+    @staticmethod
+    def _make_key(browser_type, headless, executable_path, args):
+        return browser_type, bool(headless), executable_path or None, tuple(args or ())
+
+    async def _launch(self, playwright, key) -> Tuple['Browser', bool]:
+        """
+        返回浏览器，以及它是否来自 browserd
+        """
+        browser_type, headless, executable_path, args = key
+        # browserd 在运行时连接常驻浏览器，省去每次启动浏览器的耗时；关闭时只断开连接，不会关掉常驻浏览器
+        cdp_endpoint = get_cdp_endpoint(browser_type, headless)
+        if cdp_endpoint:
+            try:
+                browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+                logger.info(f'已连接 browserd：{cdp_endpoint}')
+                return browser, True
+            except Exception as e:
+                logger.warning(f'连接 browserd 失败，改为启动浏览器：{e}')
+        options = {'headless': headless, 'args': list(args)}
+        if executable_path:
+            options['executable_path'] = executable_path
+        return await getattr(playwright, browser_type).launch(**options), False
+
+    async def _close_browser(self, pooled: _PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f'关闭浏览器异常：{e}')
+
+    async def _acquire(self, key) -> _PooledBrowser:
+        async with self._lock:
+            pooled = self._browsers.get(key)
+            if pooled and (pooled.retired or not pooled.browser.is_connected()):
+                pooled.retired = True
+                self._browsers.pop(key, None)
+                if pooled.active == 0:
+                    self._recycles += 1
+                    await self._close_browser(pooled)
+                pooled = None
+            if pooled is None:
+                browser, daemon = await self._launch(self._playwright, key)
+                pooled = _PooledBrowser(key, browser, daemon)
+                self._browsers[key] = pooled
+                if daemon:
+                    # 常驻浏览器不是当前进程的子进程，内存上限由 browserd 负责回收
+                    self._daemon_connects += 1
+                    logger.info(f'浏览器池连接 browserd 的浏览器：{key[0]}，headless={key[1]}，'
+                                f'内存回收交给 browserd，这里只按使用次数断开重连')
+                else:
+                    self._launches += 1
+                    logger.info(f'浏览器池新启动浏览器：{key[0]}，headless={key[1]}')
+            pooled.uses += 1
+            pooled.active += 1
+            if pooled.uses >= self.max_uses:
+                pooled.retired = True
+            return pooled
+
+    async def _release(self, pooled: _PooledBrowser):
+        async with self._lock:
+            pooled.active -= 1
+            if not pooled.retired and not pooled.daemon and self._rss_exceeded():
+                logger.warning(f'浏览器池内存超过{self.max_rss_mb}MB，回收浏览器：{pooled.key[0]}')
+                pooled.retired = True
+            if pooled.retired and pooled.active == 0:
+                if self._browsers.get(pooled.key) is pooled:
+                    self._browsers.pop(pooled.key)
+                self._recycles += 1
+                await self._close_browser(pooled)
+
+    def _rss_mb(self) -> Optional[float]:
+        if psutil is None:
+            return None
+        # 浏览器进程都是当前进程（playwright driver）的子孙进程
+        total = 0
+        for child in psutil.Process(os.getpid()).children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / 1024 / 1024
+
+    def _rss_exceeded(self) -> bool:
+        rss_mb = self._rss_mb()
+        return rss_mb is not None and 0 < self.max_rss_mb < rss_mb
+
+    @asynccontextmanager
+    async def lease(self, storage_state=None, browser_type: str = 'chromium', headless: bool = True,
+                    executable_path: str = None, args=None, persistent_profile: bool = False, **context_options):
+        """
+        租出一个独立的 BrowserContext，退出时关闭 context，浏览器留在池中复用。
+        浏览器池未启动时（例如单独运行的脚本）退化为一次性启动浏览器，与原有行为一致。
+        persistent_profile=True 且开启 BROWSER_PERSISTENT_PROFILES 时，改用账号专属的持久化 profile，不走池
+        """
+        args = lean_launch_args(browser_type, args)
+        if persistent_profile and BROWSER_PERSISTENT_PROFILES and storage_state is not None:
+            async with self._lease_profile(storage_state, browser_type, headless, executable_path, args,
+                                           **context_options) as context:
+                yield context
+            return
+
+        if storage_state is not None:
+            context_options['storage_state'] = str(storage_state)
+        key = self._make_key(browser_type, headless, executable_path, args)
+
+        if not self.started:
+            from playwright.async_api import async_playwright
+            async with async_playwright() as playwright:
+                browser, _ = await self._launch(playwright, key)
+                try:
+                    context = await browser.new_context(**context_options)
+                    try:
+                        yield context
+                    finally:
+                        await context.close()
+                finally:
+                    await browser.close()
+            return
+
+        pooled = await self._acquire(key)
+        self._total_leases += 1
+        try:
+            context = await pooled.browser.new_context(**context_options)
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f'关闭浏览器 context 异常：{e}')
+        finally:
+            await self._release(pooled)
+
+    @asynccontextmanager
+    async def _lease_profile(self, storage_state, browser_type, headless, executable_path, args, **context_options):
+        self._total_leases += 1
+        if self.started:
+            async with lease_profile(self._playwright, storage_state, browser_type, headless, executable_path, args,
+                                     **context_options) as context:
+                yield context
+            return
+        from playwright.async_api import async_playwright
+        async with async_playwright() as playwright:
+            async with lease_profile(playwright, storage_state, browser_type, headless, executable_path, args,
+                                     **context_options) as context:
+                yield context
+
+    def stats(self) -> dict:
+        return {
+            'started': self.started,
+            'max_uses': self.max_uses,
+            'max_rss_mb': self.max_rss_mb,
+            'rss_mb': self._rss_mb(),
+            'total_leases': self._total_leases,
+            'launches': self._launches,
+            'daemon_connects': self._daemon_connects,
+            'recycles': self._recycles,
+            'browsers': [
+                {
+                    'browser_type': pooled.key[0],
+                    'headless': pooled.key[1],
+                    'uses': pooled.uses,
+                    'active': pooled.active,
+                    'retired': pooled.retired,
+                    'daemon': pooled.daemon,
+                    'uptime': int(time.time() - pooled.launched_at),
+                }
+                for pooled in self._browsers.values()
+            ],
+        }
+
+
+# 进程内共享的浏览器池，由 FastAPI lifespan / cli_main 负责启动与关闭
+browser_pool = BrowserPool()
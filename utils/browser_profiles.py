@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from conf import BASE_DIR, BROWSER_PROFILE_DIR, BROWSER_PROFILE_CACHE_MAX_MB, BROWSER_PROFILE_TOTAL_MAX_MB, \
+    BROWSER_PROFILE_LOCK_TIMEOUT
+
+if sys.platform == 'win32':
+    import msvcrt
+
+    fcntl = None
+else:
+    import fcntl
+
+    msvcrt = None
+
+MB = 1024 * 1024
+LOCK_FILE = '.profile.lock'
+# Chromium 的缓存目录，按清理顺序排列：先清理重建代价小的，http 缓存和 service worker 放在最后；
+# 只清理缓存，cookie 和 localStorage 保留
+CACHE_DIRS = (
+    'GrShaderCache',
+    'GraphiteDawnCache',
+    'ShaderCache',
+    'Default/GPUCache',
+    'Default/DawnCache',
+    'Default/Code Cache',
+    'Default/Cache',
+    'Default/Service Worker/CacheStorage',
+    'Default/Service Worker/ScriptCache',
+)
+
+# 页面就绪耗时和资源命中缓存情况；跨域资源没有 Timing-Allow-Origin 时 transferSize 为 0，统计值偏乐观
+PAGE_TIMING_JS = """() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    let transferred = nav ? nav.transferSize : 0, cached = 0;
+    for (const r of resources) {
+        transferred += r.transferSize;
+        if (r.transferSize === 0 && r.decodedBodySize > 0) cached++;
+    }
+    return {
+        dom_ready_ms: nav ? Math.round(nav.domContentLoadedEventEnd) : null,
+        load_ms: nav ? Math.round(nav.loadEventEnd) : null,
+        resources: resources.length,
+        cached_resources: cached,
+        transferred_bytes: transferred,
+    };
+}"""
+
+
+class ProfileLock(object):
+    """
+    profile 目录的文件锁，跨进程有效，同一个 profile 同时只能被一个浏览器使用
+    """
+
+    def __init__(self, profile_dir: Path):
+        self.path = Path(profile_dir) / LOCK_FILE
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        f = open(self.path, 'a+')
+        try:
+            if msvcrt:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    async def acquire(self, timeout: float = BROWSER_PROFILE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'等待浏览器 profile 超过{timeout}秒：{self.path.parent}')
+            await asyncio.sleep(0.5)
+
+    def release(self):
+        if self._file is None:
+            return
+        # 锁文件的修改时间作为 profile 最近使用时间，清理缓存时据此排序
+        os.utime(self.path)
+        if msvcrt:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def get_profile_dir(account_file) -> Path:
+    """
+    cookies/douyin_uploader/xiaoA.json -> cookies/profiles/douyin_uploader_xiaoA
+    """
+    account_file = Path(account_file).resolve()
+    try:
+        parts = account_file.relative_to(BASE_DIR / 'cookies').with_suffix('').parts
+    except ValueError:
+        # 不在 cookies 目录下的 cookie 文件，用路径摘要区分同名文件
+        digest = hashlib.md5(str(account_file).encode()).hexdigest()[:8]
+        parts = (account_file.stem, digest)
+    return BROWSER_PROFILE_DIR / '_'.join(parts)
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def cache_size(profile_dir: Path) -> int:
+    return sum(dir_size(profile_dir / cache_dir) for cache_dir in CACHE_DIRS)
+
+
+def evict_profile_cache(profile_dir: Path, max_bytes: int) -> int:
+    """
+    缓存超过 max_bytes 时按 CACHE_DIRS 的顺序整体删除缓存目录，返回释放的字节数；调用时浏览器必须已关闭
+    """
+    sizes = [(profile_dir / cache_dir, dir_size(profile_dir / cache_dir)) for cache_dir in CACHE_DIRS]
+    total = sum(size for _, size in sizes)
+    freed = 0
+    for path, size in sizes:
+        if total - freed <= max_bytes:
+            break
+        if size:
+            shutil.rmtree(path, ignore_errors=True)
+            freed += size
+    if freed:
+        logger.info(f'浏览器 profile 缓存{total / MB:.0f}MB 超过上限，清理{freed / MB:.0f}MB：{profile_dir}')
+    return freed
+
+
+def evict_idle_profiles(max_total_bytes: int = BROWSER_PROFILE_TOTAL_MAX_MB * MB) -> int:
+    """
+    所有 profile 缓存总量超过上限时，从最久未使用的 profile 开始清空缓存，正在使用的跳过
+    """
+    if not BROWSER_PROFILE_DIR.exists():
+        return 0
+    profiles: List[Path] = [path for path in BROWSER_PROFILE_DIR.iterdir() if path.is_dir()]
+    sizes = {path: cache_size(path) for path in profiles}
+    total = sum(sizes.values())
+    freed = 0
+
+    def last_used(path: Path) -> float:
+        lock_file = path / LOCK_FILE
+        return lock_file.stat().st_mtime if lock_file.exists() else 0
+
+    for path in sorted(profiles, key=last_used):
+        if total - freed <= max_total_bytes:
+            break
+        if not sizes[path]:
+            continue
+        lock = ProfileLock(path)
+        if not lock.try_acquire():
+            continue
+        try:
+            freed += evict_profile_cache(path, 0)
+        finally:
+            lock.release()
+    return freed
+
+
+async def _load_cookies(context, storage_state):
+    # 持久化 context 不支持 storage_state 参数，cookie 文件仍是登录态的来源，每次启动时写入
+    if storage_state is None or not Path(storage_state).exists():
+        return
+    with open(storage_state, encoding='utf-8') as f:
+        cookies = json.load(f).get('cookies', [])
+    if cookies:
+        await context.add_cookies(cookies)
+
+
+async def page_timing(page) -> Optional[dict]:
+    try:
+        return await page.evaluate(PAGE_TIMING_JS)
+    except Exception:
+        return None
+
+
+@asynccontextmanager
+async def lease_profile(playwright, storage_state, browser_type: str = 'chromium', headless: bool = True,
+                        executable_path: str = None, args=None, **context_options):
+    """
+    用账号专属的 user-data 目录启动持久化 context，关闭后按上限清理缓存
+    """
+    profile_dir = get_profile_dir(storage_state)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    lock = ProfileLock(profile_dir)
+    await lock.acquire()
+    try:
+        options = {'headless': headless, 'args': list(args or ()), **context_options}
+        if executable_path:
+            options['executable_path'] = executable_path
+        context = await getattr(playwright, browser_type).launch_persistent_context(str(profile_dir), **options)
+        try:
+            await _load_cookies(context, storage_state)
+            yield context
+        finally:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning(f'关闭持久化 context 异常：{e}')
+        await asyncio.to_thread(evict_profile_cache, profile_dir, BROWSER_PROFILE_CACHE_MAX_MB * MB)
+    finally:
+        lock.release()
+    await asyncio.to_thread(evict_idle_profiles)
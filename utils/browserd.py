@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import urllib.request
+from typing import Optional
+
+from loguru import logger
+
+from conf import BROWSERD_PORT, BROWSERD_ENDPOINT_FILE, BROWSERD_MAX_UPTIME, BROWSERD_MAX_RSS_MB, LOCAL_CHROME_PATH
+from utils.lean_mode import lean_launch_args
+
+try:
+    import psutil
+except ImportError:  # 没有 psutil 时在 posix 上用信号 0 判断进程是否存活
+    psutil = None
+
+# 等待浏览器开放调试端口的最长时间（秒）
+ENDPOINT_WAIT_TIMEOUT = 15
+# 检查常驻浏览器是否需要回收的间隔（秒）
+RECYCLE_CHECK_INTERVAL = 30
+
+
+def _pid_alive(pid) -> bool:
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if sys.platform == 'win32':
+        # windows 上 os.kill 会结束进程，无法判断时交给连接失败后回退
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_endpoint() -> Optional[dict]:
+    """
+    守护进程的端点信息，守护进程没有运行时返回 None
+    """
+    try:
+        info = json.loads(BROWSERD_ENDPOINT_FILE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if not _pid_alive(info.get('pid', -1)):
+        return None
+    return info
+
+
+def get_cdp_endpoint(browser_type: str, headless: bool) -> Optional[str]:
+    """
+    守护进程在运行且浏览器类型、有无界面一致时返回 CDP 地址
+    """
+    if browser_type != 'chromium':
+        return None
+    info = read_endpoint()
+    if info is None or info.get('headless') != headless:
+        return None
+    return info.get('ws_endpoint')
+
+
+def _write_endpoint(info: dict):
+    tmp_file = BROWSERD_ENDPOINT_FILE.with_name(BROWSERD_ENDPOINT_FILE.name + '.tmp')
+    tmp_file.write_text(json.dumps(info, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_file, BROWSERD_ENDPOINT_FILE)
+
+
+def _remove_endpoint():
+    info = None
+    try:
+        info = json.loads(BROWSERD_ENDPOINT_FILE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        pass
+    # 只删除自己写的文件
+    if info and info.get('pid') == os.getpid():
+        BROWSERD_ENDPOINT_FILE.unlink(missing_ok=True)
+
+
+def _port_in_use(port) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(('127.0.0.1', port)) == 0
+
+
+def _fetch_ws_endpoint(port) -> Optional[str]:
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/json/version', timeout=1) as response:
+            return json.loads(response.read())['webSocketDebuggerUrl']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+async def _wait_ws_endpoint(port) -> str:
+    deadline = time.monotonic() + ENDPOINT_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        ws_endpoint = await asyncio.to_thread(_fetch_ws_endpoint, port)
+        if ws_endpoint:
+            return ws_endpoint
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f'浏览器{ENDPOINT_WAIT_TIMEOUT}秒内没有开放调试端口：{port}')
+
+
+def _browser_rss_mb() -> Optional[float]:
+    if psutil is None:
+        return None
+    # 常驻浏览器是当前进程（playwright driver）的子孙进程
+    total = 0
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / 1024 / 1024
+
+
+async def _browser_idle(browser) -> bool:
+    # 连接方租出的 context 都是独立的 browser context，没有时说明当前没有上传在使用浏览器
+    session = await browser.new_browser_cdp_session()
+    try:
+        result = await session.send('Target.getBrowserContexts')
+    finally:
+        await session.detach()
+    return not result.get('browserContextIds')
+
+
+async def _wait_recycle(browser, started_at: float, max_uptime: int, max_rss_mb: int) -> str:
+    """
+    浏览器运行超时或内存超限且空闲时返回回收原因；有 context 在使用时等到空闲再回收，不打断正在进行的上传
+    """
+    while True:
+        await asyncio.sleep(RECYCLE_CHECK_INTERVAL)
+        reason = None
+        if 0 < max_uptime < time.time() - started_at:
+            reason = f'运行超过{max_uptime}秒'
+        else:
+            rss_mb = _browser_rss_mb()
+            if rss_mb is not None and 0 < max_rss_mb < rss_mb:
+                reason = f'内存{int(rss_mb)}MB超过{max_rss_mb}MB'
+        if reason is None:
+            continue
+        try:
+            if await _browser_idle(browser):
+                return reason
+        except Exception as e:
+            logger.warning(f'browserd 查询浏览器 context 失败：{e}')
+
+
+async def serve(port: int = BROWSERD_PORT, headless: bool = False, executable_path: str = LOCAL_CHROME_PATH,
+                max_uptime: int = BROWSERD_MAX_UPTIME, max_rss_mb: int = BROWSERD_MAX_RSS_MB):
+    """
+    启动常驻浏览器并开放 CDP 端口，浏览器意外退出时自动重启，运行超时或内存超限时空闲后重启，
+    收到 SIGINT/SIGTERM 后退出
+    """
+    from playwright.async_api import async_playwright
+
+    if read_endpoint() is not None:
+        raise RuntimeError(f'browserd 已在运行：{BROWSERD_ENDPOINT_FILE}')
+    if _port_in_use(port):
+        raise RuntimeError(f'端口{port}已被占用')
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # windows 不支持，Ctrl+C 以 KeyboardInterrupt 结束
+            pass
+
+    options = {'headless': headless,
+               'args': lean_launch_args('chromium', [f'--remote-debugging-port={port}',
+                                                     '--remote-debugging-address=127.0.0.1'])}
+    if executable_path:
+        options['executable_path'] = executable_path
+
+    async with async_playwright() as playwright:
+        try:
+            while not stop.is_set():
+                browser = await playwright.chromium.launch(**options)
+                disconnected = asyncio.Event()
+                browser.on('disconnected', lambda _: disconnected.set())
+                ws_endpoint = await _wait_ws_endpoint(port)
+                started_at = time.time()
+                _write_endpoint({'pid': os.getpid(), 'port': port, 'ws_endpoint': ws_endpoint, 'headless': headless,
+                                 'started_at': started_at})
+                logger.info(f'browserd 已启动：{ws_endpoint}，headless={headless}')
+
+                recycle = asyncio.create_task(_wait_recycle(browser, started_at, max_uptime, max_rss_mb))
+                waiters = [asyncio.create_task(stop.wait()), asyncio.create_task(disconnected.wait()), recycle]
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+                if stop.is_set():
+                    await browser.close()
+                    break
+                if disconnected.is_set():
+                    logger.warning('browserd 的浏览器已退出，重新启动')
+                    continue
+                # 先删除端点文件，重启期间连接方自己启动浏览器；已连接的浏览器断开后会重新读取新的端点
+                logger.info(f'browserd 的浏览器{recycle.result()}，回收重启')
+                _remove_endpoint()
+                await browser.close()
+        finally:
+            _remove_endpoint()
+            logger.info('browserd 已退出')
@@ -0,0 +1,222 @@
+import asyncio
+import importlib
+import json
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger
+
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, \
+    SOCIAL_MEDIA_KUAISHOU
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+# 批量校验时 http 探测与浏览器兜底各自的并发数
+PROBE_CONCURRENCY = 50
+BROWSER_FALLBACK_CONCURRENCY = 4
+
+
+class ProbeSpec(object):
+    def __init__(self, url: str, judge: Callable[[httpx.Response], Optional[bool]], method: str = 'GET',
+                 json_body: dict = None, session_cookies: Tuple[str, ...] = (), browser_check: str = None):
+        self.url = url
+        self.judge = judge  # 返回 True/False 表示确定结论，None 表示无法判断，需要浏览器兜底
+        self.method = method
+        self.json_body = json_body
+        self.session_cookies = session_cookies  # 登录态 cookie，已过期则直接判定失效
+        self.browser_check = browser_check  # 浏览器兜底校验所在模块
+
+
+def _json(response: httpx.Response) -> Optional[dict]:
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def _judge_douyin(response: httpx.Response) -> Optional[bool]:
+    data = _json(response)
+    if response.status_code != 200 or not isinstance(data, dict):
+        return None
+    if data.get('status_code') == 0 and data.get('user'):
+        return True
+    if data.get('status_code') == 8:  # 用户未登录
+        return False
+    return None
+
+
+def _judge_tencent(response: httpx.Response) -> Optional[bool]:
+    data = _json(response)
+    if response.status_code != 200 or not isinstance(data, dict):
+        return None
+    if data.get('errCode') == 0 and (data.get('data') or {}).get('finderUser'):
+        return True
+    if data.get('errCode') in (300333, 300334):  # 登录失效
+        return False
+    return None
+
+
+def _judge_kuaishou(response: httpx.Response) -> Optional[bool]:
+    # 未登录时创作者平台会重定向到 passport 登录页，已登录时直接返回发布页
+    if response.is_redirect:
+        return False if 'passport' in response.headers.get('location', '') else None
+    if response.status_code == 200:
+        return True
+    return None
+
+
+def _judge_tiktok(response: httpx.Response) -> Optional[bool]:
+    data = _json(response)
+    if response.status_code != 200 or not isinstance(data, dict):
+        return None
+    if data.get('message') == 'success' and (data.get('data') or {}).get('user_id'):
+        return True
+    if data.get('message') == 'error':  # Session expired, please sign in again.
+        return False
+    return None
+
+
+PROBE_SPECS: Dict[str, ProbeSpec] = {
+    SOCIAL_MEDIA_DOUYIN: ProbeSpec('https://creator.douyin.com/web/api/media/user/info/', _judge_douyin,
+                                   session_cookies=('sessionid', 'sessionid_ss'),
+                                   browser_check='uploader.douyin_uploader.main'),
+    SOCIAL_MEDIA_TENCENT: ProbeSpec('https://channels.weixin.qq.com/cgi-bin/mmfinderassistant-bin/auth/auth_data',
+                                    _judge_tencent, method='POST', json_body={},
+                                    browser_check='uploader.tencent_uploader.main'),
+    SOCIAL_MEDIA_KUAISHOU: ProbeSpec('https://cp.kuaishou.com/article/publish/video', _judge_kuaishou,
+                                     session_cookies=('kuaishou.web.cp.api_st',),
+                                     browser_check='uploader.ks_uploader.main'),
+    SOCIAL_MEDIA_TIKTOK: ProbeSpec('https://www.tiktok.com/passport/web/account/info/?aid=1459', _judge_tiktok,
+                                   session_cookies=('sessionid',),
+                                   browser_check='uploader.tk_uploader.main_chrome'),
+}
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop = None
+# 正在关闭的旧连接池，保留引用避免关闭任务被回收
+_closing = set()
+
+
+async def _close_quietly(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception as e:
+        # 旧事件循环已经关闭时连接无法正常断开，交给垃圾回收
+        logger.debug(f'关闭旧的探测连接池失败：{e}')
+
+
+def get_probe_client() -> httpx.AsyncClient:
+    """
+    探测共用的连接池。cookie 策略拒绝所有 Set-Cookie，避免不同账号的 cookie 在客户端里串号
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # 示例脚本会多次 asyncio.run，连接池不能跨事件循环复用
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            task = loop.create_task(_close_quietly(_client))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        _client_loop = loop
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0),
+            limits=httpx.Limits(max_connections=PROBE_CONCURRENCY, max_keepalive_connections=PROBE_CONCURRENCY),
+            headers={'user-agent': USER_AGENT},
+            follow_redirects=False,
+        )
+        _client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def load_storage_cookies(account_file) -> List[dict]:
+    with open(account_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('cookies', [])
+
+
+def _domain_match(host: str, domain: str) -> bool:
+    domain = domain.lstrip('.')
+    return host == domain or host.endswith('.' + domain)
+
+
+def _is_expired(cookie: dict, now: float) -> bool:
+    expires = cookie.get('expires', -1)
+    return expires is not None and 0 < expires < now
+
+
+def build_cookie_header(cookies: List[dict], url: str, now: float = None) -> str:
+    now = now or time.time()
+    parsed = urlparse(url)
+    host, path = parsed.hostname or '', parsed.path or '/'
+    pairs = [f"{c['name']}={c['value']}" for c in cookies
+             if _domain_match(host, c.get('domain', ''))
+             and path.startswith(c.get('path') or '/')
+             and not _is_expired(c, now)]
+    return '; '.join(pairs)
+
+
+async def probe_cookie(platform: str, account_file) -> Optional[bool]:
+    """
+    不启动浏览器校验 storage_state 是否仍处于登录态
+    :return: True 有效，False 失效，None 无法判断（需要浏览器兜底）
+    """
+    spec = PROBE_SPECS.get(platform)
+    if spec is None:
+        return None
+    try:
+        cookies = load_storage_cookies(account_file)
+    except (OSError, ValueError):
+        return False
+
+    now = time.time()
+    for cookie in cookies:
+        if cookie['name'] in spec.session_cookies and _is_expired(cookie, now):
+            logger.info(f'[+] {platform} 登录态 cookie {cookie["name"]} 已过期：{account_file}')
+            return False
+    cookie_header = build_cookie_header(cookies, spec.url, now)
+    if not cookie_header:
+        return False
+
+    try:
+        response = await get_probe_client().request(spec.method, spec.url, json=spec.json_body,
+                                                    headers={'cookie': cookie_header})
+    except httpx.HTTPError as e:
+        logger.warning(f'[+] {platform} cookie 探测请求失败，改用浏览器校验：{e}')
+        return None
+    return spec.judge(response)
+
+
+async def check_cookies(items: List[Tuple[str, str]]) -> List[bool]:
+    """
+    批量校验 (platform, account_file)：先并发 http 探测，无法判断的再用浏览器兜底（并发更小）
+    """
+    probe_semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+    browser_semaphore = asyncio.Semaphore(BROWSER_FALLBACK_CONCURRENCY)
+
+    async def check(platform, account_file):
+        async with probe_semaphore:
+            verdict = await probe_cookie(platform, account_file)
+        if verdict is not None:
+            return verdict
+        spec = PROBE_SPECS.get(platform)
+        if spec is None or spec.browser_check is None:
+            return False
+        browser_cookie_auth = importlib.import_module(spec.browser_check).browser_cookie_auth
+        async with browser_semaphore:
+            try:
+                return await browser_cookie_auth(account_file)
+            except Exception as e:
+                logger.error(f'[+] {platform} 浏览器校验 cookie 异常：{account_file}，{e}')
+                return False
+
+    return await asyncio.gather(*(check(platform, account_file) for platform, account_file in items))
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Set
+
+from conf import EVENT_SUBSCRIBER_BUFFER, EVENT_HISTORY_SIZE, EVENT_MAX_JOBS
+
+# 事件类型
+EVENT_STAGE = 'stage'  # 阶段变化：queued / running / generating / uploading / published / failed ...
+EVENT_UPLOAD_PROGRESS = 'upload_progress'  # 视频上传字节数
+EVENT_GEN_PROGRESS = 'gen_progress'  # 视频生成进度百分比
+EVENT_PUBLISHED = 'published'  # 单个视频发布完成，附带作品地址
+EVENT_END = 'end'  # 任务结束，之后不会再有事件
+
+# 当前协程所属的任务 id，上传器等深层代码发出的事件据此归属到任务，不必层层传参
+current_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_job_id', default=None)
+
+
+@dataclass
+class Event:
+    id: int
+    job_id: str
+    type: str
+    data: dict
+    time: float
+
+    def to_sse(self) -> str:
+        data = json.dumps({'job_id': self.job_id, 'time': self.time, **self.data}, ensure_ascii=False, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {data}\n\n"
+
+
+class Subscription(object):
+    """
+    单个订阅者的有界缓冲：写满时丢弃最旧的事件，慢客户端不会阻塞发布方
+    """
+
+    def __init__(self, job_id, maxsize: int = EVENT_SUBSCRIBER_BUFFER):
+        self.job_id = job_id
+        self.dropped = 0
+        self._events: Deque[Event] = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+
+    def put(self, event: Event):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: float = None) -> Optional[Event]:
+        """
+        取下一个事件，超时返回 None（调用方据此发送心跳）
+        """
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+
+class EventBus(object):
+    """
+    进程内按任务 id 分发事件；每个任务保留少量历史，订阅晚了也能看到当前阶段
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, max_jobs: int = EVENT_MAX_JOBS):
+        self.history_size = history_size
+        self.max_jobs = max_jobs
+        self._history: 'OrderedDict[str, Deque[Event]]' = OrderedDict()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def publish(self, job_id, event_type, **data):
+        if job_id is None:
+            return
+        event = Event(next(self._ids), job_id, event_type, data, time.time())
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is not None and running is not self._loop:
+            # 线程池里的上传（如 biliup）发出的事件切回事件循环线程分发
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+        else:
+            self._dispatch(event)
+
+    def emit(self, event_type, **data):
+        # 发给当前协程所属的任务，不在任务里时忽略
+        self.publish(current_job_id.get(), event_type, **data)
+
+    def end(self, job_id, **data):
+        self.publish(job_id, EVENT_END, **data)
+
+    def _dispatch(self, event: Event):
+        history = self._history.get(event.job_id)
+        if history is None:
+            history = self._history[event.job_id] = deque(maxlen=self.history_size)
+            while len(self._history) > self.max_jobs:
+                self._history.popitem(last=False)
+        history.append(event)
+        for subscription in self._subscribers.get(event.job_id, ()):
+            subscription.put(event)
+
+    def subscribe(self, job_id, last_event_id: int = 0) -> Subscription:
+        """
+        订阅任务事件，先回放 last_event_id 之后的历史事件（断线重连时由 Last-Event-ID 传入）
+        """
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(job_id)
+        for event in self._history.get(job_id, ()):
+            if event.id > last_event_id:
+                subscription.put(event)
+        self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.job_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.job_id]
+
+    def is_ended(self, job_id) -> bool:
+        history = self._history.get(job_id)
+        return bool(history) and history[-1].type == EVENT_END
+
+
+@contextmanager
+def bind_job(job_id):
+    """
+    在该上下文里 emit 的事件都归属到 job_id
+    """
+    token = current_job_id.set(job_id)
+    try:
+        yield
+    finally:
+        current_job_id.reset(token)
+
+
+# 创建服务实例
+event_bus = EventBus()
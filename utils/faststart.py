@@ -0,0 +1,158 @@
+import asyncio
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from conf import FASTSTART_ENABLED, FASTSTART_WORKERS
+from utils.mp4_probe import MOOV_CONTAINER_BOXES, Mp4ProbeError, iter_boxes, probe_mp4
+
+FASTSTART_DIR = '.faststart'
+# 流式复制 mdat 时每次读写的大小，内存占用只有 moov 加这一块
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def faststart_cache_path(video_file) -> Path:
+    video_file = Path(video_file)
+    return video_file.parent / FASTSTART_DIR / video_file.name
+
+
+def _box_header(box_type: bytes, payload_size: int) -> bytes:
+    if payload_size + 8 <= 0xFFFFFFFF:
+        return struct.pack('>I4s', payload_size + 8, box_type)
+    return struct.pack('>I4sQ', 1, box_type, payload_size + 16)
+
+
+def _rebuild_moov(buf, start, end, shift, upgrade: bool) -> bytes:
+    """
+    重新生成 [start, end) 内的 box：chunk 偏移加上 shift，upgrade 时把 stco 换成 co64，容器 box 重新计算长度
+    """
+    out = bytearray()
+    for box_type, box_start, content, box_end in iter_boxes(buf, start, end):
+        if box_end > end:
+            raise Mp4ProbeError(f'{box_type!r} 超出父节点')
+        if box_type in MOOV_CONTAINER_BOXES:
+            payload = _rebuild_moov(buf, content, box_end, shift, upgrade)
+            out += _box_header(box_type, len(payload)) + payload
+        elif box_type in (b'stco', b'co64'):
+            entry_size = 4 if box_type == b'stco' else 8
+            version_flags, entry_count = struct.unpack_from('>II', buf, content)
+            offsets = struct.unpack_from(f'>{entry_count}{"I" if entry_size == 4 else "Q"}', buf, content + 8)
+            offsets = [offset + shift(offset) for offset in offsets]
+            if box_type == b'co64' or upgrade:
+                payload = struct.pack(f'>II{entry_count}Q', version_flags, entry_count, *offsets)
+                out += _box_header(b'co64', len(payload)) + payload
+            else:
+                payload = struct.pack(f'>II{entry_count}I', version_flags, entry_count, *offsets)
+                out += _box_header(b'stco', len(payload)) + payload
+        else:
+            out += buf[box_start:box_end]
+    return bytes(out)
+
+
+def _copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise Mp4ProbeError('源文件被截断')
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def faststart(video_file, output_file=None) -> str:
+    """
+    把 moov 移到 mdat 前面并修正 stco/co64 偏移，不重新编码；已经是 faststart 的文件直接返回原路径
+    """
+    video_file = Path(video_file)
+    output_file = Path(output_file) if output_file else faststart_cache_path(video_file)
+    source_stat = video_file.stat()
+    if output_file.exists() and output_file.stat().st_mtime >= source_stat.st_mtime:
+        return str(output_file)
+
+    with open(video_file, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        boxes = list(iter_boxes(buf, 0, source_stat.st_size))
+        moov = next((box for box in boxes if box[0] == b'moov'), None)
+        mdat = next((box for box in boxes if box[0] == b'mdat'), None)
+        if moov is None or mdat is None:
+            raise Mp4ProbeError(f'缺少 moov 或 mdat：{video_file}')
+        if moov[1] < mdat[1]:
+            return str(video_file)
+        if any(box[3] > source_stat.st_size for box in boxes):
+            raise Mp4ProbeError(f'文件不完整：{video_file}')
+
+        # moov 插到第一个 mdat 前面，原来位于 [插入点, moov) 的数据整体后移新 moov 的长度
+        insert_at, moov_start, moov_end = mdat[1], moov[1], moov[3]
+        upgrade = False
+        while True:
+            # 偏移只改变数值不改变长度，先算出新 moov 的长度
+            moov_size = len(_rebuild_moov(buf, moov[2], moov_end, lambda offset: 0, upgrade)) + 8
+
+            def shift(offset):
+                if insert_at <= offset < moov_start:
+                    return moov_size
+                if offset >= moov_end:
+                    # moov 之后的数据移动的是新旧 moov 的长度差，换成 co64 或原 moov 用 64 位长度时不为 0
+                    return moov_size - (moov_end - moov_start)
+                return 0
+
+            try:
+                payload = _rebuild_moov(buf, moov[2], moov_end, shift, upgrade)
+                break
+            except struct.error:
+                # 偏移超出 32 位，stco 需要换成 co64，moov 会变长，重新计算一次
+                if upgrade:
+                    raise
+                upgrade = True
+        new_moov = _box_header(b'moov', len(payload)) + payload
+        if len(new_moov) != moov_size:
+            raise Mp4ProbeError(f'moov 过大：{video_file}')
+
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        part_file = output_file.with_name(output_file.name + '.part')
+        with open(part_file, 'wb') as dst:
+            _copy_range(src, dst, 0, insert_at)
+            dst.write(new_moov)
+            _copy_range(src, dst, insert_at, moov_start)
+            _copy_range(src, dst, moov_end, source_stat.st_size)
+    os.replace(part_file, output_file)
+    return str(output_file)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=FASTSTART_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def prepare_upload_file(video_file) -> str:
+    """
+    上传前的可选步骤：moov 在末尾时在进程池里转成 faststart，不阻塞事件循环；失败时上传原文件
+    """
+    if not FASTSTART_ENABLED:
+        return str(video_file)
+    try:
+        if probe_mp4(video_file).faststart:
+            return str(video_file)
+        loop = asyncio.get_running_loop()
+        output_file = await loop.run_in_executor(_get_executor(), faststart, str(video_file))
+        logger.info(f'faststart 完成：{video_file} -> {output_file}')
+        return output_file
+    except Exception as e:
+        logger.warning(f'faststart 失败，上传原文件：{video_file}，{e}')
+        return str(video_file)
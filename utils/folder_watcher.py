@@ -0,0 +1,201 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+from conf import WATCH_DEBOUNCE, WATCH_POLL_INTERVAL
+
+# inotify 事件掩码，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+VIDEO_SUFFIX = '.mp4'
+WATCH_SUFFIXES = (VIDEO_SUFFIX, '.txt', '.png')
+
+
+@dataclass
+class WatchedVideo:
+    video_file: str
+    txt_file: str
+    thumbnail_file: Optional[str]
+    size: int
+    mtime: float
+
+
+class _InotifySource(object):
+    """
+    Linux 下用 ctypes 调用 inotify，文件变化时回调文件名
+    """
+
+    def __init__(self, folder: Path, on_change: Callable[[str], None], on_overflow: Callable[[], None]):
+        self.folder = folder
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(folder)), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'inotify_add_watch failed: {folder}')
+
+    def start(self):
+        asyncio.get_running_loop().add_reader(self.fd, self._read)
+
+    def stop(self):
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，丢了哪些文件不可知，全量扫描一次
+                self.on_overflow()
+            elif name:
+                self.on_change(name)
+
+
+class _PollingSource(object):
+    """
+    不支持 inotify 时，定时对比目录下文件的 size/mtime
+    """
+
+    def __init__(self, folder: Path, on_change: Callable[[str], None], interval: float = WATCH_POLL_INTERVAL):
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self._snapshot: Dict[str, Tuple[int, float]] = {}
+        self._task = None
+
+    def start(self):
+        self._snapshot = self._scan()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        snapshot = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            snapshot = self._scan()
+            for name, stat in snapshot.items():
+                if self._snapshot.get(name) != stat:
+                    self.on_change(name)
+            self._snapshot = snapshot
+
+
+class FolderWatcher(object):
+    """
+    监听目录，文件写完（超过 debounce 秒没有变化）且 .mp4 和 .txt 都就绪后回调 on_ready；
+    .png 存在时作为封面一起交给上传
+    """
+
+    def __init__(self, folder, on_ready: Callable[[WatchedVideo], None],
+                 is_known: Callable[[str, int, float], bool] = None, debounce: float = WATCH_DEBOUNCE):
+        self.folder = Path(folder).resolve()
+        self.on_ready = on_ready
+        # 启动扫描时判断文件是否已处理过，只比较 size/mtime，不读取文件内容
+        self.is_known = is_known or (lambda path, size, mtime: False)
+        self.debounce = debounce
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._source = None
+
+    async def start(self):
+        self._source = self._create_source()
+        self._source.start()
+        self.rescan()
+
+    def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        if self._source:
+            self._source.stop()
+
+    def _create_source(self):
+        if sys.platform.startswith('linux'):
+            try:
+                return _InotifySource(self.folder, self._on_change, self.rescan)
+            except OSError as e:
+                logger.warning(f'inotify 不可用，改为每{WATCH_POLL_INTERVAL}秒轮询目录：{e}')
+        return _PollingSource(self.folder, self._on_change)
+
+    def rescan(self):
+        """
+        增量扫描：size/mtime 和索引一致的视频直接跳过
+        """
+        pending = 0
+        for video in self.folder.glob(f'*{VIDEO_SUFFIX}'):
+            stat = video.stat()
+            if not self.is_known(str(video), stat.st_size, stat.st_mtime):
+                self._schedule(video.stem)
+                pending += 1
+        logger.info(f'扫描目录{self.folder}，待处理视频{pending}个')
+
+    def _on_change(self, name: str):
+        if name.startswith('.'):
+            return
+        stem, suffix = os.path.splitext(name)
+        if suffix.lower() in WATCH_SUFFIXES:
+            self._schedule(stem)
+
+    def _schedule(self, stem: str):
+        # 每次变化都重新计时，文件静默 debounce 秒后才检查
+        timer = self._timers.pop(stem, None)
+        if timer:
+            timer.cancel()
+        self._timers[stem] = asyncio.get_running_loop().call_later(self.debounce, self._check, stem)
+
+    def _check(self, stem: str):
+        self._timers.pop(stem, None)
+        video = self.folder / f'{stem}{VIDEO_SUFFIX}'
+        txt = self.folder / f'{stem}.txt'
+        thumbnail = self.folder / f'{stem}.png'
+        try:
+            video_stat = video.stat()
+            txt_stat = txt.stat()
+        except FileNotFoundError:
+            # 另一个文件还没写入，等它的事件
+            return
+        if video_stat.st_size == 0 or txt_stat.st_size == 0:
+            return
+        if self.is_known(str(video), video_stat.st_size, video_stat.st_mtime):
+            return
+        self.on_ready(WatchedVideo(str(video), str(txt), str(thumbnail) if thumbnail.exists() else None,
+                                   video_stat.st_size, video_stat.st_mtime))
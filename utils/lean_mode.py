@@ -0,0 +1,139 @@
+import asyncio
+import fnmatch
+import re
+import weakref
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from loguru import logger
+
+from conf import BROWSER_LEAN_MODE
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_KUAISHOU, \
+    SOCIAL_MEDIA_TIKTOK
+
+# 省内存的 chromium 启动参数；保留沙箱，不为省内存降低隔离
+LEAN_LAUNCH_ARGS = (
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-dev-shm-usage',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,CalculateNativeWinOcclusion',
+    '--renderer-process-limit=2',
+    '--js-flags=--max-old-space-size=512',
+    '--mute-audio',
+    '--no-first-run',
+)
+
+# 资源类型对应的扩展名：chromium 按地址屏蔽，不拦截请求，http 缓存仍然有效
+RESOURCE_TYPE_EXTENSIONS: Dict[str, Tuple[str, ...]] = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'ico', 'svg'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'm3u8', 'mp3', 'm4a', 'flv'),
+}
+
+COMMON_TRACKERS = ('*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*hm.baidu.com*')
+
+
+@dataclass(frozen=True)
+class LeanPolicy:
+    # 屏蔽的资源类型：image / font / media；文档、脚本、样式和接口请求始终放行
+    resource_types: Tuple[str, ...] = ('image', 'font', 'media')
+    # 额外屏蔽的地址（统计上报、监控），* 匹配任意字符
+    url_patterns: Tuple[str, ...] = COMMON_TRACKERS
+
+    def blocked_patterns(self) -> List[str]:
+        # 扩展名后面只能是查询参数，避免误伤路径里恰好含有扩展名的接口
+        patterns = [pattern for resource_type in self.resource_types
+                    for extension in RESOURCE_TYPE_EXTENSIONS.get(resource_type, ())
+                    for pattern in (f'*.{extension}', f'*.{extension}?*')]
+        return patterns + list(self.url_patterns)
+
+
+# 各平台的屏蔽规则，上传流程出问题时先在这里放开对应类型
+LEAN_POLICIES: Dict[str, LeanPolicy] = {
+    SOCIAL_MEDIA_DOUYIN: LeanPolicy(url_patterns=COMMON_TRACKERS + (
+        '*mcs.zijieapi.com*', '*mon.zijieapi.com*', '*mcs.snssdk.com*', '*mon.snssdk.com*', '*log.snssdk.com*')),
+    SOCIAL_MEDIA_TENCENT: LeanPolicy(url_patterns=COMMON_TRACKERS + (
+        '*beacon.qq.com*', '*aegis.qq.com*', '*pingjs.qq.com*', '*report.qqweb.qq.com*')),
+    SOCIAL_MEDIA_KUAISHOU: LeanPolicy(url_patterns=COMMON_TRACKERS + (
+        '*log-sdk.ksapisrv.com*', '*/rest/wd/common/log/*', '*/rest/kd/log/*')),
+    # tiktok 的发布按钮和封面选择依赖图片，只屏蔽字体、媒体和统计
+    SOCIAL_MEDIA_TIKTOK: LeanPolicy(resource_types=('font', 'media'), url_patterns=COMMON_TRACKERS + (
+        '*mon.tiktokv.com*', '*mcs.tiktokv.com*', '*analytics.tiktok.com*')),
+}
+
+
+def lean_launch_args(browser_type, args=None) -> List[str]:
+    args = list(args or ())
+    if BROWSER_LEAN_MODE and browser_type == 'chromium':
+        args += [arg for arg in LEAN_LAUNCH_ARGS if arg not in args]
+    return args
+
+
+def _compile(patterns: List[str]) -> Pattern:
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+async def _block_with_cdp(page, patterns: List[str]):
+    session = await page.context.new_cdp_session(page)
+    await session.send('Network.enable')
+    await session.send('Network.setBlockedURLs', {'urls': patterns})
+
+
+async def _block_with_route(page, policy: LeanPolicy, url_regex: Optional[Pattern]):
+    # 非 chromium 没有 CDP，只能拦截请求（会绕过 http 缓存）
+    async def handle(route):
+        request = route.request
+        if request.resource_type in policy.resource_types or (url_regex and url_regex.match(request.url)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route('**/*', handle)
+
+
+async def apply_lean_policy(context, platform, enabled: bool = BROWSER_LEAN_MODE) -> bool:
+    """
+    给 context 里的每个页面加上平台的屏蔽规则，返回是否生效
+    """
+    policy = LEAN_POLICIES.get(platform)
+    if not enabled or policy is None:
+        return False
+    patterns = policy.blocked_patterns()
+    url_regex = _compile(list(policy.url_patterns)) if policy.url_patterns else None
+
+    async def block(page):
+        try:
+            await _block_with_cdp(page, patterns)
+        except Exception:
+            try:
+                await _block_with_route(page, policy, url_regex)
+            except Exception as e:
+                logger.warning(f'精简模式屏蔽规则设置失败：{e}')
+
+    # 每个页面只设置一次，page 事件和 new_page 等待的是同一个任务
+    pending = weakref.WeakKeyDictionary()
+
+    def ensure(page) -> asyncio.Future:
+        if page not in pending:
+            pending[page] = asyncio.ensure_future(block(page))
+        return pending[page]
+
+    for page in context.pages:
+        await ensure(page)
+    # page 事件的处理函数不会被等待，new_page 返回前先等规则设置完成，调用方随后的 goto 一定已被屏蔽
+    new_page = context.new_page
+
+    async def lean_new_page(*args, **kwargs):
+        page = await new_page(*args, **kwargs)
+        await ensure(page)
+        return page
+
+    context.new_page = lean_new_page
+    # 页面自己打开的弹窗只能在 page 事件里尽快设置，开头的少量请求可能不被屏蔽
+    context.on('page', ensure)
+    return True
@@ -1,3 +1,4 @@
+import threading
 from pathlib import Path
 from sys import stdout
 from loguru import logger
@@ -38,14 +39,33 @@ def create_logger(log_name: str, file_path: str):
     return logger.bind(business_name=log_name)
 
 
+class LazyFileLogger(object):
+    """
+    首次写日志时才创建文件 sink，导入 utils.log 时不再为每个平台打开日志文件
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, log_name: str, file_path: str):
+        self._log_name = log_name
+        self._file_path = file_path
+        self._logger = None
+
+    def __getattr__(self, name):
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    self._logger = create_logger(self._log_name, self._file_path)
+        return getattr(self._logger, name)
+
+
 # Remove all existing handlers
 logger.remove()
 # Add a standard console handler
 logger.add(stdout, colorize=True, format=log_formatter)
 
-douyin_logger = create_logger('douyin', 'logs/douyin.log')
-tencent_logger = create_logger('tencent', 'logs/tencent.log')
-xhs_logger = create_logger('xhs', 'logs/xhs.log')
-tiktok_logger = create_logger('tiktok', 'logs/tiktok.log')
-bilibili_logger = create_logger('bilibili', 'logs/bilibili.log')
-kuaishou_logger = create_logger('kuaishou', 'logs/kuaishou.log')
+douyin_logger = LazyFileLogger('douyin', 'logs/douyin.log')
+tencent_logger = LazyFileLogger('tencent', 'logs/tencent.log')
+xhs_logger = LazyFileLogger('xhs', 'logs/xhs.log')
+tiktok_logger = LazyFileLogger('tiktok', 'logs/tiktok.log')
+bilibili_logger = LazyFileLogger('bilibili', 'logs/bilibili.log')
+kuaishou_logger = LazyFileLogger('kuaishou', 'logs/kuaishou.log')
@@ -0,0 +1,178 @@
+import math
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+# 只解析这些容器 box 的子节点，其余 box 直接跳过，不读取内容
+MOOV_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class Mp4ProbeError(Exception):
+    pass
+
+
+@dataclass
+class Mp4Info:
+    file_size: int
+    duration: float  # 秒
+    width: int  # 旋转后的显示宽高
+    height: int
+    rotation: int
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    bitrate: int  # bps，按文件大小和时长估算
+    faststart: bool  # moov 在 mdat 前面，播放器无需下载完整文件
+    truncated: bool  # 文件不完整（box 超出文件末尾或采样偏移越界）
+
+    @property
+    def aspect_ratio(self) -> float:
+        return self.width / self.height if self.height else 0
+
+
+@dataclass
+class _Track:
+    handler: Optional[str] = None
+    codec: Optional[str] = None
+    width: float = 0
+    height: float = 0
+    rotation: int = 0
+    max_chunk_offset: int = 0
+
+
+def iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """
+    遍历 [start, end) 内的 box，返回 (类型, box 起点, 内容起点, box 终点)；终点可能超过 end 表示被截断
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                raise Mp4ProbeError('box 头不完整')
+            size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            # 最后一个 box，延伸到文件末尾
+            size = end - offset
+        if size < header:
+            raise Mp4ProbeError(f'box 长度非法：{box_type!r} {size}')
+        yield box_type, offset, offset + header, offset + size
+        offset += size
+
+
+def _parse_mvhd(buf, offset) -> float:
+    version = buf[offset]
+    if version == 1:
+        timescale, duration = struct.unpack_from('>IQ', buf, offset + 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', buf, offset + 12)
+    return duration / timescale if timescale else 0
+
+
+def _parse_tkhd(buf, offset, track: _Track):
+    version = buf[offset]
+    # version/flags(4) + 时间和 track_id 等字段，v1 比 v0 多 12 字节
+    matrix_offset = offset + (52 if version == 1 else 40)
+    a, b = struct.unpack_from('>ii', buf, matrix_offset)
+    width, height = struct.unpack_from('>II', buf, matrix_offset + 36)
+    track.width = width / 65536
+    track.height = height / 65536
+    track.rotation = int(round(math.degrees(math.atan2(b, a)))) % 360
+
+
+def _parse_stsd(buf, offset, track: _Track):
+    entry_count = struct.unpack_from('>I', buf, offset + 4)[0]
+    if entry_count:
+        codec = struct.unpack_from('>4s', buf, offset + 12)[0]
+        track.codec = codec.decode('latin-1')
+
+
+def _parse_chunk_offsets(buf, offset, end, entry_size, track: _Track):
+    entry_count = struct.unpack_from('>I', buf, offset + 4)[0]
+    if not entry_count:
+        return
+    last = offset + 8 + (entry_count - 1) * entry_size
+    if last + entry_size > end:
+        raise Mp4ProbeError('chunk offset 表不完整')
+    # 采样一般按顺序写入，最后一个 chunk 偏移最大
+    track.max_chunk_offset = struct.unpack_from('>Q' if entry_size == 8 else '>I', buf, last)[0]
+
+
+def _parse_container(buf, start, end, track: Optional[_Track], tracks: list, info: dict):
+    for box_type, box_start, content, box_end in iter_boxes(buf, start, end):
+        if box_end > end:
+            raise Mp4ProbeError(f'{box_type!r} 超出父节点')
+        if box_type == b'mvhd':
+            info['duration'] = _parse_mvhd(buf, content)
+        elif box_type == b'trak':
+            track = _Track()
+            tracks.append(track)
+            _parse_container(buf, content, box_end, track, tracks, info)
+        elif track is None:
+            continue
+        elif box_type == b'tkhd':
+            _parse_tkhd(buf, content, track)
+        elif box_type == b'hdlr':
+            track.handler = struct.unpack_from('>4s', buf, content + 8)[0].decode('latin-1')
+        elif box_type == b'stsd':
+            _parse_stsd(buf, content, track)
+        elif box_type == b'stco':
+            _parse_chunk_offsets(buf, content, box_end, 4, track)
+        elif box_type == b'co64':
+            _parse_chunk_offsets(buf, content, box_end, 8, track)
+        elif box_type in MOOV_CONTAINER_BOXES:
+            _parse_container(buf, content, box_end, track, tracks, info)
+
+
+def probe_mp4(path) -> Mp4Info:
+    """
+    只读取 moov 里的 box 头和少量字段，不解码，几毫秒即可得到视频的基本信息
+    """
+    file_size = os.path.getsize(path)
+    if file_size < 8:
+        raise Mp4ProbeError(f'不是有效的 MP4 文件：{path}')
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        moov = mdat = None
+        truncated = False
+        for box_type, box_start, content, box_end in iter_boxes(buf, 0, file_size):
+            if box_end > file_size:
+                truncated = True
+            if box_type == b'moov' and moov is None:
+                moov = (box_start, content, min(box_end, file_size))
+            elif box_type == b'mdat' and mdat is None:
+                mdat = box_start
+        if moov is None:
+            raise Mp4ProbeError(f'缺少 moov，文件可能不完整：{path}')
+        if mdat is None:
+            raise Mp4ProbeError(f'缺少 mdat，文件没有媒体数据：{path}')
+
+        info = {'duration': 0}
+        tracks = []
+        _parse_container(buf, moov[1], moov[2], None, tracks, info)
+
+    video = next((track for track in tracks if track.handler == 'vide'), None)
+    audio = next((track for track in tracks if track.handler == 'soun'), None)
+    if any(track.max_chunk_offset >= file_size for track in tracks):
+        truncated = True
+
+    width = height = rotation = 0
+    if video:
+        width, height, rotation = int(video.width), int(video.height), video.rotation
+        if rotation in (90, 270):
+            width, height = height, width
+    duration = info['duration']
+    return Mp4Info(
+        file_size=file_size,
+        duration=duration,
+        width=width,
+        height=height,
+        rotation=rotation,
+        video_codec=video.codec if video else None,
+        audio_codec=audio.codec if audio else None,
+        bitrate=int(file_size * 8 / duration) if duration else 0,
+        faststart=moov[0] < mdat,
+        truncated=truncated,
+    )
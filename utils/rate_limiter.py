@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from conf import PUBLISH_PLATFORM_RATE_LIMITS, PUBLISH_ACCOUNT_RATE_LIMITS, PUBLISH_DEFAULT_ACCOUNT_RATE_LIMIT
+
+RateLimit = Tuple[float, int]
+
+
+class TokenBucket(object):
+    """
+    令牌桶：每小时补充 rate_per_hour 个令牌，最多存 burst 个。
+    取令牌时先预留（令牌数可以为负），返回需要等待的秒数，等待者按预留顺序依次放行，不需要轮询
+    """
+
+    def __init__(self, rate_per_hour: float, burst: int):
+        if rate_per_hour <= 0:
+            raise ValueError(f'令牌桶速率必须大于 0：{rate_per_hour}')
+        self.rate = rate_per_hour / 3600
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        # 等待被取消时归还预留的令牌，不占用后面的发布
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class PublishRateLimiter(object):
+    """
+    发布限速：先取账号桶的令牌，再取平台桶的令牌。
+    只在当前进程内生效；一个账号等待时不影响其它账号和平台的上传
+    """
+
+    def __init__(self, platform_limits: Dict[str, RateLimit] = None, account_limits: Dict[str, RateLimit] = None,
+                 default_account_limit: Optional[RateLimit] = PUBLISH_DEFAULT_ACCOUNT_RATE_LIMIT):
+        self.platform_limits = PUBLISH_PLATFORM_RATE_LIMITS if platform_limits is None else platform_limits
+        self.account_limits = PUBLISH_ACCOUNT_RATE_LIMITS if account_limits is None else account_limits
+        self.default_account_limit = default_account_limit
+        self._buckets: Dict[Tuple[str, Optional[str]], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, platform, account) -> Optional[TokenBucket]:
+        if account is None:
+            limit = self.platform_limits.get(platform)
+        else:
+            limit = self.account_limits.get(platform, self.default_account_limit)
+        # 没有配置或速率不大于 0 表示不限速
+        if not limit or limit[0] <= 0:
+            return None
+        key = (platform, account)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(*limit)
+            return self._buckets[key]
+
+    def _buckets_for(self, platform, account):
+        return [bucket for bucket in (self._bucket(platform, str(account)), self._bucket(platform, None)) if bucket]
+
+    async def acquire(self, platform, account) -> float:
+        """
+        等到可以发布为止，返回等待的秒数；account 为账号名或 cookie 文件路径，同一平台内唯一即可
+        """
+        waited = 0
+        reserved = []
+        for bucket in self._buckets_for(platform, account):
+            wait = bucket.reserve()
+            reserved.append(bucket)
+            if wait <= 0:
+                continue
+            logger.info(f'[{platform}] {account} 发布限速，等待{wait:.1f}秒')
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # 已经预留的账号桶和平台桶令牌都要归还
+                for reserved_bucket in reserved:
+                    reserved_bucket.refund()
+                raise
+            waited += wait
+        return waited
+
+    def acquire_sync(self, platform, account) -> float:
+        """
+        同步版本，给在线程里运行的上传器（如 bilibili）使用
+        """
+        waited = 0
+        for bucket in self._buckets_for(platform, account):
+            wait = bucket.reserve()
+            if wait > 0:
+                logger.info(f'[{platform}] {account} 发布限速，等待{wait:.1f}秒')
+                time.sleep(wait)
+                waited += wait
+        return waited
+
+
+# 创建服务实例
+publish_limiter = PublishRateLimiter()
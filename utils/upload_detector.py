@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import os
+from typing import Awaitable, Callable, Optional
+
+from playwright.async_api import Frame, Page, Request
+
+from conf import UPLOAD_COMPLETE_TIMEOUT
+from utils.events import event_bus, current_job_id, EVENT_STAGE, EVENT_UPLOAD_PROGRESS
+
+UPLOAD_STATE_DONE = 'done'
+UPLOAD_STATE_FAILED = 'failed'
+
+# 请求体超过该大小视为视频分片，用于统计上传字节数
+UPLOAD_CHUNK_MIN_BYTES = 64 * 1024
+# 兜底检查间隔：DOM 事件丢失（页面跳转、observer 未注入成功）时仍能检测到状态
+FALLBACK_CHECK_INTERVAL = 10
+
+# 各平台判断上传状态的脚本，返回 'done' / 'failed' / null
+DOUYIN_UPLOAD_STATE_JS = """() => {
+    const has = (selector, text) => Array.from(document.querySelectorAll(selector))
+        .some(e => e.textContent.includes(text));
+    if (has('div.progress-div > div', '上传失败')) return 'failed';
+    if (has('[class^="long-card"] div', '重新上传')) return 'done';
+    return null;
+}"""
+
+TENCENT_UPLOAD_STATE_JS = """() => {
+    const deleteTag = Array.from(document.querySelectorAll('div.media-status-content div.tag-inner'))
+        .some(e => e.textContent.includes('删除'));
+    if (document.querySelector('div.status-msg.error') && deleteTag) return 'failed';
+    const publish = Array.from(document.querySelectorAll('button'))
+        .filter(e => e.textContent.trim() === '发表');
+    if (publish.some(e => !e.classList.contains('weui-desktop-btn_disabled'))) return 'done';
+    return null;
+}"""
+
+KUAISHOU_UPLOAD_STATE_JS = """() => {
+    const text = document.body ? document.body.innerText : '';
+    if (text.includes('上传失败')) return 'failed';
+    if (!text.includes('上传中')) return 'done';
+    return null;
+}"""
+
+TIKTOK_UPLOAD_STATE_JS = """() => {
+    if (document.querySelector('button[aria-label="Select file"]')) return 'failed';
+    const post = Array.from(document.querySelectorAll('div.button-group > button'))
+        .filter(e => e.textContent.includes('Post'));
+    if (post.some(e => !e.hasAttribute('disabled'))) return 'done';
+    return null;
+}"""
+
+# 注入到页面的 MutationObserver，状态变化时通过 binding 回调到 python
+_OBSERVER_JS = """(bindingName) => {
+    if (window[bindingName + '_observer']) return;
+    const check = %s;
+    let scheduled = false;
+    let last = null;
+    const report = () => {
+        scheduled = false;
+        let state = null;
+        try { state = check(); } catch (e) {}
+        if (state !== last) {
+            last = state;
+            if (state) window[bindingName](state);
+        }
+    };
+    const observer = new MutationObserver(() => {
+        if (!scheduled) { scheduled = true; setTimeout(report, 100); }
+    });
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    window[bindingName + '_observer'] = observer;
+    report();
+}"""
+
+_binding_ids = itertools.count()
+
+
+class UploadFailedError(Exception):
+    pass
+
+
+class UploadCompletionDetector(object):
+    """
+    监听页面自身的网络请求和 DOM 变化判断视频是否上传完毕，替代固定间隔轮询
+    """
+
+    def __init__(self, page: Page, file_path, state_js: str, logger, frame_selector: str = None,
+                 on_progress: Callable[[int, int], None] = None):
+        self.page = page
+        self.state_js = state_js
+        self.logger = logger
+        self.frame_selector = frame_selector  # 上传表单在 iframe 里时指定
+        self.on_progress = on_progress
+        # playwright 的事件回调不在当前协程的上下文里执行，创建时记下所属任务
+        self.job_id = current_job_id.get()
+        self.total_bytes = os.path.getsize(file_path)
+        self.sent_bytes = 0
+        self._logged_percent = -1
+        self._frame: Optional[Frame] = None
+        self._binding_name = f'__uploadState{os.getpid()}_{next(_binding_ids)}'
+        self._states: asyncio.Queue = asyncio.Queue()
+        # 页面跳转后重新注入的任务，保留引用避免被回收，stop 时取消
+        self._installing = set()
+
+    async def start(self):
+        """
+        在选择上传文件之前调用，才能统计到完整的上传字节数
+        """
+        await self.page.expose_binding(self._binding_name, self._on_state)
+        event_bus.publish(self.job_id, EVENT_STAGE, state='video_uploading', total_bytes=self.total_bytes)
+        self.page.on("requestfinished", self._on_request_finished)
+        self.page.on("framenavigated", self._on_frame_navigated)
+        await self._install()
+
+    def stop(self):
+        self.page.remove_listener("requestfinished", self._on_request_finished)
+        self.page.remove_listener("framenavigated", self._on_frame_navigated)
+        for task in self._installing:
+            task.cancel()
+        self._installing.clear()
+
+    async def _target_frame(self) -> Frame:
+        if self.frame_selector:
+            element = await self.page.query_selector(self.frame_selector)
+            if element:
+                frame = await element.content_frame()
+                if frame:
+                    return frame
+        return self.page.main_frame
+
+    async def _install(self):
+        try:
+            self._frame = await self._target_frame()
+            await self._frame.evaluate(_OBSERVER_JS % self.state_js, self._binding_name)
+        except Exception:
+            # 页面跳转中注入失败，等 framenavigated 或兜底检查时重新注入
+            pass
+
+    async def check_state(self) -> Optional[str]:
+        try:
+            frame = self._frame or await self._target_frame()
+            return await frame.evaluate(self.state_js)
+        except Exception:
+            return None
+
+    def _on_state(self, source, state):
+        self._states.put_nowait(state)
+
+    def _drain(self):
+        # 丢弃之前积压的状态，以当前页面为准
+        while not self._states.empty():
+            self._states.get_nowait()
+
+    def _on_frame_navigated(self, frame: Frame):
+        if frame == self.page.main_frame or frame == self._frame:
+            task = asyncio.create_task(self._install())
+            self._installing.add(task)
+            task.add_done_callback(self._installing.discard)
+
+    async def _on_request_finished(self, request: Request):
+        if request.method not in ('POST', 'PUT'):
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        body_size = sizes.get('requestBodySize', 0)
+        if body_size < UPLOAD_CHUNK_MIN_BYTES:
+            return
+        self.sent_bytes = min(self.sent_bytes + body_size, self.total_bytes)
+        if self.on_progress:
+            self.on_progress(self.sent_bytes, self.total_bytes)
+        percent = int(self.sent_bytes * 100 / self.total_bytes) if self.total_bytes else 100
+        event_bus.publish(self.job_id, EVENT_UPLOAD_PROGRESS, sent_bytes=self.sent_bytes,
+                          total_bytes=self.total_bytes, percent=percent)
+        if percent // 10 > self._logged_percent // 10:
+            self._logged_percent = percent
+            self.logger.info(f"  [-] 正在上传视频中... {percent}% ({self.sent_bytes}/{self.total_bytes} bytes)")
+        # 分片响应回来后立即检查一次状态，最后一个分片完成时不必等 DOM 事件
+        state = await self.check_state()
+        if state:
+            self._states.put_nowait(state)
+
+    async def wait(self, on_failed: Callable[[], Awaitable[None]] = None, timeout: float = UPLOAD_COMPLETE_TIMEOUT):
+        """
+        等待上传完成；失败时调用 on_failed 重新上传后继续等待，没有 on_failed 则抛出 UploadFailedError
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            self._drain()
+            state = await self.check_state()
+            while True:
+                if state == UPLOAD_STATE_DONE:
+                    self.logger.success("  [-]视频上传完毕")
+                    event_bus.publish(self.job_id, EVENT_STAGE, state='video_uploaded')
+                    return
+                if state == UPLOAD_STATE_FAILED:
+                    self.logger.error("  [-] 发现上传出错了... 准备重试")
+                    event_bus.publish(self.job_id, EVENT_STAGE, state='video_upload_failed',
+                                      retry=on_failed is not None)
+                    if on_failed is None:
+                        raise UploadFailedError("视频上传失败")
+                    self.sent_bytes = 0
+                    self._logged_percent = -1
+                    await on_failed()
+                    self._drain()
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"视频上传超过{timeout}秒仍未完成")
+                try:
+                    state = await asyncio.wait_for(self._states.get(), min(remaining, FALLBACK_CHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    await self._install()
+                    state = await self.check_state()
+        finally:
+            self.stop()
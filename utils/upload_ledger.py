@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from conf import UPLOAD_LEDGER_DB
+
+LEDGER_STAGE_UPLOADING = 'uploading'
+LEDGER_STAGE_PUBLISHED = 'published'
+LEDGER_STAGE_FAILED = 'failed'
+
+# mmap 分块计算摘要，每次只映射 64MB，超大文件也不会一次性占满内存
+HASH_CHUNK_SIZE = 64 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256 TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    video_file TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    post_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    published_at REAL,
+    PRIMARY KEY (sha256, platform, account_name)
+);
+"""
+
+
+@dataclass
+class LedgerEntry:
+    sha256: str
+    platform: str
+    account_name: str
+    video_file: str
+    stage: str
+    attempts: int = 0
+    post_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = 0
+    updated_at: float = 0
+    published_at: Optional[float] = None
+
+
+def sha256_mmap(path) -> str:
+    sha = hashlib.sha256()
+    size = os.path.getsize(path)
+    if size == 0:
+        return sha.hexdigest()
+    with open(path, 'rb') as f:
+        for offset in range(0, size, HASH_CHUNK_SIZE):
+            length = min(HASH_CHUNK_SIZE, size - offset)
+            with mmap.mmap(f.fileno(), length, offset=offset, access=mmap.ACCESS_READ) as chunk:
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+class UploadLedger(object):
+    """
+    上传台账：(内容摘要, 平台, 账号) -> 上传阶段，重复执行时跳过已发布的视频
+    """
+
+    def __init__(self, db_path=UPLOAD_LEDGER_DB):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def file_sha256(self, video_file) -> str:
+        """
+        按 path/size/mtime 缓存摘要，文件没变化时不再读取
+        """
+        path = str(Path(video_file).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime, sha256 FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        if row and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+            return row['sha256']
+        sha256 = sha256_mmap(path)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO file_hashes (path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                              (path, stat.st_size, stat.st_mtime, sha256))
+        return sha256
+
+    def get(self, sha256, platform, account_name) -> Optional[LedgerEntry]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM uploads WHERE sha256 = ? AND platform = ? AND account_name = ?",
+                                    (sha256, platform, account_name)).fetchone()
+        return LedgerEntry(**dict(row)) if row else None
+
+    def begin(self, video_file, platform, account_name) -> Optional[LedgerEntry]:
+        """
+        开始上传前调用：已发布过返回 None，否则记录为上传中（上次中断或失败的重新上传）
+        """
+        sha256 = self.file_sha256(video_file)
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute("SELECT stage FROM uploads WHERE sha256 = ? AND platform = ? AND account_name = ?",
+                                   (sha256, platform, account_name)).fetchone()
+                if row and row['stage'] == LEDGER_STAGE_PUBLISHED:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    "INSERT INTO uploads (sha256, platform, account_name, video_file, stage, attempts, created_at, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                    "ON CONFLICT (sha256, platform, account_name) DO UPDATE SET video_file = excluded.video_file, "
+                    "stage = excluded.stage, attempts = attempts + 1, error = NULL, updated_at = excluded.updated_at",
+                    (sha256, platform, account_name, str(video_file), LEDGER_STAGE_UPLOADING, now, now))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return self.get(sha256, platform, account_name)
+
+    async def abegin(self, video_file, platform, account_name) -> Optional[LedgerEntry]:
+        # 计算摘要会读取整个文件，放到线程里执行
+        return await asyncio.to_thread(self.begin, video_file, platform, account_name)
+
+    def finish(self, entry: LedgerEntry, post_url: str = None, error: str = None):
+        now = time.time()
+        entry.stage = LEDGER_STAGE_FAILED if error else LEDGER_STAGE_PUBLISHED
+        entry.post_url = post_url
+        entry.error = error
+        entry.updated_at = now
+        entry.published_at = None if error else now
+        with self._lock:
+            self.conn.execute(
+                "UPDATE uploads SET stage = ?, post_url = ?, error = ?, updated_at = ?, published_at = ? "
+                "WHERE sha256 = ? AND platform = ? AND account_name = ?",
+                (entry.stage, entry.post_url, entry.error, entry.updated_at, entry.published_at,
+                 entry.sha256, entry.platform, entry.account_name))
+
+    async def publish_once(self, upload: Callable[[], Awaitable], video_file, platform, account_name) -> bool:
+        """
+        已发布过的视频直接跳过返回 False；否则执行 upload 并记录结果
+        """
+        entry = await self.abegin(video_file, platform, account_name)
+        if entry is None:
+            return False
+        try:
+            await upload()
+        except Exception as e:
+            self.finish(entry, error=str(e))
+            raise
+        self.finish(entry)
+        return True
+
+
+# 创建服务实例
+upload_ledger = UploadLedger()
@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_KUAISHOU, \
+    SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_BILIBILI, SOCIAL_MEDIA_XHS
+from utils.mp4_probe import Mp4Info, Mp4ProbeError, probe_mp4
+
+GB = 1024 * 1024 * 1024
+H264_H265 = ('avc1', 'avc3', 'hvc1', 'hev1')
+
+
+@dataclass
+class VideoConstraints:
+    max_size: int
+    max_duration: float  # 秒
+    min_duration: float = 1
+    video_codecs: Tuple[str, ...] = H264_H265
+    min_short_side: int = 360
+    # 推荐的宽高比（宽/高），不符合时只提示不拒绝
+    preferred_aspect_ratios: Tuple[float, ...] = ()
+
+
+# 各平台网页端上传限制，平台调整时同步修改
+PLATFORM_VIDEO_CONSTRAINTS: Dict[str, VideoConstraints] = {
+    SOCIAL_MEDIA_DOUYIN: VideoConstraints(max_size=16 * GB, max_duration=60 * 60,
+                                          preferred_aspect_ratios=(9 / 16, 16 / 9)),
+    SOCIAL_MEDIA_TENCENT: VideoConstraints(max_size=20 * GB, max_duration=8 * 60 * 60,
+                                           preferred_aspect_ratios=(9 / 16, 16 / 9, 3 / 4)),
+    SOCIAL_MEDIA_KUAISHOU: VideoConstraints(max_size=4 * GB, max_duration=15 * 60,
+                                            preferred_aspect_ratios=(9 / 16, 16 / 9)),
+    SOCIAL_MEDIA_TIKTOK: VideoConstraints(max_size=10 * GB, max_duration=60 * 60, min_duration=3,
+                                          preferred_aspect_ratios=(9 / 16,)),
+    SOCIAL_MEDIA_BILIBILI: VideoConstraints(max_size=16 * GB, max_duration=10 * 60 * 60,
+                                            preferred_aspect_ratios=(16 / 9,)),
+    SOCIAL_MEDIA_XHS: VideoConstraints(max_size=20 * GB, max_duration=60 * 60,
+                                       preferred_aspect_ratios=(9 / 16, 3 / 4, 16 / 9)),
+}
+
+
+@dataclass
+class PreflightResult:
+    video_file: str
+    platform: str
+    info: Optional[Mp4Info] = None
+    errors: List[str] = field(default_factory=list)  # 平台一定会拒绝，不要上传
+    warnings: List[str] = field(default_factory=list)  # 可以上传，但可能影响处理速度或展示效果
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def preflight(video_file, platform, info: Mp4Info = None) -> PreflightResult:
+    """
+    上传前检查视频，不启动浏览器、不发起网络请求；同一个视频检查多个平台时传入已解析的 info
+    """
+    result = PreflightResult(str(video_file), platform)
+    try:
+        info = info or probe_mp4(video_file)
+    except (Mp4ProbeError, OSError, ValueError) as e:
+        result.errors.append(f'无法解析视频：{e}')
+        return result
+    result.info = info
+
+    if info.truncated:
+        result.errors.append('视频文件不完整')
+    if info.video_codec is None:
+        result.errors.append('没有视频轨')
+
+    constraints = PLATFORM_VIDEO_CONSTRAINTS.get(platform)
+    if constraints is None:
+        return result
+    if info.file_size > constraints.max_size:
+        result.errors.append(f'文件大小{info.file_size / GB:.2f}GB 超过{constraints.max_size / GB:.0f}GB')
+    if info.duration > constraints.max_duration:
+        result.errors.append(f'时长{info.duration:.0f}秒 超过{constraints.max_duration:.0f}秒')
+    if info.duration < constraints.min_duration:
+        result.errors.append(f'时长{info.duration:.1f}秒 少于{constraints.min_duration:.0f}秒')
+    if info.video_codec and info.video_codec not in constraints.video_codecs:
+        result.errors.append(f'不支持的视频编码：{info.video_codec}')
+    if info.video_codec and min(info.width, info.height) < constraints.min_short_side:
+        result.warnings.append(f'分辨率{info.width}x{info.height} 过低')
+    if constraints.preferred_aspect_ratios and info.height and \
+            all(abs(info.aspect_ratio - ratio) > 0.02 for ratio in constraints.preferred_aspect_ratios):
+        result.warnings.append(f'宽高比{info.width}:{info.height} 不是平台推荐的比例')
+    if not info.faststart:
+        result.warnings.append('moov 在文件末尾，平台处理会变慢')
+    return result
+
+
+def log_preflight(result: PreflightResult):
+    for warning in result.warnings:
+        logger.warning(f'[预检] {result.video_file}：{warning}')
+    for error in result.errors:
+        logger.error(f'[预检] {result.video_file}：{error}')
+
+
+def filter_valid_videos(files: List[Path], platform) -> List[Path]:
+    """
+    批量上传前过滤掉平台会拒绝的视频
+    """
+    valid = []
+    for file in files:
+        result = preflight(file, platform)
+        log_preflight(result)
+        if result.ok:
+            valid.append(file)
+    return valid
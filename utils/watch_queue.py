@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from conf import WATCH_UPLOAD_RETRIES, WATCH_RETRY_INTERVAL
+from utils.folder_watcher import WatchedVideo
+
+WATCH_STATE_PENDING = 'pending'
+WATCH_STATE_UPLOADING = 'uploading'
+WATCH_STATE_DONE = 'done'
+WATCH_STATE_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watch_uploads (
+    platform TEXT NOT NULL,
+    account_name TEXT NOT NULL,
+    video_file TEXT NOT NULL,
+    txt_file TEXT NOT NULL,
+    thumbnail_file TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    retry_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (platform, account_name, video_file)
+);
+CREATE INDEX IF NOT EXISTS idx_watch_uploads_state ON watch_uploads (platform, account_name, state, updated_at);
+"""
+# 旧版本数据库缺少的列
+_MIGRATIONS = {
+    'retry_at': "ALTER TABLE watch_uploads ADD COLUMN retry_at REAL NOT NULL DEFAULT 0",
+}
+
+
+class WatchUploadQueue(object):
+    """
+    watch 的持久化上传队列，同时作为目录的 size/mtime 索引：重启后已处理的文件不再重复上传
+    """
+
+    def __init__(self, db_path, platform, account_name):
+        self.db_path = Path(db_path)
+        self.platform = platform
+        self.account_name = account_name
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(watch_uploads)')}
+        for column, sql in _MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(sql)
+        self.conn = conn
+
+    def close(self):
+        self.conn.close()
+
+    def is_known(self, video_file, size, mtime) -> bool:
+        # 自动重试用完仍失败的视频不算已处理，重新扫描目录（如重启 watch）时再排队
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, state FROM watch_uploads "
+                "WHERE platform = ? AND account_name = ? AND video_file = ?",
+                (self.platform, self.account_name, video_file)).fetchone()
+        return (row is not None and row['size'] == size and row['mtime'] == mtime
+                and row['state'] != WATCH_STATE_FAILED)
+
+    def enqueue(self, video: WatchedVideo):
+        # 文件内容变了（size/mtime 不同）时重新排队
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watch_uploads (platform, account_name, video_file, txt_file, thumbnail_file, "
+                "size, mtime, state, updated_at, retry_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (self.platform, self.account_name, video.video_file, video.txt_file, video.thumbnail_file,
+                 video.size, video.mtime, WATCH_STATE_PENDING, time.time()))
+
+    def claim(self) -> Optional[WatchedVideo]:
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT * FROM watch_uploads WHERE platform = ? AND account_name = ? AND state = ? "
+                    "AND retry_at <= ? ORDER BY updated_at LIMIT 1",
+                    (self.platform, self.account_name, WATCH_STATE_PENDING, time.time())).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE watch_uploads SET state = ?, attempts = attempts + 1, updated_at = ? "
+                        "WHERE platform = ? AND account_name = ? AND video_file = ?",
+                        (WATCH_STATE_UPLOADING, time.time(), self.platform, self.account_name, row['video_file']))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        return WatchedVideo(row['video_file'], row['txt_file'], row['thumbnail_file'], row['size'], row['mtime'])
+
+    def finish(self, video_file, error: str = None, retry: bool = False):
+        """
+        retry=True 表示失败可能是暂时的（网络、平台异常），退避后自动重新排队，重试 WATCH_UPLOAD_RETRIES 次后标记失败
+        """
+        now = time.time()
+        with self._lock:
+            if error and retry:
+                cursor = self.conn.execute(
+                    "UPDATE watch_uploads SET state = ?, error = ?, updated_at = ?, "
+                    "retry_at = ? + ? * (1 << (attempts - 1)) "
+                    "WHERE platform = ? AND account_name = ? AND video_file = ? AND attempts < ?",
+                    (WATCH_STATE_PENDING, error, now, now, WATCH_RETRY_INTERVAL,
+                     self.platform, self.account_name, video_file, WATCH_UPLOAD_RETRIES))
+                if cursor.rowcount:
+                    return
+            self.conn.execute(
+                "UPDATE watch_uploads SET state = ?, error = ?, updated_at = ? "
+                "WHERE platform = ? AND account_name = ? AND video_file = ?",
+                (WATCH_STATE_FAILED if error else WATCH_STATE_DONE, error, now,
+                 self.platform, self.account_name, video_file))
+
+    def next_retry_delay(self) -> Optional[float]:
+        """
+        距离最早一个等待重试的视频还有多少秒，没有等待重试的视频时返回 None
+        """
+        with self._lock:
+            retry_at = self.conn.execute(
+                "SELECT MIN(retry_at) FROM watch_uploads WHERE platform = ? AND account_name = ? AND state = ?",
+                (self.platform, self.account_name, WATCH_STATE_PENDING)).fetchone()[0]
+        return None if retry_at is None else max(retry_at - time.time(), 0)
+
+    def recover(self) -> int:
+        """
+        上次进程退出时正在上传的视频重新排队
+        """
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE watch_uploads SET state = ? WHERE platform = ? AND account_name = ? AND state = ?",
+                (WATCH_STATE_PENDING, self.platform, self.account_name, WATCH_STATE_UPLOADING))
+        return cursor.rowcount
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM watch_uploads WHERE platform = ? AND account_name = ? AND state = ?",
+                (self.platform, self.account_name, WATCH_STATE_PENDING)).fetchone()[0]